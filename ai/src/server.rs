@@ -10,8 +10,18 @@ use bcrypt::{hash, verify, DEFAULT_COST};
 
 use crate::prelude::{McpToolRegistry, McpToolCall};
 
+/// Largest frame (one JSON message) the server reads or the client accepts
+pub const MAX_MESSAGE_BYTES: usize = 16 * 1024 * 1024;
+const READ_SIZE: usize = 64 * 1024;
+
+/// A request frame: one JSON object terminated by a newline
+///
+/// `id` is chosen by the client and copied into every response frame of
+/// the request.
 #[derive(Debug, Serialize, Deserialize)]
 pub struct SSHRequest {
+    #[serde(default)]
+    pub id: Option<String>,
     pub command: String,
     pub tool: Option<String>,
     pub parameters: Option<HashMap<String, serde_json::Value>>,
@@ -19,12 +29,43 @@ pub struct SSHRequest {
 
 #[derive(Debug, Serialize, Deserialize)]
 pub struct SSHResponse {
+    #[serde(default, skip_serializing_if = "Option::is_none")]
+    pub id: Option<String>,
     pub status: String,
     pub state: String,
     pub data: Option<serde_json::Value>,
     pub error: Option<String>,
 }
 
+impl SSHResponse {
+    /// Create a response frame for the request with the given id
+    ///
+    /// # Arguments
+    ///
+    /// * `id` - The id of the request, if known
+    /// * `status` - The status ("connected", "processing", "completed" or "error")
+    /// * `state` - The state within the status
+    /// * `data` - The payload
+    /// * `error` - The error message
+    ///
+    /// # Returns
+    ///
+    /// A new `SSHResponse`
+    pub fn new(id: &Option<String>, status: &str, state: &str, data: Option<serde_json::Value>, error: Option<String>) -> Self {
+        Self {
+            id: id.clone(),
+            status: status.to_string(),
+            state: state.to_string(),
+            data,
+            error,
+        }
+    }
+
+    fn error(id: &Option<String>, message: String) -> Self {
+        Self::new(id, "error", "error", None, Some(message))
+    }
+}
+
 #[derive(Debug, Clone, Serialize, Deserialize)]
 pub struct SSHConfig {
     pub allowed_users: Vec<String>,
@@ -89,6 +130,83 @@ impl SSHConfig {
     }
 }
 
+/// A complete frame read from a channel
+#[derive(Debug, PartialEq)]
+pub enum Frame {
+    /// One request, without its newline and surrounding whitespace
+    Message(String),
+    /// A request longer than the maximum frame size; its bytes are dropped
+    TooLarge,
+}
+
+/// Splits the bytes read from a channel into newline-delimited frames
+///
+/// Bytes are buffered until a newline completes a frame, however the
+/// client's writes were split into reads. A frame growing past `max_size`
+/// is reported once and skipped up to its newline without being buffered,
+/// so a misbehaving client cannot make the server hold more than
+/// `max_size` bytes.
+pub struct FrameReader {
+    pending: Vec<u8>,
+    max_size: usize,
+    skipping: bool,
+}
+
+impl FrameReader {
+    /// Create a reader for frames of at most `max_size` bytes
+    pub fn new(max_size: usize) -> Self {
+        Self {
+            pending: Vec::new(),
+            max_size,
+            skipping: false,
+        }
+    }
+
+    /// Add bytes read from the channel
+    ///
+    /// # Arguments
+    ///
+    /// * `data` - The bytes of one read
+    ///
+    /// # Returns
+    ///
+    /// The frames completed by the data; empty lines are left out
+    pub fn feed(&mut self, data: &[u8]) -> Vec<Frame> {
+        let mut frames = Vec::new();
+        let mut rest = data;
+        while let Some(end) = rest.iter().position(|&b| b == b'\n') {
+            let line = &rest[..end];
+            rest = &rest[end + 1..];
+            if self.skipping {
+                self.skipping = false;
+                continue;
+            }
+            if self.pending.len() + line.len() > self.max_size {
+                self.pending.clear();
+                frames.push(Frame::TooLarge);
+                continue;
+            }
+            self.pending.extend_from_slice(line);
+            let message = String::from_utf8_lossy(&self.pending).trim().to_string();
+            self.pending.clear();
+            if !message.is_empty() {
+                frames.push(Frame::Message(message));
+            }
+        }
+
+        if !self.skipping {
+            if self.pending.len() + rest.len() > self.max_size {
+                self.pending.clear();
+                self.skipping = true;
+                frames.push(Frame::TooLarge);
+            } else {
+                self.pending.extend_from_slice(rest);
+            }
+        }
+        frames
+    }
+}
+
 pub struct Server {
     port: u16,
     config: SSHConfig,
@@ -140,7 +258,9 @@ impl Server {
     /// 
     /// This function handles the connection from a client.
     /// It creates a new SSH session and sends a response to the client.
-    /// It then enters a loop to read commands from the client and process them.
+    /// It then reads newline-delimited request frames from the channel
+    /// and answers each of them. Clients open the channel as an exec
+    /// channel ("mcp") without a PTY, so nothing is echoed or translated.
     /// 
     /// # Arguments
     ///
@@ -162,47 +282,32 @@ impl Server {
 
         let mut channel = session.channel_session()?;
         
-        Self::send_response_via_channel(&mut channel, SSHResponse {
-            status: "connected".to_string(),
-            state: "ready".to_string(),
-            data: None,
-            error: None,
-        })?;
-
+        Self::send_response_via_channel(
+            &mut channel,
+            SSHResponse::new(&None, "connected", "ready", None, None),
+        )?;
+
+        // read() blocks until the client sends more, so there is no polling
+        let mut reader = FrameReader::new(MAX_MESSAGE_BYTES);
+        let mut buffer = vec![0u8; READ_SIZE];
         loop {
-            let mut buffer = [0; 1024];
-            match channel.read(&mut buffer) {
-                Ok(n) if n > 0 => {
-                    let command_data = String::from_utf8_lossy(&buffer[..n]).trim().to_string();
-                    
-                    if command_data.is_empty() {
-                        continue;
-                    }
-
-                    match serde_json::from_str::<SSHRequest>(&command_data) {
-                        Ok(request) => {
-                            Self::process_request_with_streaming_via_channel(&mut channel, request).await?;
-                        }
-                        Err(e) => {
-                            Self::send_response_via_channel(&mut channel, SSHResponse {
-                                status: "error".to_string(),
-                                state: "error".to_string(),
-                                data: None,
-                                error: Some(format!("Invalid JSON: {}", e)),
-                            })?;
-                        }
-                    }
-                }
-                Ok(0) => {
-                    break;
-                }
-                Ok(_) => {
-                    continue;
-                }
+            let n = match channel.read(&mut buffer) {
+                Ok(0) => break,
+                Ok(n) => n,
                 Err(e) => {
                     eprintln!("Error reading from SSH channel: {}", e);
                     break;
                 }
+            };
+
+            for frame in reader.feed(&buffer[..n]) {
+                match frame {
+                    Frame::Message(message) => Self::handle_frame(&mut channel, &message).await?,
+                    Frame::TooLarge => Self::send_response_via_channel(&mut channel, SSHResponse::error(
+                        &None,
+                        format!("Message exceeds {} bytes", MAX_MESSAGE_BYTES),
+                    ))?,
+                }
             }
         }
 
@@ -210,6 +315,35 @@ impl Server {
         Ok(())
     }
 
+    /// Handle one complete request frame
+    ///
+    /// # Arguments
+    ///
+    /// * `channel` - The channel to send the responses via
+    /// * `frame` - The frame without its newline
+    ///
+    /// # Returns
+    ///
+    /// A `Result` containing an error if a response fails to send
+    async fn handle_frame(channel: &mut ssh2::Channel, frame: &str) -> Result<(), Box<dyn std::error::Error>> {
+        match serde_json::from_str::<SSHRequest>(frame) {
+            Ok(request) => {
+                Self::process_request_with_streaming_via_channel(channel, request).await
+            }
+            Err(e) => {
+                // Answer with the id if the frame has one, so the client
+                // can tell which request failed
+                let id = serde_json::from_str::<serde_json::Value>(frame)
+                    .ok()
+                    .and_then(|value| value.get("id").and_then(|id| id.as_str()).map(String::from));
+                Self::send_response_via_channel(
+                    channel,
+                    SSHResponse::error(&id, format!("Invalid JSON: {}", e)),
+                )
+            }
+        }
+    }
+
     /// Authenticate SSH session using public key or password
     /// 
     /// # Arguments
@@ -339,35 +473,33 @@ impl Server {
     ///
     /// A `Result` containing an error if the request fails to process
     async fn process_request_with_streaming_via_channel(channel: &mut ssh2::Channel, request: SSHRequest) -> Result<(), Box<dyn std::error::Error>> {
+        let id = request.id.clone();
         match request.command.as_str() {
             "mcp_tools" => {
                 let registry = McpToolRegistry::new();
                 let tools = registry.list_tools();
-                Self::send_response_via_channel(channel, SSHResponse {
-                    status: "completed".to_string(),
-                    state: "complete".to_string(),
-                    data: Some(serde_json::json!({ "tools": tools })),
-                    error: None,
-                })?;
+                Self::send_response_via_channel(channel, SSHResponse::new(
+                    &id,
+                    "completed",
+                    "complete",
+                    Some(serde_json::json!({ "tools": tools })),
+                    None,
+                ))?;
             }
             "mcp_execute" => {
                 if let (Some(tool), Some(parameters)) = (request.tool, request.parameters) {
                     if tool == "generate_flashcards" {
-                        Self::send_response_via_channel(channel, SSHResponse {
-                            status: "processing".to_string(),
-                            state: "analyzing".to_string(),
-                            data: None,
-                            error: None,
-                        })?;
+                        Self::send_response_via_channel(
+                            channel,
+                            SSHResponse::new(&id, "processing", "analyzing", None, None),
+                        )?;
 
                         tokio::time::sleep(tokio::time::Duration::from_millis(500)).await;
                         
-                        Self::send_response_via_channel(channel, SSHResponse {
-                            status: "processing".to_string(),
-                            state: "generating".to_string(),
-                            data: None,
-                            error: None,
-                        })?;
+                        Self::send_response_via_channel(
+                            channel,
+                            SSHResponse::new(&id, "processing", "generating", None, None),
+                        )?;
                     }
 
                     let tool_call = McpToolCall {
@@ -378,38 +510,33 @@ impl Server {
                     let registry = McpToolRegistry::new();
                     match registry.execute_tool(&tool_call).await {
                         Ok(result) => {
-                            Self::send_response_via_channel(channel, SSHResponse {
-                                status: "completed".to_string(),
-                                state: "complete".to_string(),
-                                data: Some(serde_json::json!({ "result": result })),
-                                error: None,
-                            })?;
+                            Self::send_response_via_channel(channel, SSHResponse::new(
+                                &id,
+                                "completed",
+                                "complete",
+                                Some(serde_json::json!({ "result": result })),
+                                None,
+                            ))?;
                         },
                         Err(e) => {
-                            Self::send_response_via_channel(channel, SSHResponse {
-                                status: "error".to_string(),
-                                state: "error".to_string(),
-                                data: None,
-                                error: Some(e.to_string()),
-                            })?;
+                            Self::send_response_via_channel(
+                                channel,
+                                SSHResponse::error(&id, e.to_string()),
+                            )?;
                         }
                     }
                 } else {
-                    Self::send_response_via_channel(channel, SSHResponse {
-                        status: "error".to_string(),
-                        state: "error".to_string(),
-                        data: None,
-                        error: Some("Missing tool or parameters".to_string()),
-                    })?;
+                    Self::send_response_via_channel(
+                        channel,
+                        SSHResponse::error(&id, "Missing tool or parameters".to_string()),
+                    )?;
                 }
             }
             _ => {
-                Self::send_response_via_channel(channel, SSHResponse {
-                    status: "error".to_string(),
-                    state: "error".to_string(),
-                    data: None,
-                    error: Some(format!("Unknown command: {}", request.command)),
-                })?;
+                Self::send_response_via_channel(
+                    channel,
+                    SSHResponse::error(&id, format!("Unknown command: {}", request.command)),
+                )?;
             }
         }
 
@@ -429,6 +556,7 @@ mod tests {
         session.set_tcp_stream(stream);
         
         let request = SSHRequest {
+            id: Some("1".to_string()),
             command: "mcp_tools".to_string(),
             tool: None,
             parameters: None,
@@ -436,4 +564,48 @@ mod tests {
 
         assert_eq!(request.command, "mcp_tools");
     }
+
+    #[test]
+    fn test_frames_split_across_reads() {
+        let mut reader = FrameReader::new(MAX_MESSAGE_BYTES);
+        let request = format!(r#"{{"id": "1", "command": "mcp_execute", "parameters": {{"prompt": "{}"}}}}"#, "x".repeat(5000));
+
+        let (head, tail) = request.as_bytes().split_at(1024);
+        assert!(reader.feed(head).is_empty());
+        let mut data = tail.to_vec();
+        data.extend_from_slice(b"\n\n{\"command\": \"mcp_tools\"}\n{\"comm");
+        assert_eq!(reader.feed(&data), vec![
+            Frame::Message(request.clone()),
+            Frame::Message(r#"{"command": "mcp_tools"}"#.to_string()),
+        ]);
+        assert_eq!(reader.feed(b"and\": \"mcp_tools\"}\r\n"), vec![
+            Frame::Message(r#"{"command": "mcp_tools"}"#.to_string()),
+        ]);
+    }
+
+    #[test]
+    fn test_oversized_frame_is_skipped() {
+        let mut reader = FrameReader::new(16);
+        assert_eq!(reader.feed(&[b'x'; 10]), vec![]);
+        assert_eq!(reader.feed(&[b'x'; 10]), vec![Frame::TooLarge]);
+        assert_eq!(reader.feed(&[b'x'; 100]), vec![]);
+        assert_eq!(reader.feed(b"x\n{}\n"), vec![Frame::Message("{}".to_string())]);
+        assert_eq!(reader.feed(b"0123456789abcdefg\n{}\n"), vec![
+            Frame::TooLarge,
+            Frame::Message("{}".to_string()),
+        ]);
+    }
+
+    #[test]
+    fn test_response_echoes_request_id() {
+        let id = Some("abc".to_string());
+        let json = serde_json::to_string(&SSHResponse::new(&id, "completed", "complete", None, None)).unwrap();
+        assert!(json.contains("\"id\":\"abc\""));
+
+        let json = serde_json::to_string(&SSHResponse::new(&None, "connected", "ready", None, None)).unwrap();
+        assert!(!json.contains("\"id\""));
+
+        let request: SSHRequest = serde_json::from_str(r#"{"command": "mcp_tools"}"#).unwrap();
+        assert!(request.id.is_none());
+    }
 }
\ No newline at end of file
@@ -10,10 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import json
 import os
 from datetime import timedelta
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -48,6 +50,7 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework.authtoken',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
     'drf_yasg',
     'djoser',
@@ -55,6 +58,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'cards.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -92,10 +96,130 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'flashcards.db',
+        'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'flashcards.db'),
     }
 }
 
+# SQLite performance mode (opt-in for self-hosted deployments with several
+# gunicorn workers): WAL journal so readers never block the writer, relaxed
+# fsync, memory-mapped reads, a larger page cache and a busy timeout instead
+# of failing immediately with "database is locked". Write transactions are
+# started with BEGIN IMMEDIATE so they take the write lock up front instead
+# of deadlocking on a read-to-write lock upgrade.
+SQLITE_PERFORMANCE_MODE = os.getenv('SQLITE_PERFORMANCE_MODE', 'False') == 'True'
+SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', '20'))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', '65536'))
+SQLITE_PERFORMANCE_OPTIONS = {
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        f'PRAGMA mmap_size={SQLITE_MMAP_SIZE};'
+        f'PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB};'
+        'PRAGMA temp_store=MEMORY;'
+        f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT * 1000};'
+    ),
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': SQLITE_BUSY_TIMEOUT,
+}
+
+if SQLITE_PERFORMANCE_MODE:
+    DATABASES['default']['OPTIONS'] = SQLITE_PERFORMANCE_OPTIONS
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+#
+# Per-user dashboards and statistics are cached with versioned keys that are
+# invalidated by model signals (see cards/cache.py and cards/signals.py).
+# The version keys have to live in storage shared by all workers, otherwise a
+# worker keeps serving stats another worker has invalidated. locmem is per
+# process and therefore only the default for a single worker; with several
+# gunicorn workers (WEB_CONCURRENCY, which gunicorn reads as well) the default
+# is the file backend, shared by all workers on one host. CACHE_BACKEND=db
+# uses the database (run `python manage.py createcachetable` first) and
+# CACHE_BACKEND=redis a Redis server at CACHE_LOCATION (needs the redis
+# package), both shared across hosts.
+
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+CACHE_BACKEND = os.getenv('CACHE_BACKEND') or (
+    'file' if WEB_CONCURRENCY > 1 else 'locmem'
+)
+CACHE_OPTIONS = {'MAX_ENTRIES': 10000}
+
+if CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', BASE_DIR / 'cache'),
+            'OPTIONS': CACHE_OPTIONS,
+        }
+    }
+elif CACHE_BACKEND == 'db':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', 'flashcards_cache'),
+            'OPTIONS': CACHE_OPTIONS,
+        }
+    }
+elif CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', 'redis://localhost:6379/0'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'flashcards',
+            'OPTIONS': CACHE_OPTIONS,
+        }
+    }
+
+STATS_CACHE_TIMEOUT = int(os.getenv('STATS_CACHE_TIMEOUT', '300'))
+
+
+# Request metrics (cards/middleware.py), exposed at /metrics.
+# METRICS_MULTIPROCESS_DIR lets all gunicorn workers of a host report
+# together; files of dead workers or older than METRICS_WORKER_TTL seconds
+# are dropped. METRICS_SLOW_REQUEST_MS enables slow-request logging.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN') or None
+METRICS_MULTIPROCESS_DIR = os.getenv('METRICS_MULTIPROCESS_DIR') or None
+METRICS_FLUSH_INTERVAL = int(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+METRICS_WORKER_TTL = int(os.getenv('METRICS_WORKER_TTL', '86400'))
+METRICS_SLOW_REQUEST_MS = int(os.getenv('METRICS_SLOW_REQUEST_MS', '0'))
+METRICS_SLOW_REQUEST_TOP_QUERIES = int(
+    os.getenv('METRICS_SLOW_REQUEST_TOP_QUERIES', '5')
+)
+
+# Idempotency-Key support (cards/idempotency.py): how long a stored response
+# is replayed, and how long a key of a request that never finished blocks.
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', str(24 * 60 * 60)))
+IDEMPOTENCY_PENDING_TIMEOUT = int(os.getenv('IDEMPOTENCY_PENDING_TIMEOUT', '300'))
+
+# Near-duplicate cards (cards/dedup.py): estimated Jaccard similarity of the
+# normalized front and back above which a card counts as a duplicate.
+CARD_DUPLICATE_THRESHOLD = float(os.getenv('CARD_DUPLICATE_THRESHOLD', '0.8'))
+
+# Review analytics (cards/analytics.py): lapses of one learner after which a
+# card counts as a leech for them.
+CARD_LEECH_LAPSES = int(os.getenv('CARD_LEECH_LAPSES', '8'))
+
+# Maintenance scheduler (cards/scheduler.py): how long the leader lease lasts
+# without renewal (longer than the slowest job), how often due jobs are
+# checked, and after how many hours without reviews an active learning
+# session is marked abandoned.
+SCHEDULER_LEASE_SECONDS = int(os.getenv('SCHEDULER_LEASE_SECONDS', '300'))
+SCHEDULER_TICK_SECONDS = int(os.getenv('SCHEDULER_TICK_SECONDS', '30'))
+LEARNING_SESSION_STALE_HOURS = int(os.getenv('LEARNING_SESSION_STALE_HOURS', '12'))
+
+# Review archive (cards/archive.py): reviews older than this many days (whole
+# months) are moved from CardReview into compressed monthly archives.
+REVIEW_ARCHIVE_AFTER_DAYS = int(os.getenv('REVIEW_ARCHIVE_AFTER_DAYS', '365'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -157,6 +281,11 @@ AUTH_USER_MODEL = 'cards.User'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Avatar variants (WebP/JPEG in several sizes) are rendered by a small
+# thread pool after the upload request has committed.
+AVATAR_PROCESSING_ASYNC = os.getenv('AVATAR_PROCESSING_ASYNC', 'True') == 'True'
+AVATAR_PROCESSING_WORKERS = int(os.getenv('AVATAR_PROCESSING_WORKERS', '2'))
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -221,6 +350,8 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['idempotent-replayed']
 
 # Swagger Settings
 SWAGGER_SETTINGS = {
@@ -241,6 +372,30 @@ AI_SSH_PORT = int(os.environ.get('AI_SSH_PORT', '2222'))
 AI_SSH_USERNAME = os.environ.get('AI_SSH_USERNAME', 'flashcard_user')
 AI_SSH_PASSWORD = os.environ.get('AI_SSH_PASSWORD', 'flashcard_secure_password_2024')
 AI_SSH_KEY_PATH = os.environ.get('AI_SSH_KEY_PATH', None)
+AI_SSH_TIMEOUT = int(os.environ.get('AI_SSH_TIMEOUT', '120'))
+
+# Several AI module instances (cards/ai_routing.py), as a JSON list of
+# {"host", "port", "weight", "max_concurrency", "drain"}; empty means the
+# single AI_SSH_HOST/AI_SSH_PORT. Failed endpoints are skipped for
+# AI_ENDPOINT_RETRY_AFTER seconds; when all are full, a call waits up to
+# AI_ENDPOINT_QUEUE_TIMEOUT seconds for a free slot.
+AI_ENDPOINTS = json.loads(os.environ.get('AI_ENDPOINTS') or '[]')
+AI_ENDPOINT_RETRY_AFTER = float(os.environ.get('AI_ENDPOINT_RETRY_AFTER', '30'))
+AI_ENDPOINT_QUEUE_TIMEOUT = float(os.environ.get('AI_ENDPOINT_QUEUE_TIMEOUT', '30'))
+
+# Largest response frame accepted from the AI module (cards/ai_protocol.py)
+AI_MAX_MESSAGE_BYTES = int(
+    os.environ.get('AI_MAX_MESSAGE_BYTES', str(16 * 1024 * 1024))
+)
+
+# Large generation requests are split into chunks of at most
+# AI_GENERATE_CHUNK_SIZE cards, generated over parallel connections.
+AI_GENERATE_MAX_CARDS = int(os.environ.get('AI_GENERATE_MAX_CARDS', '200'))
+AI_GENERATE_CHUNK_SIZE = int(os.environ.get('AI_GENERATE_CHUNK_SIZE', '20'))
+AI_GENERATE_PARALLEL_CHUNKS = int(os.environ.get('AI_GENERATE_PARALLEL_CHUNKS', '4'))
+AI_GENERATE_CHUNK_RETRIES = int(os.environ.get('AI_GENERATE_CHUNK_RETRIES', '2'))
+# Base pause in seconds before a chunk is retried; doubles per attempt
+AI_GENERATE_RETRY_BACKOFF = float(os.environ.get('AI_GENERATE_RETRY_BACKOFF', '0.5'))
 
 # Legacy HTTP-Support (für Migration)
 AI_SERVICE_URL = os.environ.get('AI_SERVICE_URL', 'http://localhost:3000')
@@ -14,27 +14,49 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from functools import cache
+
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
-from drf_yasg import openapi
-from drf_yasg.views import get_schema_view
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import permissions
-from cards.views import AvatarViewSet
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Flashcards API",
-        default_version='v1',
-        description="API für die Flashcards-Anwendung",
-        terms_of_service="https://flashcards.example.com/terms/",
-        contact=openapi.Contact(email="contact@flashcards.example.com"),
-        license=openapi.License(name="MIT License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+from cards.views import AvatarViewSet, metrics
+
+
+@cache
+def schema_ui_view(renderer):
+    """
+    Swagger or ReDoc view, built on its first request
+
+    drf_yasg and the schema view are only needed when someone opens the
+    docs, so worker boots and management commands skip them.
+    """
+    from drf_yasg import openapi
+    from drf_yasg.views import get_schema_view
+
+    schema_view = get_schema_view(
+        openapi.Info(
+            title="Flashcards API",
+            default_version='v1',
+            description="API für die Flashcards-Anwendung",
+            terms_of_service="https://flashcards.example.com/terms/",
+            contact=openapi.Contact(email="contact@flashcards.example.com"),
+            license=openapi.License(name="MIT License"),
+        ),
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+    return schema_view.with_ui(renderer, cache_timeout=0)
+
+
+def schema_ui(renderer):
+    @csrf_exempt
+    def view(request, *args, **kwargs):
+        return schema_ui_view(renderer)(request, *args, **kwargs)
+    return view
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -43,16 +65,9 @@ urlpatterns = [
     path('api/v1/auth/', include('djoser.urls.jwt')),
     path('api/v1/auth/social/', include('djoser.social.urls')),
     path('api/v1/auth/users/me/avatar/', AvatarViewSet.as_view(), name='avatar'),
-    path(
-        'swagger/',
-        schema_view.with_ui('swagger', cache_timeout=0),
-        name='schema-swagger-ui',
-    ),
-    path(
-        'redoc/',
-        schema_view.with_ui('redoc', cache_timeout=0),
-        name='schema-redoc',
-    ),
+    path('metrics', metrics, name='metrics'),
+    path('swagger/', schema_ui('swagger'), name='schema-swagger-ui'),
+    path('redoc/', schema_ui('redoc'), name='schema-redoc'),
 ]
 
 if settings.DEBUG:
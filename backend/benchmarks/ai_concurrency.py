@@ -0,0 +1,108 @@
+"""
+Load test for concurrent in-flight AI requests
+
+Fires many simultaneous requests at an AI endpoint of a running server and
+reports how many of them the server kept in flight at the same time. Run it
+once against each deployment to compare them:
+
+    # WSGI: every waiting request occupies a worker
+    gunicorn --workers 4 backend.wsgi:application
+    # ASGI: waiting requests only occupy the event loop
+    gunicorn --workers 4 -k uvicorn_worker.UvicornWorker backend.asgi:application
+
+    python benchmarks/ai_concurrency.py --url http://localhost:8000 --requests 400
+"""
+import argparse
+import json
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ENDPOINTS = {
+    'health': ('GET', '/api/v1/ai/health/', None),
+    'check-answer': (
+        'POST',
+        '/api/v1/ai/check-answer/',
+        {'answer': 'Eine Sequenz', 'user_answer': 'Eine geordnete Sequenz'},
+    ),
+}
+
+
+def login(base_url: str, username: str, password: str) -> str:
+    """Obtain a JWT access token"""
+    request = urllib.request.Request(
+        f'{base_url}/api/v1/auth/jwt/create/',
+        data=json.dumps({'username': username, 'password': password}).encode(),
+        headers={'Content-Type': 'application/json'},
+        method='POST',
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())['access']
+
+
+def fire(base_url: str, endpoint: str, token: str | None, timeout: float):
+    """Send one request and return (start, end, status)"""
+    method, path, body = ENDPOINTS[endpoint]
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    request = urllib.request.Request(
+        f'{base_url}{path}',
+        data=json.dumps(body).encode() if body else None,
+        headers=headers,
+        method=method,
+    )
+
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = 0
+    return started, time.perf_counter(), status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='health')
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--username')
+    parser.add_argument('--password')
+    args = parser.parse_args()
+
+    token = None
+    if args.username and args.password:
+        token = login(args.url, args.username, args.password)
+
+    print(f"🚀 {args.requests} gleichzeitige Requests an {args.endpoint}\n")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.requests) as executor:
+        intervals = list(executor.map(
+            lambda _: fire(args.url, args.endpoint, token, args.timeout),
+            range(args.requests),
+        ))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(end - start for start, end, _ in intervals)
+    errors = sum(1 for _, _, status in intervals if not 200 <= status < 300)
+
+    print(f"Dauer:               {elapsed:.2f} s")
+    print(f"Durchsatz:           {len(intervals) / elapsed:.1f} Requests/s")
+    print(f"Fehler:              {errors}")
+    print(f"Latenz p50/p95/max:  {statistics.median(latencies) * 1000:.0f} / "
+          f"{latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f} / "
+          f"{latencies[-1] * 1000:.0f} ms")
+    # The fastest request saw no queueing, so it approximates the AI latency;
+    # work done divided by wall time is the concurrency the server sustained.
+    print(f"Server-Parallelität: {len(latencies) * latencies[0] / elapsed:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,458 @@
+"""
+Deterministic stand-in for the AI module for load tests and tests
+
+Speaks the framed SSH/JSON protocol of ai/src/server.rs (see
+cards/ai_protocol.py) like the AI module: newline-delimited frames of at
+most max_message_bytes, the request id echoed in every response, and the
+same errors for oversized, malformed and incomplete requests. It answers
+generate_flashcards, check_answer and explain from the request parameters
+instead of asking Ollama. Latency and
+failures are injected from a seeded random generator, so a benchmark of
+pooling, caching or backpressure can be repeated on one machine. Point the
+backend at it:
+
+    python benchmarks/ai_stub.py --port 2222 --latency 0.5
+    AI_SSH_HOST=localhost AI_SSH_PORT=2222 python manage.py runserver
+
+    # 200 ms + up to 100 ms jitter + 20 ms per generated card,
+    # every tenth request drops its connection
+    python benchmarks/ai_stub.py --latency 0.2 --jitter 0.1 --per-card 0.02 \\
+        --failure-rate 0.1 --failure-mode disconnect --seed 1
+
+    # Fixed results per tool, e.g. {"explain": {"content": [...]}}
+    python benchmarks/ai_stub.py --responses canned.json
+
+Tests run it on a free port in a background thread:
+
+    with StubAIServer(latency=0).run_in_thread() as stub:
+        with override_settings(AI_SSH_PORT=stub.port):
+            ...
+"""
+import argparse
+import asyncio
+import copy
+import difflib
+import hashlib
+import json
+import random
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from types import NoneType
+
+import asyncssh
+
+TOOLS = ['generate_flashcards', 'check_answer', 'explain']
+FAILURE_MODES = ('error', 'disconnect', 'hang')
+# Limits of the AI module (MAX_MESSAGE_BYTES and READ_SIZE in server.rs)
+MAX_MESSAGE_BYTES = 16 * 1024 * 1024
+READ_SIZE = 64 * 1024
+
+
+def response(
+    status: str, state: str, data=None, error=None, request_id=None
+) -> bytes:
+    frame = {
+        'status': status,
+        'state': state,
+        'data': data,
+        'error': error,
+    }
+    if request_id is not None:
+        frame['id'] = request_id
+    return (json.dumps(frame) + '\n').encode()
+
+
+class FrameReader:
+    """
+    Splits the bytes read from a channel into request frames
+
+    Mirrors FrameReader in ai/src/server.rs: a frame growing past max_size
+    is reported once, as None, and the rest of it is skipped up to its
+    newline instead of being buffered.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.pending = bytearray()
+        self.skipping = False
+
+    def feed(self, data: bytes) -> list:
+        """
+        Adds the bytes of one read
+
+        Returns:
+            The frames completed by the data, None for each oversized one;
+            empty lines are left out
+        """
+        frames = []
+        *lines, rest = data.split(b'\n')
+        for line in lines:
+            if self.skipping:
+                self.skipping = False
+                continue
+            if len(self.pending) + len(line) > self.max_size:
+                self.pending.clear()
+                frames.append(None)
+                continue
+            self.pending += line
+            message = self.pending.decode(errors='replace').strip()
+            self.pending.clear()
+            if message:
+                frames.append(message)
+        if not self.skipping:
+            if len(self.pending) + len(rest) > self.max_size:
+                self.pending.clear()
+                self.skipping = True
+                frames.append(None)
+            else:
+                self.pending += rest
+        return frames
+
+
+def normalize(text) -> str:
+    return ' '.join(str(text).lower().split())
+
+
+def generated_cards(prompt: str, difficulty: str, first: int, count: int) -> list:
+    """
+    Cards first+1 .. first+count of a prompt
+
+    The text of every card is derived from a hash of the prompt and its
+    number, so the cards are the same on every run but do not look alike
+    to the duplicate check (cards/dedup.py).
+    """
+    cards = []
+    for number in range(first + 1, first + count + 1):
+        digest = hashlib.sha256(f'{prompt}|{number}'.encode()).hexdigest()
+        cards.append({
+            'question': f'{prompt[:50]} – Frage {number}: {digest[:12]}?',
+            'answer': f'Antwort {digest[12:40]}',
+            'difficulty': difficulty,
+            'tags': [],
+        })
+    return cards
+
+
+class Behaviour:
+    """
+    How the stub answers: delays, injected failures and results
+
+    Jitter and failures are drawn from one generator seeded with seed, in
+    the order the requests arrive, so a sequential client sees the same
+    delays and failures on every run.
+
+    Args:
+        latency: Seconds before every answer
+        jitter: Up to this many seconds are added at random
+        per_card: Seconds added per card of a generate_flashcards request
+        failure_rate: Share of requests that fail (0.0 - 1.0)
+        failure_mode: How a request fails: "error" answers with an error
+            frame, "disconnect" closes the channel without an answer,
+            "hang" never answers
+        seed: Seed of the jitter and the failures
+        responses: Dict of tool name to a fixed result, returned instead of
+            the computed one
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        jitter: float = 0.0,
+        per_card: float = 0.0,
+        failure_rate: float = 0.0,
+        failure_mode: str = 'error',
+        seed: int = 0,
+        responses: dict = None,
+    ):
+        if failure_mode not in FAILURE_MODES:
+            raise ValueError(f"Unbekannter Fehlermodus: {failure_mode}")
+        self.latency = latency
+        self.jitter = jitter
+        self.per_card = per_card
+        self.failure_rate = failure_rate
+        self.failure_mode = failure_mode
+        self.responses = responses or {}
+        self.random = random.Random(seed)
+        # Cards generated per prompt so far: repeated requests for the same
+        # prompt (the chunks of a large deck) continue the numbering
+        self.generated = Counter()
+
+    def delay(self, tool: str, parameters: dict) -> float:
+        seconds = self.latency + self.random.uniform(0, self.jitter)
+        if tool == 'generate_flashcards':
+            seconds += self.per_card * int(parameters.get('count', 5))
+        return seconds
+
+    def failure(self):
+        """The failure mode of the next request, or None if it succeeds"""
+        if self.random.random() < self.failure_rate:
+            return self.failure_mode
+        return None
+
+    def result(self, tool: str, parameters: dict) -> dict:
+        """Result of an mcp_execute call"""
+        if tool in self.responses:
+            return copy.deepcopy(self.responses[tool])
+        if tool == 'generate_flashcards':
+            prompt = str(parameters.get('prompt', 'Stub')).strip() or 'Stub'
+            count = int(parameters.get('count', 5))
+            difficulty = parameters.get('difficulty', 'medium')
+            first = self.generated[prompt]
+            self.generated[prompt] += count
+            return {
+                'deck': {
+                    'title': prompt[:50],
+                    'description': 'Vom AI-Stub generiert',
+                },
+                'cards': generated_cards(prompt, difficulty, first, count),
+            }
+        if tool == 'check_answer':
+            similarity = difflib.SequenceMatcher(
+                None,
+                normalize(parameters.get('correct_answer', '')),
+                normalize(parameters.get('user_answer', '')),
+            ).ratio()
+            return {'similarity': round(similarity, 4)}
+        text = f"Erklärung vom AI-Stub: {parameters.get('question', '')}"
+        if parameters.get('context'):
+            text += f" (Kontext: {parameters['context']})"
+        return {'content': [{'type': 'text', 'text': text}], 'is_error': False}
+
+
+class StubSSHServer(asyncssh.SSHServer):
+    def __init__(self, stats: Counter):
+        self.stats = stats
+
+    def connection_made(self, conn):
+        self.stats['connections'] += 1
+
+    def begin_auth(self, username):
+        return True
+
+    def password_auth_supported(self):
+        return True
+
+    def validate_password(self, username, password):
+        return True
+
+
+class StubAIServer:
+    """
+    SSH server answering like the AI module
+
+    The keyword arguments configure its Behaviour. stats counts the SSH
+    connections, requests, injected failures and the most requests that
+    were in flight at once.
+
+    Args:
+        host: Interface to listen on
+        port: Port to listen on; 0 picks a free one, see port after start
+        max_message_bytes: Longest request frame that is answered
+    """
+
+    def __init__(
+        self,
+        host: str = 'localhost',
+        port: int = 0,
+        max_message_bytes: int = MAX_MESSAGE_BYTES,
+        **behaviour,
+    ):
+        self.host = host
+        self.port = port
+        self.max_message_bytes = max_message_bytes
+        self.behaviour = Behaviour(**behaviour)
+        self.stats = Counter()
+        self.in_flight = 0
+        self._acceptor = None
+
+    async def start(self):
+        self._acceptor = await asyncssh.create_server(
+            lambda: StubSSHServer(self.stats),
+            self.host,
+            self.port,
+            server_host_keys=[asyncssh.generate_private_key('ssh-ed25519')],
+            process_factory=self.handle,
+            encoding=None,
+        )
+        self.port = self._acceptor.get_port()
+        return self
+
+    async def close(self):
+        """Stops listening and ends the requests still being answered"""
+        self._acceptor.close()
+        await self._acceptor.wait_closed()
+        tasks = asyncio.all_tasks() - {asyncio.current_task()}
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    @contextmanager
+    def run_in_thread(self):
+        """Runs the server on an event loop in a daemon thread"""
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        try:
+            asyncio.run_coroutine_threadsafe(self.start(), loop).result(timeout=10)
+            yield self
+        finally:
+            if self._acceptor is not None:
+                asyncio.run_coroutine_threadsafe(self.close(), loop).result(timeout=10)
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+    async def handle(self, process):
+        process.stdout.write(response('connected', 'ready'))
+        reader = FrameReader(self.max_message_bytes)
+        try:
+            while data := await process.stdin.read(READ_SIZE):
+                for frame in reader.feed(data):
+                    if frame is None:
+                        process.stdout.write(response(
+                            'error', 'error',
+                            error=f"Message exceeds {self.max_message_bytes} bytes",
+                        ))
+                    elif not await self.answer(process, frame):
+                        return
+        except (asyncssh.BreakReceived, asyncssh.ConnectionLost):
+            pass
+        finally:
+            process.exit(0)
+
+    async def answer(self, process, frame: str) -> bool:
+        """
+        Answers one request
+
+        Returns:
+            False if the channel is to be closed
+        """
+        try:
+            request = json.loads(frame)
+        except json.JSONDecodeError as e:
+            process.stdout.write(response('error', 'error', error=f"Invalid JSON: {e}"))
+            return True
+        if not isinstance(request, dict):
+            process.stdout.write(response(
+                'error', 'error', error="Invalid JSON: expected an object"
+            ))
+            return True
+
+        request_id = request.get('id')
+        command = request.get('command')
+        tool = request.get('tool')
+        parameters = request.get('parameters')
+        if not isinstance(command, str) or not isinstance(request_id, (str, NoneType)):
+            # Like the AI module, echo the id of a request it cannot parse
+            process.stdout.write(response(
+                'error', 'error', error="Invalid JSON: invalid command or id",
+                request_id=request_id if isinstance(request_id, str) else None,
+            ))
+            return True
+        if command == 'mcp_execute' and (tool is None or parameters is None):
+            process.stdout.write(response(
+                'error', 'error', error="Missing tool or parameters",
+                request_id=request_id,
+            ))
+            return True
+        parameters = parameters or {}
+        self.stats['requests'] += 1
+        self.in_flight += 1
+        self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.in_flight)
+        try:
+            delay = self.behaviour.delay(tool, parameters)
+            failure = self.behaviour.failure()
+            if failure:
+                self.stats['failures'] += 1
+            if failure == 'hang':
+                return True
+
+            if command == 'mcp_execute' and tool == 'generate_flashcards':
+                process.stdout.write(response(
+                    'processing', 'analyzing', request_id=request_id
+                ))
+            await asyncio.sleep(delay)
+            if failure == 'disconnect':
+                return False
+            if failure == 'error':
+                process.stdout.write(response(
+                    'error', 'error', error='Injizierter Fehler',
+                    request_id=request_id,
+                ))
+                return True
+
+            if command == 'mcp_tools':
+                process.stdout.write(response(
+                    'completed', 'complete',
+                    {'tools': [{'name': name} for name in TOOLS]},
+                    request_id=request_id,
+                ))
+            elif command == 'mcp_execute' and tool in TOOLS:
+                process.stdout.write(response(
+                    'completed', 'complete',
+                    {'result': self.behaviour.result(tool, parameters)},
+                    request_id=request_id,
+                ))
+            elif command == 'mcp_execute':
+                process.stdout.write(response(
+                    'error', 'error', error=f"Unknown tool: {tool}",
+                    request_id=request_id,
+                ))
+            else:
+                process.stdout.write(response(
+                    'error', 'error', error=f"Unknown command: {command}",
+                    request_id=request_id,
+                ))
+            return True
+        finally:
+            self.in_flight -= 1
+
+
+async def serve(server: StubAIServer):
+    await server.start()
+    behaviour = server.behaviour
+    print(
+        f"🤖 AI-Stub lauscht auf {server.host}:{server.port} "
+        f"({behaviour.latency * 1000:.0f} ms Latenz, "
+        f"{behaviour.failure_rate:.0%} Fehler)"
+    )
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=2222)
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--per-card', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--failure-mode', choices=FAILURE_MODES, default='error')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--responses', help='JSON file with fixed results per tool')
+    args = parser.parse_args()
+
+    responses = None
+    if args.responses:
+        with open(args.responses) as file:
+            responses = json.load(file)
+    server = StubAIServer(
+        args.host,
+        args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        per_card=args.per_card,
+        failure_rate=args.failure_rate,
+        failure_mode=args.failure_mode,
+        seed=args.seed,
+        responses=responses,
+    )
+    try:
+        asyncio.run(serve(server))
+    except KeyboardInterrupt:
+        print(f"Statistik: {dict(server.stats)}")
+
+
+if __name__ == '__main__':
+    main()
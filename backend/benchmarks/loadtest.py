@@ -0,0 +1,241 @@
+"""
+End-to-end load test of the study-session flow
+
+Every virtual user logs in once and then studies in a loop: list decks,
+start a learning session, fetch its cards, review them with think time
+(optionally checking each answer with the AI) and complete the session.
+Reports throughput, latency percentiles and error rates per endpoint.
+
+    # Once: create the load-test users and decks in the server's database
+    python benchmarks/loadtest.py --seed 50
+
+    # AI endpoints against the stub instead of Ollama
+    python benchmarks/ai_stub.py --latency 0.5 &
+    AI_SSH_HOST=localhost AI_SSH_PORT=2222 gunicorn --workers 4 backend.wsgi:application
+
+    python benchmarks/loadtest.py --url http://localhost:8000 --users 50 \\
+        --duration 60 --think-time 2 --ai
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API = '/api/v1'
+PASSWORD = 'loadtest-pass-123'
+
+
+def username(index: int) -> str:
+    return f'loadtest-{index}'
+
+
+def seed(users: int, cards: int) -> None:
+    """Create the load-test users with one deck each (idempotent)"""
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+    import django
+
+    django.setup()
+
+    from cards.models import Card, Deck, User
+
+    for i in range(users):
+        user = User.objects.filter(username=username(i)).first()
+        if user is None:
+            user = User.objects.create_user(
+                username=username(i),
+                email=f'{username(i)}@example.com',
+                password=PASSWORD,
+            )
+        if not user.decks.exists():
+            deck = Deck.objects.create(owner=user, title=f'Lasttest {i}')
+            Card.objects.bulk_create(
+                Card(deck=deck, front=f'Frage {j}', back=f'Antwort {j}')
+                for j in range(cards)
+            )
+    print(f"🌱 {users} Benutzer mit je {cards} Karten angelegt")
+
+
+class Recorder:
+    """Thread-safe latency and status samples per endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def add(self, endpoint: str, latency: float, status: int) -> None:
+        with self._lock:
+            self.samples[endpoint].append((latency, status))
+
+
+class VirtualUser:
+    """One simulated learner with its own JWT"""
+
+    def __init__(self, args, index: int, recorder: Recorder):
+        self.args = args
+        self.index = index
+        self.recorder = recorder
+        self.token = None
+
+    def request(self, endpoint: str, method: str, path: str, body=None):
+        """Send one request and record it; returns the decoded body or None"""
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        request = urllib.request.Request(
+            f'{self.args.url}{path}',
+            data=json.dumps(body).encode() if body is not None else None,
+            headers=headers,
+            method=method,
+        )
+
+        started = time.perf_counter()
+        data = None
+        try:
+            with urllib.request.urlopen(request, timeout=self.args.timeout) as response:
+                content = response.read()
+                status = response.status
+            data = json.loads(content) if content else {}
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except Exception:
+            status = 0
+        self.recorder.add(endpoint, time.perf_counter() - started, status)
+        return data if 200 <= status < 300 else None
+
+    def think(self) -> None:
+        if self.args.think_time:
+            time.sleep(random.uniform(0.5, 1.5) * self.args.think_time)
+
+    def run(self, deadline: float) -> None:
+        login = self.request('login', 'POST', f'{API}/auth/jwt/create/', {
+            'username': username(self.index % self.args.seeded_users),
+            'password': PASSWORD,
+        })
+        if login is None:
+            return
+        self.token = login['access']
+
+        while time.time() < deadline:
+            self.study_session()
+
+    def study_session(self) -> None:
+        decks = self.request('decks', 'GET', f'{API}/decks/')
+        own = [
+            deck for deck in (decks or {}).get('results', [])
+            if deck['owner']['username']
+            == username(self.index % self.args.seeded_users)
+        ]
+        if not own:
+            time.sleep(1)
+            return
+
+        session = self.request('session-start', 'POST', f'{API}/learning-sessions/', {
+            'deck_id': own[0]['id'],
+        })
+        if session is None:
+            return
+        session_path = f"{API}/learning-sessions/{session['id']}"
+
+        cards = self.request('session-cards', 'GET', f'{session_path}/cards/') or []
+        for card in cards[:self.args.reviews_per_session]:
+            self.think()
+            is_correct = random.random() < 0.8
+            if self.args.ai:
+                self.request('ai-check-answer', 'POST', f'{API}/ai/check-answer/', {
+                    'answer': card['back'],
+                    'user_answer': card['back'] if is_correct else 'Keine Ahnung',
+                })
+            self.request('review', 'POST', f'{API}/card-reviews/', {
+                'session_id': session['id'],
+                'card_id': card['id'],
+                'is_correct': is_correct,
+                'time_taken': random.randint(2000, 15000),
+            })
+
+        self.request('session-complete', 'POST', f'{session_path}/complete/')
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+
+def report(recorder: Recorder, elapsed: float) -> None:
+    print(f"{'Endpoint':<18}{'Requests':>9}{'Fehler':>8}{'Req/s':>8}"
+          f"{'p50':>8}{'p90':>8}{'p99':>8}{'max':>8}  (ms)")
+    total = errors = 0
+    for endpoint, samples in sorted(recorder.samples.items()):
+        latencies = sorted(latency * 1000 for latency, _ in samples)
+        failed = sum(1 for _, status in samples if not 200 <= status < 300)
+        total += len(samples)
+        errors += failed
+        print(f"{endpoint:<18}{len(samples):>9}{failed:>8}"
+              f"{len(samples) / elapsed:>8.1f}"
+              f"{statistics.median(latencies):>8.0f}"
+              f"{percentile(latencies, 0.90):>8.0f}"
+              f"{percentile(latencies, 0.99):>8.0f}"
+              f"{latencies[-1]:>8.0f}")
+
+    if total:
+        print(f"\nGesamt: {total} Requests in {elapsed:.1f} s, "
+              f"{total / elapsed:.1f} Requests/s, "
+              f"Fehlerrate {errors / total * 100:.2f} %")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--users', type=int, default=10,
+                        help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=60,
+                        help='Seconds to keep studying')
+    parser.add_argument('--ramp-up', type=float, default=5,
+                        help='Seconds over which the users log in')
+    parser.add_argument('--think-time', type=float, default=2,
+                        help='Mean seconds between two reviews')
+    parser.add_argument('--reviews-per-session', type=int, default=20)
+    parser.add_argument('--ai', action='store_true',
+                        help='Check every answer with the AI before reviewing')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seeded-users', type=int, default=50,
+                        help='Number of users created with --seed')
+    parser.add_argument('--seed', type=int, metavar='USERS',
+                        help='Create load-test users in the database and exit')
+    parser.add_argument('--cards', type=int, default=100,
+                        help='Cards per deck created with --seed')
+    args = parser.parse_args()
+
+    if args.seed:
+        seed(args.seed, args.cards)
+        return
+
+    recorder = Recorder()
+    print(f"🚀 {args.users} virtuelle Benutzer für {args.duration:.0f} s "
+          f"gegen {args.url}{' mit AI' if args.ai else ''}\n")
+
+    started = time.time()
+    deadline = started + args.ramp_up + args.duration
+
+    def start(index):
+        time.sleep(args.ramp_up * index / args.users)
+        VirtualUser(args, index, recorder).run(deadline)
+
+    with ThreadPoolExecutor(max_workers=args.users) as executor:
+        list(executor.map(start, range(args.users)))
+
+    report(recorder, time.time() - started)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""
+Benchmark for concurrent card reviews on SQLite
+
+Simulates several gunicorn workers that post card reviews at the same time
+and compares the default rollback journal with SQLITE_PERFORMANCE_MODE.
+
+Usage:
+    python benchmarks/sqlite_concurrency.py --workers 4 --reviews 250
+"""
+import argparse
+import multiprocessing
+import os
+import queue as queues
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds to wait for a worker's results before the run is given up
+WORKER_TIMEOUT = 300
+
+
+def setup_django(db_path: str, performance_mode: bool) -> None:
+    """Configure and set up Django for the given database file and mode"""
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'backend.settings'
+    os.environ['SQLITE_PATH'] = db_path
+    os.environ['SQLITE_PERFORMANCE_MODE'] = str(performance_mode)
+
+    import django
+
+    django.setup()
+
+
+def prepare_database(db_path: str, performance_mode: bool, cards: int) -> None:
+    """Create the schema and seed one user, deck and session per worker"""
+    setup_django(db_path, performance_mode)
+
+    from django.core.management import call_command
+
+    from cards.models import Card, Deck, LearningSession, User
+
+    call_command('migrate', verbosity=0)
+
+    user = User.objects.create_user(username='bench', password='bench-pass-123')
+    deck = Deck.objects.create(owner=user, title='Benchmark Deck')
+    Card.objects.bulk_create(
+        Card(deck=deck, front=f'Frage {i}', back=f'Antwort {i}' * 20)
+        for i in range(cards)
+    )
+    LearningSession.objects.create(user=user, deck=deck)
+
+
+def run_worker(db_path, performance_mode, reviews, worker_id, start_at, queue):
+    """Post reviews the same way CardReviewViewSet.perform_create does"""
+    setup_django(db_path, performance_mode)
+
+    from django.db import OperationalError, transaction
+
+    from cards.models import Card, CardReview, LearningSession
+    from cards.srs import evaluate_review, get_schedule
+
+    session = LearningSession.objects.select_related('user').get()
+    card_ids = list(Card.objects.values_list('id', flat=True))
+
+    while time.time() < start_at:
+        time.sleep(0.001)
+
+    latencies = []
+    errors = 0
+    for i in range(reviews):
+        card_id = card_ids[(worker_id * reviews + i) % len(card_ids)]
+        started = time.perf_counter()
+        try:
+            card = Card.objects.get(pk=card_id)
+            with transaction.atomic():
+                review = CardReview.objects.create(
+                    session=session,
+                    card=card,
+                    is_correct=i % 3 != 0,
+                    time_taken=4000,
+                )
+                evaluate_review(
+                    get_schedule(session.user, review.card),
+                    review.is_correct,
+                    float(review.time_taken),
+                )
+        except OperationalError:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+
+    queue.put((latencies, errors))
+
+
+def collect_results(queue, processes) -> list:
+    """
+    The results of all workers
+
+    Raises:
+        RuntimeError: As soon as a worker exited with an error, or if the
+            results are not complete after WORKER_TIMEOUT seconds; a
+            crashed worker never sends its results
+    """
+    results = []
+    deadline = time.time() + WORKER_TIMEOUT
+    while len(results) < len(processes):
+        try:
+            results.append(queue.get(timeout=1))
+            continue
+        except queues.Empty:
+            pass
+        crashed = [process.exitcode for process in processes if process.exitcode]
+        if crashed or time.time() > deadline:
+            for process in processes:
+                process.terminate()
+            reason = f"Exit-Codes {crashed}" if crashed else f"{WORKER_TIMEOUT} s"
+            raise RuntimeError(f"Worker ohne Ergebnis ({reason})")
+    return results
+
+
+def run_mode(performance_mode: bool, workers: int, reviews: int, cards: int) -> dict:
+    """Run one benchmark round in a fresh database and collect the results"""
+    ctx = multiprocessing.get_context('spawn')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'bench.db')
+
+        setup = ctx.Process(
+            target=prepare_database, args=(db_path, performance_mode, cards)
+        )
+        setup.start()
+        setup.join()
+        if setup.exitcode != 0:
+            raise RuntimeError(
+                f"Datenbank-Setup fehlgeschlagen (Exit-Code {setup.exitcode})"
+            )
+
+        queue = ctx.Queue()
+        start_at = time.time() + 2
+        processes = [
+            ctx.Process(
+                target=run_worker,
+                args=(db_path, performance_mode, reviews, worker_id, start_at, queue),
+            )
+            for worker_id in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        results = collect_results(queue, processes)
+        finished_at = time.time()
+        for process in processes:
+            process.join()
+        failed = [process.exitcode for process in processes if process.exitcode != 0]
+        if failed:
+            raise RuntimeError(f"Worker fehlgeschlagen, Exit-Codes: {failed}")
+
+    latencies = sorted(latency for result in results for latency in result[0])
+    errors = sum(result[1] for result in results)
+    elapsed = finished_at - start_at
+
+    return {
+        'mode': 'performance' if performance_mode else 'default',
+        'ok': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / elapsed if elapsed > 0 else 0,
+        'p50': statistics.median(latencies) * 1000 if latencies else 0,
+        'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0,
+        'max': latencies[-1] * 1000 if latencies else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--reviews', type=int, default=250)
+    parser.add_argument('--cards', type=int, default=200)
+    parser.add_argument(
+        '--mode', choices=['default', 'performance', 'both'], default='both'
+    )
+    args = parser.parse_args()
+
+    modes = {
+        'default': [False],
+        'performance': [True],
+        'both': [False, True],
+    }[args.mode]
+
+    print(
+        f"🚀 {args.workers} Worker x {args.reviews} Reviews "
+        f"({args.cards} Karten)\n"
+    )
+    print(
+        f"{'Modus':<12} {'OK':>6} {'Fehler':>7} {'Reviews/s':>10} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}"
+    )
+    for performance_mode in modes:
+        result = run_mode(performance_mode, args.workers, args.reviews, args.cards)
+        print(
+            f"{result['mode']:<12} {result['ok']:>6} {result['errors']:>7} "
+            f"{result['throughput']:>10.1f} {result['p50']:>8.1f} "
+            f"{result['p95']:>8.1f} {result['max']:>8.1f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark of the cold start of a worker
+
+Starts fresh interpreters and measures how long it takes to import Django,
+the apps and the URLconf, and then to answer the first request through
+the WSGI application, as a new worker does when the deployment scales
+out. Also reports which heavy optional dependencies were imported on the
+way; they are meant to load on first use only.
+
+Usage:
+    python benchmarks/startup.py --runs 10
+    # Fail (exit code 1) above a budget, e.g. in CI
+    python benchmarks/startup.py --max-import-ms 800 --max-first-request-ms 1200
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported on first use only (AI calls, avatar uploads, API docs)
+HEAVY_MODULES = ('paramiko', 'asyncssh', 'PIL.Image', 'drf_yasg.openapi')
+
+CHILD = """
+import io, json, sys, time
+started = time.perf_counter()
+from backend.wsgi import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+imported = time.perf_counter()
+
+statuses = []
+environ = {
+    'REQUEST_METHOD': 'GET',
+    'PATH_INFO': sys.argv[1],
+    'QUERY_STRING': '',
+    'SERVER_NAME': 'localhost',
+    'SERVER_PORT': '80',
+    'wsgi.url_scheme': 'http',
+    'wsgi.input': io.BytesIO(),
+    'wsgi.errors': sys.stderr,
+}
+b''.join(application(environ, lambda status, headers: statuses.append(status)))
+answered = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_request_ms': (answered - started) * 1000,
+    'status': statuses[0],
+    'heavy': [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def measure(path: str) -> dict:
+    """Cold start of one fresh interpreter"""
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'backend.settings'}
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD, path],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument(
+        '--path', default='/api/v1/decks/',
+        help='URL of the first request (default: an authenticated list, 401)'
+    )
+    parser.add_argument('--max-import-ms', type=float)
+    parser.add_argument('--max-first-request-ms', type=float)
+    args = parser.parse_args()
+
+    results = [measure(args.path) for _ in range(args.runs)]
+    imports = [result['import_ms'] for result in results]
+    requests = [result['first_request_ms'] for result in results]
+    heavy = sorted({name for result in results for name in result['heavy']})
+
+    print(f"🚀 {args.runs} Kaltstarts, erster Request: GET {args.path} "
+          f"({results[0]['status']})\n")
+    print(f"{'Phase':<16}{'min ms':>9}{'p50 ms':>9}{'max ms':>9}")
+    for name, samples in (('Import', imports), ('Erster Request', requests)):
+        print(f"{name:<16}{min(samples):>9.0f}{statistics.median(samples):>9.0f}"
+              f"{max(samples):>9.0f}")
+    print(f"\nSchwere Module geladen: {', '.join(heavy) or 'keine'}")
+
+    failed = False
+    if args.max_import_ms and statistics.median(imports) > args.max_import_ms:
+        print(f"❌ Import über {args.max_import_ms:.0f} ms")
+        failed = True
+    if (args.max_first_request_ms
+            and statistics.median(requests) > args.max_first_request_ms):
+        print(f"❌ Erster Request über {args.max_first_request_ms:.0f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
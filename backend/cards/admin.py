@@ -1,7 +1,22 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
-from .models import Card, CardReview, Deck, LearningSession, User
+from .models import (
+    Card,
+    CardAnalytics,
+    CardReview,
+    CardSchedule,
+    DailyReviewRollup,
+    Deck,
+    DeckAnalytics,
+    DeckRanking,
+    IdempotencyKey,
+    LearningSession,
+    ReviewArchive,
+    ScheduledJob,
+    SchedulerLock,
+    User,
+)
 
 
 @admin.register(User)
@@ -35,11 +50,22 @@ class CardAdmin(admin.ModelAdmin):
     """
     Card admin configuration
     """
-    list_display = ['front', 'deck', 'created_at']
+    list_display = ['front', 'deck', 'duplicate_of', 'created_at']
     list_filter = ['deck', 'created_at']
     search_fields = ['front', 'back', 'deck__title']
     ordering = ['-created_at']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['duplicate_of', 'created_at', 'updated_at']
+
+@admin.register(CardSchedule)
+class CardScheduleAdmin(admin.ModelAdmin):
+    """
+    Card schedule admin configuration
+    """
+    list_display = ['user', 'card', 'interval', 'ease_factor', 'next_review']
+    list_filter = ['next_review']
+    search_fields = ['user__username', 'card__front']
+    ordering = ['next_review']
+    readonly_fields = ['updated_at']
 
 @admin.register(LearningSession)
 class LearningSessionAdmin(admin.ModelAdmin):
@@ -61,4 +87,86 @@ class CardReviewAdmin(admin.ModelAdmin):
     list_filter = ['is_correct', 'created_at']
     search_fields = ['session__user__username', 'card__front']
     ordering = ['-created_at']
-    readonly_fields = ['created_at']
\ No newline at end of file
+    readonly_fields = ['created_at']
+
+@admin.register(DailyReviewRollup)
+class DailyReviewRollupAdmin(admin.ModelAdmin):
+    """
+    Daily review rollup admin configuration
+    """
+    list_display = ['user', 'deck', 'day', 'review_count', 'correct_count']
+    list_filter = ['day']
+    search_fields = ['user__username', 'deck__title']
+    ordering = ['-day']
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    """
+    Idempotency key admin configuration
+    """
+    list_display = ['user', 'key', 'status_code', 'created_at', 'expires_at']
+    search_fields = ['user__username', 'key']
+    ordering = ['-created_at']
+    readonly_fields = ['created_at']
+
+@admin.register(DeckRanking)
+class DeckRankingAdmin(admin.ModelAdmin):
+    """
+    Deck ranking admin configuration
+    """
+    list_display = ['rank', 'deck', 'score', 'learner_count', 'refreshed_at']
+    search_fields = ['deck__title']
+    ordering = ['rank']
+
+@admin.register(CardAnalytics)
+class CardAnalyticsAdmin(admin.ModelAdmin):
+    """
+    Card analytics admin configuration
+    """
+    list_display = [
+        'card', 'deck', 'review_count', 'lapse_rate', 'leech_count', 'weakness'
+    ]
+    search_fields = ['card__front', 'deck__title']
+    ordering = ['-weakness']
+
+@admin.register(DeckAnalytics)
+class DeckAnalyticsAdmin(admin.ModelAdmin):
+    """
+    Deck analytics admin configuration
+    """
+    list_display = ['deck', 'review_count', 'leech_count', 'weakness', 'refreshed_at']
+    search_fields = ['deck__title']
+    ordering = ['-weakness']
+
+@admin.register(ScheduledJob)
+class ScheduledJobAdmin(admin.ModelAdmin):
+    """
+    Scheduled job admin configuration
+    """
+    list_display = [
+        'name', 'last_started_at', 'last_duration', 'last_result',
+        'run_count', 'failure_count',
+    ]
+    ordering = ['name']
+    readonly_fields = [
+        'last_started_at', 'last_finished_at', 'last_duration', 'last_result',
+        'last_error', 'run_count', 'failure_count',
+    ]
+
+@admin.register(SchedulerLock)
+class SchedulerLockAdmin(admin.ModelAdmin):
+    """
+    Scheduler lock admin configuration
+    """
+    list_display = ['name', 'owner', 'expires_at']
+
+@admin.register(ReviewArchive)
+class ReviewArchiveAdmin(admin.ModelAdmin):
+    """
+    Review archive admin configuration
+    """
+    list_display = ['user', 'month', 'review_count', 'archived_at']
+    search_fields = ['user__username']
+    ordering = ['-month']
+    exclude = ['data']
+    readonly_fields = ['user', 'month', 'review_count', 'archived_at']
@@ -0,0 +1,124 @@
+"""
+Framing of the JSON protocol spoken with the AI module (ai/src/server.rs)
+
+Every message is one JSON object on one line (newline-delimited JSON).
+Requests carry an `id` that the server copies into every response to
+that request, so the client never has to guess which line answers it.
+The client runs the protocol on an exec channel (`EXEC_COMMAND`) without
+a PTY: no echo, no line-ending translation, no shell prompt.
+"""
+import json
+import uuid
+
+from django.conf import settings
+
+EXEC_COMMAND = 'mcp'
+TERMINAL_STATUSES = ('completed', 'error')
+READ_SIZE = 64 * 1024
+
+
+class ProtocolError(ConnectionError):
+    """The AI module sent something that is not a valid frame"""
+
+
+class MessageTooLarge(ProtocolError):
+    """A frame exceeded AI_MAX_MESSAGE_BYTES"""
+
+
+def max_message_bytes() -> int:
+    return getattr(settings, 'AI_MAX_MESSAGE_BYTES', 16 * 1024 * 1024)
+
+
+def encode_request(command: dict) -> tuple:
+    """
+    Frames a command with a new request id
+
+    Returns:
+        Tuple of the request id and the bytes to send
+    """
+    request_id = uuid.uuid4().hex
+    frame = json.dumps({**command, 'id': request_id}, ensure_ascii=False)
+    return request_id, frame.encode() + b'\n'
+
+
+class FrameDecoder:
+    """
+    Splits a byte stream into JSON frames
+
+    Bytes are buffered until a newline completes a frame, however the
+    stream was chunked; a frame growing past max_size is rejected before
+    the rest of it is read.
+    """
+
+    def __init__(self, max_size: int = None):
+        self.max_size = max_size or max_message_bytes()
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes) -> list:
+        """
+        Adds received bytes
+
+        Returns:
+            The frames completed by the data, decoded
+
+        Raises:
+            MessageTooLarge: If a frame exceeds max_size
+            ProtocolError: If a frame is not a JSON object
+        """
+        self.buffer += data
+        frames = []
+        while True:
+            end = self.buffer.find(b'\n')
+            if end < 0:
+                break
+            line = bytes(self.buffer[:end]).strip()
+            del self.buffer[:end + 1]
+            if len(line) > self.max_size:
+                raise MessageTooLarge(
+                    f"Nachricht mit {len(line)} Bytes überschreitet "
+                    f"{self.max_size} Bytes"
+                )
+            if line:
+                frames.append(decode_frame(line))
+        if len(self.buffer) > self.max_size:
+            raise MessageTooLarge(
+                f"Nachricht überschreitet {self.max_size} Bytes"
+            )
+        return frames
+
+
+def decode_frame(line: bytes) -> dict:
+    try:
+        frame = json.loads(line)
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ProtocolError(f"Ungültiger Frame: {e}") from None
+    if not isinstance(frame, dict):
+        raise ProtocolError("Ungültiger Frame: kein JSON-Objekt")
+    return frame
+
+
+def final_response(frames: list, request_id: str):
+    """
+    The final response to a request among decoded frames, or None
+
+    Progress frames ("connected", "processing") are skipped.
+
+    Raises:
+        ProtocolError: If a frame carries the id of another request, or a
+            final frame carries none (the server rejecting a frame it could
+            not attribute, e.g. one over its size limit)
+    """
+    for frame in frames:
+        frame_id = frame.get('id')
+        if frame_id is not None and frame_id != request_id:
+            raise ProtocolError(
+                f"Antwort auf fremde Anfrage {frame_id!r} statt {request_id!r}"
+            )
+        if frame.get('status') not in TERMINAL_STATUSES:
+            continue
+        if frame_id is None:
+            raise ProtocolError(
+                f"Antwort ohne Anfrage-ID: {frame.get('error') or frame.get('status')}"
+            )
+        return frame
+    return None
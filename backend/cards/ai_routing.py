@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest call in the latency average of an endpoint
+LATENCY_SMOOTHING = 0.2
+# Assumed latency of an endpoint that has not answered yet
+INITIAL_LATENCY = 1.0
+
+
+class NoEndpointAvailable(ConnectionError):
+    """Every AI endpoint stayed draining or at its concurrency limit"""
+
+
+def _wake(waiter) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class Endpoint:
+    """One AI module instance and its load as seen by this process"""
+
+    def __init__(self, host, port=2222, weight=1.0, max_concurrency=0, drain=False):
+        self.host = host
+        self.port = int(port)
+        self.weight = float(weight)
+        self.max_concurrency = int(max_concurrency)
+        self.drain = bool(drain)
+        self.in_flight = 0
+        self.latency = None
+        self.failed_until = 0.0
+
+    @property
+    def name(self) -> str:
+        return f'{self.host}:{self.port}'
+
+    def has_capacity(self) -> bool:
+        return not self.max_concurrency or self.in_flight < self.max_concurrency
+
+    def load(self, default_latency: float) -> float:
+        """Expected wait of a new call: queue length times latency, per weight"""
+        latency = self.latency if self.latency is not None else default_latency
+        return (self.in_flight + 1) * latency / self.weight
+
+    def as_dict(self, now: float) -> dict:
+        return {
+            'name': self.name,
+            'weight': self.weight,
+            'max_concurrency': self.max_concurrency,
+            'drain': self.drain,
+            'healthy': self.failed_until <= now,
+            'in_flight': self.in_flight,
+            'latency': self.latency,
+        }
+
+
+class EndpointRouter:
+    """
+    Routes AI calls to the least-loaded healthy endpoint
+
+    An endpoint's load is its in-flight calls (plus the new one) times its
+    smoothed recent latency, divided by its weight. Endpoints that are
+    draining or at max_concurrency get no new calls; when every endpoint
+    is full, a call waits up to AI_ENDPOINT_QUEUE_TIMEOUT seconds for a
+    slot to free up. An endpoint whose call failed is skipped for
+    AI_ENDPOINT_RETRY_AFTER seconds unless no other endpoint is left. The
+    counters are per process and guarded by a lock, so sync calls from
+    worker threads and async calls share them.
+    """
+
+    def __init__(
+        self, endpoints, retry_after: float = 30, queue_timeout: float = 30
+    ):
+        self.endpoints = endpoints
+        self.retry_after = retry_after
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        # Sync callers wait on the condition, async callers on a future of
+        # their own event loop; both are woken whenever a slot frees up.
+        self._freed = threading.Condition(self._lock)
+        self._async_waiters = set()
+
+    def _try_select(self):
+        """The endpoint for a new call, or None if all are full (lock held)"""
+        now = time.monotonic()
+        open_endpoints = [
+            endpoint for endpoint in self.endpoints
+            if not endpoint.drain and endpoint.has_capacity()
+        ]
+        if not open_endpoints:
+            return None
+        healthy = [
+            endpoint for endpoint in open_endpoints
+            if endpoint.failed_until <= now
+        ]
+        known = [e.latency for e in self.endpoints if e.latency is not None]
+        default_latency = (
+            sum(known) / len(known) if known else INITIAL_LATENCY
+        )
+        if healthy:
+            endpoint = min(healthy, key=lambda e: e.load(default_latency))
+        else:
+            # Everything failed recently: try the one that failed first
+            endpoint = min(open_endpoints, key=lambda e: e.failed_until)
+        endpoint.in_flight += 1
+        return endpoint
+
+    def _unavailable(self) -> NoEndpointAvailable:
+        return NoEndpointAvailable(
+            "Alle AI-Endpunkte sind ausgelastet oder im Drain-Modus"
+        )
+
+    def _select(self) -> Endpoint:
+        deadline = time.monotonic() + self.queue_timeout
+        with self._lock:
+            while (endpoint := self._try_select()) is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._unavailable()
+                self._freed.wait(remaining)
+            return endpoint
+
+    async def _select_async(self) -> Endpoint:
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + self.queue_timeout
+        while True:
+            with self._lock:
+                endpoint = self._try_select()
+                if endpoint is not None:
+                    return endpoint
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._unavailable()
+                waiter = (loop, loop.create_future())
+                self._async_waiters.add(waiter)
+            try:
+                await asyncio.wait_for(waiter[1], remaining)
+            except TimeoutError:
+                pass
+            finally:
+                with self._lock:
+                    self._async_waiters.discard(waiter)
+
+    def _free_slot(self, endpoint: Endpoint) -> None:
+        """Gives back a slot and wakes the waiting calls (lock held)"""
+        endpoint.in_flight -= 1
+        self._freed.notify_all()
+        for loop, future in self._async_waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def _release(self, endpoint: Endpoint, duration, failed: bool) -> None:
+        with self._lock:
+            self._free_slot(endpoint)
+            if failed:
+                endpoint.failed_until = time.monotonic() + self.retry_after
+                return
+            endpoint.failed_until = 0.0
+            if duration is None:
+                return
+            if endpoint.latency is None:
+                endpoint.latency = duration
+            else:
+                endpoint.latency += LATENCY_SMOOTHING * (duration - endpoint.latency)
+
+    @contextmanager
+    def acquire(self, track_latency: bool = True):
+        """
+        Reserves the least-loaded endpoint for one sync call
+
+        Blocks the calling thread while every endpoint is full. The call's
+        duration updates the endpoint's latency unless track_latency is
+        False (connection probes); an error marks it unhealthy. A cancelled
+        call only frees its slot.
+
+        Raises:
+            NoEndpointAvailable: If every endpoint stayed draining or full
+                for queue_timeout seconds
+        """
+        endpoint = self._select()
+        with self._track(endpoint, track_latency):
+            yield endpoint
+
+    @asynccontextmanager
+    async def acquire_async(self, track_latency: bool = True):
+        """
+        Reserves the least-loaded endpoint for one async call
+
+        Like acquire(), but waits for a free slot without blocking the
+        event loop.
+        """
+        endpoint = await self._select_async()
+        with self._track(endpoint, track_latency):
+            yield endpoint
+
+    @contextmanager
+    def _track(self, endpoint: Endpoint, track_latency: bool):
+        started = time.perf_counter()
+        try:
+            yield endpoint
+        except Exception:
+            self._release(endpoint, time.perf_counter() - started, failed=True)
+            logger.warning(
+                f"AI-Endpunkt {endpoint.name} fehlgeschlagen, "
+                f"pausiert für {self.retry_after:.0f} s"
+            )
+            raise
+        except BaseException:
+            with self._lock:
+                self._free_slot(endpoint)
+            raise
+        duration = time.perf_counter() - started if track_latency else None
+        self._release(endpoint, duration, failed=False)
+
+    def capacity(self):
+        """Concurrent calls the open endpoints accept, None if unlimited"""
+        open_endpoints = [e for e in self.endpoints if not e.drain]
+        if any(not endpoint.max_concurrency for endpoint in open_endpoints):
+            return None
+        return sum(endpoint.max_concurrency for endpoint in open_endpoints)
+
+    def snapshot(self) -> list:
+        now = time.monotonic()
+        with self._lock:
+            return [endpoint.as_dict(now) for endpoint in self.endpoints]
+
+
+def configured_endpoints() -> list:
+    """
+    AI_ENDPOINTS, or the single AI_SSH_HOST/AI_SSH_PORT endpoint
+
+    Each entry is a dict with host and optionally port, weight,
+    max_concurrency (0: unlimited) and drain.
+    """
+    endpoints = getattr(settings, 'AI_ENDPOINTS', None)
+    if endpoints:
+        return endpoints
+    return [{
+        'host': getattr(settings, 'AI_SSH_HOST', 'localhost'),
+        'port': getattr(settings, 'AI_SSH_PORT', 2222),
+    }]
+
+
+_router = None
+_router_config = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> EndpointRouter:
+    """
+    The process-wide router of the configured endpoints
+
+    Rebuilt when the configuration changes; in-flight counts of the old
+    router are dropped with it.
+    """
+    global _router, _router_config
+    config = (
+        repr(configured_endpoints()),
+        getattr(settings, 'AI_ENDPOINT_RETRY_AFTER', 30),
+        getattr(settings, 'AI_ENDPOINT_QUEUE_TIMEOUT', 30),
+    )
+    with _router_lock:
+        if _router is None or _router_config != config:
+            _router = EndpointRouter(
+                [Endpoint(**endpoint) for endpoint in configured_endpoints()],
+                retry_after=config[1],
+                queue_timeout=config[2],
+            )
+            _router_config = config
+        return _router
@@ -1,12 +1,54 @@
-import json
+import asyncio
 import logging
-import paramiko
+import random
+import time
 from typing import Dict, Optional, List
 from django.conf import settings
 
+from .ai_protocol import (
+    EXEC_COMMAND,
+    READ_SIZE,
+    FrameDecoder,
+    encode_request,
+    final_response,
+)
+from .ai_routing import get_router
+from .metrics import track_ai_call, track_ai_fan_out
+
 logger = logging.getLogger(__name__)
 
 
+def is_complete(response: Dict) -> bool:
+    """Whether a final frame reports a successful tool call"""
+    return response.get('status') == 'completed' and response.get('state') == 'complete'
+
+
+def chunk_sizes(count: int, chunk_size: int) -> List[int]:
+    """Splits count into near-equal chunks of at most chunk_size"""
+    chunks = max(1, -(-count // chunk_size))
+    base, extra = divmod(count, chunks)
+    return [base + 1 if i < extra else base for i in range(chunks)]
+
+
+def merge_chunks(results: List[Optional[Dict]]) -> Optional[Dict]:
+    """
+    Merges the results of the chunks of one generation
+
+    Returns:
+        Dict with the deck of the first successful chunk, the cards of all
+        successful chunks and the number of failed chunks, or None if no
+        chunk succeeded
+    """
+    succeeded = [result for result in results if result]
+    if not succeeded:
+        return None
+    return {
+        'deck': succeeded[0].get('deck', {}),
+        'cards': [card for result in succeeded for card in result.get('cards', [])],
+        'failed_chunks': len(results) - len(succeeded),
+    }
+
+
 class AIService:
     """
     Service for communication with the AI module
@@ -16,31 +58,46 @@ class AIService:
         self.ssh_host = getattr(settings, 'AI_SSH_HOST', 'localhost')
         self.ssh_port = getattr(settings, 'AI_SSH_PORT', 2222)
         self.ssh_username = getattr(settings, 'AI_SSH_USERNAME', 'flashcard_user')
-        self.ssh_password = getattr(settings, 'AI_SSH_PASSWORD', 'flashcard_secure_password_2024')
+        self.ssh_password = getattr(
+            settings, 'AI_SSH_PASSWORD', 'flashcard_secure_password_2024'
+        )
         self.ssh_key_path = getattr(settings, 'AI_SSH_KEY_PATH', None)
+        self.timeout = getattr(settings, 'AI_SSH_TIMEOUT', 120)
+        self.chunk_size = getattr(settings, 'AI_GENERATE_CHUNK_SIZE', 20)
+        self.parallel_chunks = getattr(settings, 'AI_GENERATE_PARALLEL_CHUNKS', 4)
+        self.chunk_retries = getattr(settings, 'AI_GENERATE_CHUNK_RETRIES', 2)
+        self.retry_backoff = getattr(settings, 'AI_GENERATE_RETRY_BACKOFF', 0.5)
+        self.router = get_router()
     
-    def _create_ssh_connection(self):
+    def _create_ssh_connection(self, endpoint):
         """
-        Creates a SSH connection to the AI module
+        Creates a SSH connection to an instance of the AI module
+
+        Args:
+            endpoint: The Endpoint chosen by the router
 
         Returns:
             SSHClient with active connection
         """
+        # Imported on first use: paramiko pulls in cryptography and nacl,
+        # which every worker, command and test run would pay for at boot
+        import paramiko
+
         try:
             ssh = paramiko.SSHClient()
             ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
             
             if self.ssh_key_path:
                 ssh.connect(
-                    self.ssh_host,
-                    port=self.ssh_port,
+                    endpoint.host,
+                    port=endpoint.port,
                     username=self.ssh_username,
                     key_filename=self.ssh_key_path
                 )
             else:
                 ssh.connect(
-                    self.ssh_host,
-                    port=self.ssh_port,
+                    endpoint.host,
+                    port=endpoint.port,
                     username=self.ssh_username,
                     password=self.ssh_password
                 )
@@ -53,6 +110,9 @@ class AIService:
     def _send_ssh_command(self, command: Dict) -> Dict:
         """
         Sends a command over SSH and receives the response
+
+        The command goes to the least-loaded AI endpoint (see ai_routing)
+        as a framed request on an exec channel (see ai_protocol).
         
         Args:
             command: The command to send as a Dict
@@ -60,37 +120,32 @@ class AIService:
         Returns:
             The response from the AI module as a Dict
         """
+        with track_ai_call(command.get('tool') or command.get('command')):
+            with self.router.acquire() as endpoint:
+                return self._send_ssh_command_untracked(command, endpoint)
+
+    def _send_ssh_command_untracked(self, command: Dict, endpoint) -> Dict:
         ssh = None
         try:
-            ssh = self._create_ssh_connection()
-            channel = ssh.invoke_shell()
-            
-            import time
-            time.sleep(1)
-            
-            command_json = json.dumps(command) + '\n'
-            channel.send(command_json)
-            
-            response = ""
+            ssh = self._create_ssh_connection(endpoint)
+            channel = ssh.get_transport().open_session(timeout=self.timeout)
+            channel.exec_command(EXEC_COMMAND)
+
+            request_id, frame = encode_request(command)
+            channel.sendall(frame)
+
+            decoder = FrameDecoder()
+            deadline = time.monotonic() + self.timeout
             while True:
-                if channel.recv_ready():
-                    data = channel.recv(1024).decode('utf-8')
-                    response += data
-                    if '\n' in data:
-                        break
-                time.sleep(0.1)
-            
-            try:
-                lines = response.strip().split('\n')
-                for line in lines:
-                    if line.strip().startswith('{'):
-                        return json.loads(line)
-                
-                return json.loads(response.strip())
-            except json.JSONDecodeError as e:
-                logger.error(f"JSON-Parsing fehlgeschlagen: {e}, Response: {response}")
-                raise
-                
+                # recv blocks until data arrives; no polling
+                channel.settimeout(max(deadline - time.monotonic(), 0.001))
+                data = channel.recv(READ_SIZE)
+                if not data:
+                    raise ConnectionError("Verbindung ohne Antwort geschlossen")
+                response = final_response(decoder.feed(data), request_id)
+                if response is not None:
+                    return response
+
         except Exception as e:
             logger.error(f"SSH-Kommando fehlgeschlagen: {e}")
             raise
@@ -98,7 +153,13 @@ class AIService:
             if ssh:
                 ssh.close()
     
-    def generate_flashcards(self, prompt: str, language: str = 'de', difficulty: str = 'medium', count: int = 5) -> Optional[Dict]:
+    def generate_flashcards(
+        self,
+        prompt: str,
+        language: str = 'de',
+        difficulty: str = 'medium',
+        count: int = 5,
+    ) -> Optional[Dict]:
         """
         Generates Flashcards based on a prompt over SSH
         
@@ -112,35 +173,41 @@ class AIService:
             Dict with deck and card information or None on error
         """
         try:
-            command = {
-                "command": "mcp_execute",
-                "tool": "generate_flashcards",
-                "parameters": {
-                    "prompt": prompt,
-                    "language": language,
-                    "difficulty": difficulty,
-                    "count": count
-                }
-            }
-            
+            command = self._generate_command(prompt, language, difficulty, count)
             logger.info(f"Generiere Flashcards für Prompt: {prompt[:100]}...")
-            
             response = self._send_ssh_command(command)
-            
-            if response.get('status') == 'completed' and response.get('state') == 'complete':
-                result_data = response.get('data', {}).get('result', {})
-                logger.info("Flashcard-Generierung erfolgreich")
-                return result_data
-            else:
-                error_msg = response.get('error', 'Unbekannter Fehler')
-                logger.error(f"AI-Service Fehler: {error_msg}")
-                return None
-                
+            return self._generate_result(response)
         except Exception as e:
             logger.error(f"Unerwarteter Fehler im AI-Service: {e}")
             return None
+
+    def _generate_command(
+        self, prompt: str, language: str, difficulty: str, count: int
+    ) -> Dict:
+        return {
+            "command": "mcp_execute",
+            "tool": "generate_flashcards",
+            "parameters": {
+                "prompt": prompt,
+                "language": language,
+                "difficulty": difficulty,
+                "count": count
+            }
+        }
+
+    def _generate_result(self, response: Dict) -> Optional[Dict]:
+        if is_complete(response):
+            result_data = response.get('data', {}).get('result', {})
+            logger.info("Flashcard-Generierung erfolgreich")
+            return result_data
+        else:
+            error_msg = response.get('error', 'Unbekannter Fehler')
+            logger.error(f"AI-Service Fehler: {error_msg}")
+            return None
     
-    def check_answer_correctness(self, answer: str, user_answer: str) -> Optional[float]:
+    def check_answer_correctness(
+        self, answer: str, user_answer: str
+    ) -> Optional[float]:
         """
         Checks the correctness of a user answer over SSH
         
@@ -152,32 +219,34 @@ class AIService:
             Similarity value between 0.0 and 1.0 or None on error
         """
         try:
-            command = {
-                "command": "mcp_execute",
-                "tool": "check_answer",
-                "parameters": {
-                    "correct_answer": answer,
-                    "user_answer": user_answer
-                }
-            }
-            
+            command = self._check_answer_command(answer, user_answer)
             logger.info("Überprüfe Antwort-Korrektheit...")
-            
             response = self._send_ssh_command(command)
-            
-            if response.get('status') == 'completed' and response.get('state') == 'complete':
-                result_data = response.get('data', {}).get('result', {})
-                similarity = result_data.get('similarity', 0.0)
-                logger.info(f"Antwort-Korrektheit überprüft: {similarity}")
-                return similarity
-            else:
-                error_msg = response.get('error', 'Unbekannter Fehler')
-                logger.error(f"AI-Service Fehler: {error_msg}")
-                return None
-                
+            return self._check_answer_result(response)
         except Exception as e:
             logger.error(f"Unerwarteter Fehler im AI-Service: {e}")
             return None
+
+    def _check_answer_command(self, answer: str, user_answer: str) -> Dict:
+        return {
+            "command": "mcp_execute",
+            "tool": "check_answer",
+            "parameters": {
+                "correct_answer": answer,
+                "user_answer": user_answer
+            }
+        }
+
+    def _check_answer_result(self, response: Dict) -> Optional[float]:
+        if is_complete(response):
+            result_data = response.get('data', {}).get('result', {})
+            similarity = result_data.get('similarity', 0.0)
+            logger.info(f"Antwort-Korrektheit überprüft: {similarity}")
+            return similarity
+        else:
+            error_msg = response.get('error', 'Unbekannter Fehler')
+            logger.error(f"AI-Service Fehler: {error_msg}")
+            return None
     
     def get_available_tools(self) -> Optional[List[str]]:
         """
@@ -187,26 +256,24 @@ class AIService:
             List of available tool names or None on error
         """
         try:
-            command = {
-                "command": "mcp_tools"
-            }
-            
-            response = self._send_ssh_command(command)
-            
-            if response.get('status') == 'completed' and response.get('state') == 'complete':
-                tools_data = response.get('data', {}).get('tools', [])
-                tool_names = [tool.get('name', '') for tool in tools_data if tool.get('name')]
-                return tool_names
-            else:
-                error_msg = response.get('error', 'Unbekannter Fehler')
-                logger.error(f"AI-Service Fehler beim Abrufen der Tools: {error_msg}")
-                return None
-                
+            response = self._send_ssh_command({"command": "mcp_tools"})
+            return self._tools_result(response)
         except Exception as e:
             logger.error(f"Fehler beim Abrufen der verfügbaren Tools: {e}")
             return None
+
+    def _tools_result(self, response: Dict) -> Optional[List[str]]:
+        if is_complete(response):
+            tools_data = response.get('data', {}).get('tools', [])
+            return [tool.get('name', '') for tool in tools_data if tool.get('name')]
+        else:
+            error_msg = response.get('error', 'Unbekannter Fehler')
+            logger.error(f"AI-Service Fehler beim Abrufen der Tools: {error_msg}")
+            return None
     
-    def explain_concept(self, question: str, context: str = "", language: str = 'de') -> Optional[str]:
+    def explain_concept(
+        self, question: str, context: str = "", language: str = 'de'
+    ) -> Optional[str]:
         """
         Explains a concept over SSH
         
@@ -219,35 +286,37 @@ class AIService:
             The explanation as a String or None on error
         """
         try:
-            command = {
-                "command": "mcp_execute",
-                "tool": "explain",
-                "parameters": {
-                    "question": question,
-                    "context": context,
-                    "language": language
-                }
-            }
-            
+            command = self._explain_command(question, context, language)
             logger.info(f"Erkläre Konzept: {question[:50]}...")
-            
             response = self._send_ssh_command(command)
-            
-            if response.get('status') == 'completed' and response.get('state') == 'complete':
-                result_data = response.get('data', {}).get('result', {})
-                if 'content' in result_data:
-                    for content in result_data['content']:
-                        if content.get('type') == 'text':
-                            return content.get('text', '')
-                return str(result_data)
-            else:
-                error_msg = response.get('error', 'Unbekannter Fehler')
-                logger.error(f"AI-Service Fehler: {error_msg}")
-                return None
-                
+            return self._explain_result(response)
         except Exception as e:
             logger.error(f"Unerwarteter Fehler im AI-Service: {e}")
             return None
+
+    def _explain_command(self, question: str, context: str, language: str) -> Dict:
+        return {
+            "command": "mcp_execute",
+            "tool": "explain",
+            "parameters": {
+                "question": question,
+                "context": context,
+                "language": language
+            }
+        }
+
+    def _explain_result(self, response: Dict) -> Optional[str]:
+        if is_complete(response):
+            result_data = response.get('data', {}).get('result', {})
+            if 'content' in result_data:
+                for content in result_data['content']:
+                    if content.get('type') == 'text':
+                        return content.get('text', '')
+            return str(result_data)
+        else:
+            error_msg = response.get('error', 'Unbekannter Fehler')
+            logger.error(f"AI-Service Fehler: {error_msg}")
+            return None
     
     def is_service_available(self) -> bool:
         """
@@ -257,9 +326,251 @@ class AIService:
             True if the service is available, False otherwise
         """
         try:
-            ssh = self._create_ssh_connection()
-            ssh.close()
+            with self.router.acquire(track_latency=False) as endpoint:
+                ssh = self._create_ssh_connection(endpoint)
+                ssh.close()
+            return True
+        except Exception as e:
+            logger.error(f"AI-Service nicht verfügbar: {e}")
+            return False 
+
+
+class AsyncAIService(AIService):
+    """
+    Non-blocking variant of the AIService for async views
+
+    Uses asyncssh, so a single event loop can keep hundreds of AI calls in
+    flight while each one waits on the network.
+    """
+
+    async def _create_ssh_connection(self, endpoint):
+        """
+        Creates a SSH connection to an instance of the AI module
+
+        Args:
+            endpoint: The Endpoint chosen by the router
+
+        Returns:
+            SSHClientConnection with active connection
+        """
+        import asyncssh
+
+        options = {
+            'port': endpoint.port,
+            'username': self.ssh_username,
+            'known_hosts': None,
+        }
+        if self.ssh_key_path:
+            options['client_keys'] = [self.ssh_key_path]
+        else:
+            options['password'] = self.ssh_password
+            options['client_keys'] = None
+
+        try:
+            return await asyncio.wait_for(
+                asyncssh.connect(endpoint.host, **options), timeout=self.timeout
+            )
+        except Exception as e:
+            logger.error(f"SSH-Verbindung fehlgeschlagen: {e}")
+            raise
+
+    async def _send_ssh_command(self, command: Dict) -> Dict:
+        """
+        Sends a command over SSH and awaits the final response
+
+        Progress frames ("connected", "processing") are skipped until the
+        completed or error frame with the request's id arrives.
+
+        Args:
+            command: The command to send as a Dict
+
+        Returns:
+            The response from the AI module as a Dict
+        """
+        with track_ai_call(command.get('tool') or command.get('command')):
+            async with self.router.acquire_async() as endpoint:
+                return await self._send_ssh_command_untracked(command, endpoint)
+
+    async def _send_ssh_command_untracked(self, command: Dict, endpoint) -> Dict:
+        try:
+            async with await self._create_ssh_connection(endpoint) as conn:
+                process = await conn.create_process(EXEC_COMMAND, encoding=None)
+                request_id, frame = encode_request(command)
+                process.stdin.write(frame)
+
+                decoder = FrameDecoder()
+                async with asyncio.timeout(self.timeout):
+                    while data := await process.stdout.read(READ_SIZE):
+                        response = final_response(decoder.feed(data), request_id)
+                        if response is not None:
+                            return response
+
+                raise ConnectionError("Verbindung ohne Antwort geschlossen")
+        except Exception as e:
+            logger.error(f"SSH-Kommando fehlgeschlagen: {e}")
+            raise
+
+    async def generate_flashcards(
+        self,
+        prompt: str,
+        language: str = 'de',
+        difficulty: str = 'medium',
+        count: int = 5,
+    ) -> Optional[Dict]:
+        """
+        Generates Flashcards based on a prompt over SSH
+
+        Args:
+            prompt: The user prompt for the flashcard generation
+            language: The language (de/en)
+            difficulty: Difficulty (easy/medium/hard)
+            count: Number of flashcards to generate
+
+        Returns:
+            Dict with deck and card information or None on error
+        """
+        try:
+            command = self._generate_command(prompt, language, difficulty, count)
+            logger.info(f"Generiere Flashcards für Prompt: {prompt[:100]}...")
+            response = await self._send_ssh_command(command)
+            return self._generate_result(response)
+        except Exception as e:
+            logger.error(f"Unerwarteter Fehler im AI-Service: {e}")
+            return None
+
+    async def generate_flashcards_chunked(
+        self,
+        prompt: str,
+        language: str = 'de',
+        difficulty: str = 'medium',
+        count: int = 5,
+    ) -> Optional[Dict]:
+        """
+        Generates a large deck as concurrent chunks of at most chunk_size cards
+
+        Every chunk runs over its own SSH connection, at most
+        parallel_chunks at a time (and never more than the AI endpoints
+        accept), so the deck takes about as long as the slowest chunk. A
+        failed chunk is retried on its own up to chunk_retries times, after
+        a jittered, exponentially growing pause of about retry_backoff
+        seconds; chunks that still fail are left out.
+        Repeated cards across chunks are not removed here but when the deck
+        is stored (see AIGenerateView.create_deck).
+
+        Args:
+            prompt: The user prompt for the flashcard generation
+            language: The language (de/en)
+            difficulty: Difficulty (easy/medium/hard)
+            count: Total number of flashcards to generate
+
+        Returns:
+            Dict with the deck of the first successful chunk and the cards of
+            all chunks in chunk order, or None if every chunk failed
+        """
+        sizes = chunk_sizes(count, self.chunk_size)
+        parallel = self.parallel_chunks
+        capacity = self.router.capacity()
+        if capacity is not None:
+            parallel = max(1, min(parallel, capacity))
+        semaphore = asyncio.Semaphore(parallel)
+
+        async def generate_chunk(index: int, size: int) -> Optional[Dict]:
+            async with semaphore:
+                for attempt in range(self.chunk_retries + 1):
+                    if attempt:
+                        await asyncio.sleep(
+                            self.retry_backoff * 2 ** (attempt - 1)
+                            * random.uniform(0.5, 1.5)
+                        )
+                    result = await self.generate_flashcards(
+                        prompt, language, difficulty, size
+                    )
+                    if result and result.get('cards'):
+                        return result
+                    logger.warning(
+                        f"Chunk {index + 1}/{len(sizes)} fehlgeschlagen "
+                        f"(Versuch {attempt + 1})"
+                    )
+                return None
+
+        with track_ai_fan_out():
+            results = await asyncio.gather(*(
+                generate_chunk(index, size) for index, size in enumerate(sizes)
+            ))
+        return merge_chunks(results)
+
+    async def check_answer_correctness(
+        self, answer: str, user_answer: str
+    ) -> Optional[float]:
+        """
+        Checks the correctness of a user answer over SSH
+
+        Args:
+            answer: The correct answer
+            user_answer: The user answer
+
+        Returns:
+            Similarity value between 0.0 and 1.0 or None on error
+        """
+        try:
+            command = self._check_answer_command(answer, user_answer)
+            logger.info("Überprüfe Antwort-Korrektheit...")
+            response = await self._send_ssh_command(command)
+            return self._check_answer_result(response)
+        except Exception as e:
+            logger.error(f"Unerwarteter Fehler im AI-Service: {e}")
+            return None
+
+    async def get_available_tools(self) -> Optional[List[str]]:
+        """
+        Gets available tools from the AI module
+
+        Returns:
+            List of available tool names or None on error
+        """
+        try:
+            response = await self._send_ssh_command({"command": "mcp_tools"})
+            return self._tools_result(response)
+        except Exception as e:
+            logger.error(f"Fehler beim Abrufen der verfügbaren Tools: {e}")
+            return None
+
+    async def explain_concept(
+        self, question: str, context: str = "", language: str = 'de'
+    ) -> Optional[str]:
+        """
+        Explains a concept over SSH
+
+        Args:
+            question: The question or concept to explain
+            context: Optional context (e.g. user's wrong answer)
+            language: Language for the explanation
+
+        Returns:
+            The explanation as a String or None on error
+        """
+        try:
+            command = self._explain_command(question, context, language)
+            logger.info(f"Erkläre Konzept: {question[:50]}...")
+            response = await self._send_ssh_command(command)
+            return self._explain_result(response)
+        except Exception as e:
+            logger.error(f"Unerwarteter Fehler im AI-Service: {e}")
+            return None
+
+    async def is_service_available(self) -> bool:
+        """
+        Checks if the AI service is available over SSH
+
+        Returns:
+            True if the service is available, False otherwise
+        """
+        try:
+            async with self.router.acquire_async(track_latency=False) as endpoint:
+                conn = await self._create_ssh_connection(endpoint)
+                conn.close()
+                await conn.wait_closed()
             return True
         except Exception as e:
             logger.error(f"AI-Service nicht verfügbar: {e}")
-            return False 
\ No newline at end of file
+            return False
@@ -0,0 +1,203 @@
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.utils import timezone
+
+from .archive import review_history
+from .models import Card, CardAnalytics, Deck, DeckAnalytics
+
+# Cards and decks with few reviews are pulled towards this error rate, so
+# a card missed once by its only learner does not top the weakness list
+ERROR_PRIOR = 0.2
+ERROR_PRIOR_REVIEWS = 10
+
+CARD_FIELDS = (
+    'deck',
+    'review_count',
+    'correct_count',
+    'learner_count',
+    'lapse_count',
+    'lapse_rate',
+    'leech_count',
+    'weakness',
+    'refreshed_at',
+)
+DECK_FIELDS = (
+    'review_count',
+    'correct_count',
+    'lapse_count',
+    'leech_count',
+    'weakness',
+    'refreshed_at',
+)
+
+
+def leech_lapses() -> int:
+    return getattr(settings, 'CARD_LEECH_LAPSES', 8)
+
+
+def weakness(reviews: int, correct: int) -> float:
+    """Error rate smoothed towards ERROR_PRIOR"""
+    return (reviews - correct + ERROR_PRIOR * ERROR_PRIOR_REVIEWS) / (
+        reviews + ERROR_PRIOR_REVIEWS
+    )
+
+
+@dataclass
+class Totals:
+    """Review counters of one card or deck"""
+    reviews: int = 0
+    correct: int = 0
+    learners: int = 0
+    lapses: int = 0
+    # Reviews that followed a correct answer of the same learner: the
+    # chances to forget the card
+    retained: int = 0
+    leeches: int = 0
+
+    def add_card(self, card: 'Totals') -> None:
+        """Adds a card to deck totals; leeches counts leech cards"""
+        self.reviews += card.reviews
+        self.correct += card.correct
+        self.learners += card.learners
+        self.lapses += card.lapses
+        self.retained += card.retained
+        self.leeches += 1 if card.leeches else 0
+
+
+def analyze_reviews(now=None, batch_size: int = 5000) -> tuple:
+    """
+    Recomputes the lapse rates, leech flags and weakness scores
+
+    The review history, archived reviews included (see cards/archive.py),
+    is streamed once, sorted by card, learner and time, batch_size rows at
+    a time. Only the counters of the current card and learner and one
+    Totals per deck are held, so memory does not grow with the number of
+    reviews. A lapse is a wrong answer after a correct one by the same
+    learner; a card is a leech for a learner with at least
+    CARD_LEECH_LAPSES lapses.
+
+    Card rows are upserted batch by batch, so no long write transaction
+    blocks the reviews of the night; rows of cards and decks without
+    reviews are deleted at the end.
+
+    Args:
+        now: Timestamp of the run (default: now)
+        batch_size: Rows per fetch and per INSERT
+
+    Returns:
+        Tuple of the number of analyzed cards and decks
+    """
+    now = now or timezone.now()
+    threshold = leech_lapses()
+    rows = review_history(order='card', batch_size=batch_size)
+
+    decks = {}
+    batch = []
+    cards = 0
+    card_id = deck_id = user_id = None
+    card = Totals()
+    last_correct = False
+    learner_lapses = 0
+
+    def finish_learner():
+        if learner_lapses >= threshold:
+            card.leeches += 1
+
+    def finish_card():
+        nonlocal cards
+        decks.setdefault(deck_id, Totals()).add_card(card)
+        batch.append(CardAnalytics(
+            card_id=card_id,
+            deck_id=deck_id,
+            review_count=card.reviews,
+            correct_count=card.correct,
+            learner_count=card.learners,
+            lapse_count=card.lapses,
+            lapse_rate=card.lapses / card.retained if card.retained else 0.0,
+            leech_count=card.leeches,
+            weakness=weakness(card.reviews, card.correct),
+            refreshed_at=now,
+        ))
+        cards += 1
+        if len(batch) >= batch_size:
+            _upsert_cards(batch)
+            batch.clear()
+
+    for row_user, review in rows:
+        if review.card_id != card_id:
+            if card_id is not None:
+                finish_learner()
+                finish_card()
+            card_id, deck_id, user_id = review.card_id, review.deck_id, None
+            card = Totals()
+        if row_user != user_id:
+            if user_id is not None:
+                finish_learner()
+            user_id = row_user
+            card.learners += 1
+            last_correct, learner_lapses = False, 0
+
+        card.reviews += 1
+        if review.is_correct:
+            card.correct += 1
+        if last_correct:
+            card.retained += 1
+            if not review.is_correct:
+                card.lapses += 1
+                learner_lapses += 1
+        last_correct = review.is_correct
+
+    if card_id is not None:
+        finish_learner()
+        finish_card()
+    _upsert_cards(batch)
+
+    _upsert_decks(
+        [
+            DeckAnalytics(
+                deck_id=deck_id,
+                review_count=totals.reviews,
+                correct_count=totals.correct,
+                lapse_count=totals.lapses,
+                leech_count=totals.leeches,
+                weakness=weakness(totals.reviews, totals.correct),
+                refreshed_at=now,
+            )
+            for deck_id, totals in decks.items()
+        ],
+        batch_size,
+    )
+    CardAnalytics.objects.filter(refreshed_at__lt=now).delete()
+    DeckAnalytics.objects.filter(refreshed_at__lt=now).delete()
+    return cards, len(decks)
+
+
+def _upsert_cards(batch) -> None:
+    # Cards deleted while the history was streamed would break the FK
+    existing = set(
+        Card.objects.filter(pk__in=[row.card_id for row in batch])
+        .values_list('pk', flat=True)
+    )
+    CardAnalytics.objects.bulk_create(
+        [row for row in batch if row.card_id in existing],
+        update_conflicts=True,
+        unique_fields=['card'],
+        update_fields=CARD_FIELDS,
+    )
+
+
+def _upsert_decks(rows, batch_size: int) -> None:
+    # Same for decks deleted since; their cards were dropped with them
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        existing = set(
+            Deck.objects.filter(pk__in=[row.deck_id for row in batch])
+            .values_list('pk', flat=True)
+        )
+        DeckAnalytics.objects.bulk_create(
+            [row for row in batch if row.deck_id in existing],
+            update_conflicts=True,
+            unique_fields=['deck'],
+            update_fields=DECK_FIELDS,
+        )
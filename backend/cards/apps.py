@@ -5,3 +5,11 @@ class CardsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cards'
     verbose_name = 'Flashcards'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import signals  # noqa: F401
+        from .metrics import install_sql_wrapper
+
+        connection_created.connect(install_sql_wrapper)
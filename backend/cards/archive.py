@@ -0,0 +1,454 @@
+"""
+Archival of old reviews into compressed monthly blobs
+
+CardReview grows by one row per answer, forever. `archive_reviews` moves
+the reviews older than REVIEW_ARCHIVE_AFTER_DAYS into one ReviewArchive
+row per user and month and deletes their rows. The statistics read the
+daily rollups, which are kept as they are, so nothing the users see
+changes; `review_history` streams the complete history (archived and
+live reviews, in bounded memory) for the jobs that replay it.
+
+An archive stores its reviews column by column (ids, timestamps, ...),
+as little-endian 64-bit integers, with ids and timestamps delta-encoded,
+and compresses the result with zlib. Sorted by time, most deltas are small
+and repeat, so a review takes a few bytes instead of a row with indexes.
+"""
+import heapq
+import struct
+import tempfile
+import zlib
+from array import array
+from collections import namedtuple
+from contextlib import ExitStack
+from datetime import datetime, time, timedelta
+from datetime import timezone as dt_timezone
+from sys import byteorder
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import invalidate_user
+from .models import Card, CardReview, LearningSession, ReviewArchive
+
+Review = namedtuple(
+    'Review',
+    'id session_id deck_id card_id is_correct time_taken created_at',
+)
+
+REVIEW_FIELDS = (
+    'id',
+    'session_id',
+    'session__deck_id',
+    'card_id',
+    'is_correct',
+    'time_taken',
+    'created_at',
+)
+# Columns stored as differences to the previous review
+DELTA_COLUMNS = ('id', 'created_at')
+
+MAGIC = b'FCRA'
+VERSION = 1
+HEADER = struct.Struct('<4sHI')
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+# Lookups per query when checking which cards and sessions still exist
+ID_CHUNK = 900
+# Archives fetched per query; every one holds up to a month of reviews
+ARCHIVE_CHUNK = 20
+
+
+class ArchiveFormatError(ValueError):
+    """An archive blob is damaged or was written by an unknown version"""
+
+
+def archive_after_days() -> int:
+    return getattr(settings, 'REVIEW_ARCHIVE_AFTER_DAYS', 365)
+
+
+def archive_cutoff(now=None):
+    """
+    Start of the month that REVIEW_ARCHIVE_AFTER_DAYS ago falls in
+
+    Only whole months are archived, so a month is normally packed once.
+    """
+    day = timezone.localdate(now) - timedelta(days=archive_after_days())
+    return month_start(day)
+
+
+def month_start(day):
+    return timezone.make_aware(datetime.combine(day.replace(day=1), time.min))
+
+
+def next_month(start):
+    return month_start((start.date() + timedelta(days=32)).replace(day=1))
+
+
+def _to_column(values) -> bytes:
+    column = array('q', values)
+    if byteorder != 'little':
+        column.byteswap()
+    return column.tobytes()
+
+
+def _from_column(data: bytes) -> array:
+    column = array('q')
+    column.frombytes(data)
+    if byteorder != 'little':
+        column.byteswap()
+    return column
+
+
+def _deltas(values) -> list:
+    previous = 0
+    deltas = []
+    for value in values:
+        deltas.append(value - previous)
+        previous = value
+    return deltas
+
+
+def _running_sum(deltas) -> list:
+    total = 0
+    values = []
+    for delta in deltas:
+        total += delta
+        values.append(total)
+    return values
+
+
+def encode_reviews(reviews) -> bytes:
+    """
+    Packs reviews into an archive blob
+
+    Args:
+        reviews: Review tuples, sorted by created_at and id
+    """
+    columns = {
+        'id': [review.id for review in reviews],
+        'session_id': [review.session_id for review in reviews],
+        'deck_id': [review.deck_id for review in reviews],
+        'card_id': [review.card_id for review in reviews],
+        'is_correct': [int(review.is_correct) for review in reviews],
+        'time_taken': [review.time_taken for review in reviews],
+        'created_at': [
+            (review.created_at - EPOCH) // MICROSECOND for review in reviews
+        ],
+    }
+    payload = bytearray(HEADER.pack(MAGIC, VERSION, len(reviews)))
+    for name in Review._fields:
+        values = columns[name]
+        payload += _to_column(_deltas(values) if name in DELTA_COLUMNS else values)
+    return zlib.compress(bytes(payload), 9)
+
+
+def decode_reviews(data: bytes) -> list:
+    """
+    Unpacks an archive blob
+
+    Returns:
+        List of Review tuples in chronological order
+
+    Raises:
+        ArchiveFormatError: If data is not a readable archive
+    """
+    try:
+        payload = zlib.decompress(bytes(data))
+        magic, version, count = HEADER.unpack_from(payload)
+    except (zlib.error, struct.error) as e:
+        raise ArchiveFormatError(f"Ungültiges Review-Archiv: {e}") from None
+    if magic != MAGIC or version != VERSION:
+        raise ArchiveFormatError(f"Unbekanntes Review-Archiv: {magic!r} v{version}")
+    size = count * 8
+    if len(payload) != HEADER.size + size * len(Review._fields):
+        raise ArchiveFormatError("Review-Archiv hat die falsche Länge")
+
+    columns = {}
+    offset = HEADER.size
+    for name in Review._fields:
+        values = _from_column(payload[offset:offset + size])
+        columns[name] = _running_sum(values) if name in DELTA_COLUMNS else values
+        offset += size
+    columns['is_correct'] = [bool(value) for value in columns['is_correct']]
+    columns['created_at'] = [
+        EPOCH + value * MICROSECOND for value in columns['created_at']
+    ]
+    return [
+        Review(*row)
+        for row in zip(*(columns[name] for name in Review._fields), strict=True)
+    ]
+
+
+def _sort_key(review):
+    return review.created_at, review.id
+
+
+def archive_reviews(before=None, user_ids=None) -> tuple:
+    """
+    Moves reviews older than before into the monthly archives
+
+    Every user and month is archived in its own transaction: the reviews
+    are added to the month's archive (reviews synced late from offline
+    clients are merged into an existing one) and their rows are deleted.
+    The rows are deleted without signals, so the daily rollups keep
+    counting them and no cache is invalidated per row.
+
+    Args:
+        before: Archive reviews created before this time (default:
+            archive_cutoff())
+        user_ids: Only archive these users (default: everyone)
+
+    Returns:
+        Tuple of the number of archived reviews and written archives
+    """
+    before = before or archive_cutoff()
+    old = CardReview.objects.filter(created_at__lt=before)
+    if user_ids is not None:
+        old = old.filter(session__user_id__in=user_ids)
+    users = (
+        old.order_by('session__user_id')
+        .values_list('session__user_id', flat=True)
+        .distinct()
+    )
+
+    archived = written = 0
+    for user_id in list(users):
+        reviews = old.filter(session__user_id=user_id)
+        for start in list(reviews.datetimes('created_at', 'month')):
+            month = reviews.filter(
+                created_at__gte=start, created_at__lt=next_month(start)
+            )
+            archived += _archive_month(user_id, start.date(), month)
+            written += 1
+        invalidate_user(user_id)
+    return archived, written
+
+
+def _archive_month(user_id, month, reviews) -> int:
+    with transaction.atomic():
+        rows = reviews.order_by('created_at', 'id').values_list(*REVIEW_FIELDS)
+        new = [Review(*row) for row in rows]
+        archive = (
+            ReviewArchive.objects.select_for_update()
+            .filter(user_id=user_id, month=month)
+            .first()
+        )
+        if archive is None:
+            archive = ReviewArchive(user_id=user_id, month=month)
+            merged = new
+        else:
+            merged = sorted(decode_reviews(archive.data) + new, key=_sort_key)
+        archive.review_count = len(merged)
+        archive.data = encode_reviews(merged)
+        archive.save()
+
+        # _raw_delete() skips the signals: the rollups must keep the reviews
+        ids = [review.id for review in new]
+        for first in range(0, len(ids), ID_CHUNK):
+            CardReview.objects.filter(pk__in=ids[first:first + ID_CHUNK])._raw_delete(
+                CardReview.objects.db
+            )
+    return len(new)
+
+
+def rewrite_archives(user_ids, rewrite) -> list:
+    """
+    Changes or drops archived reviews of some users
+
+    Only archives with a changed review are written again; one left
+    without reviews is deleted. The daily rollups are not touched.
+
+    Args:
+        user_ids: Users whose archives are read (ids or a subquery)
+        rewrite: Called with every archived Review; returns it, a changed
+            copy (Review._replace) or None to drop it
+
+    Returns:
+        Tuples of a user id and a Review, one per dropped review
+    """
+    dropped = []
+    # No savepoint: the deletes calling this already run in a transaction
+    with transaction.atomic(savepoint=False):
+        archives = (
+            ReviewArchive.objects.select_for_update()
+            .filter(user_id__in=user_ids)
+            .order_by('user_id', 'month')
+        )
+        for archive in archives.iterator(chunk_size=ARCHIVE_CHUNK):
+            reviews = decode_reviews(archive.data)
+            kept = []
+            for review in reviews:
+                new = rewrite(review)
+                if new is None:
+                    dropped.append((archive.user_id, review))
+                else:
+                    kept.append(new)
+            if kept == reviews:
+                continue
+            if not kept:
+                archive.delete()
+                continue
+            archive.review_count = len(kept)
+            archive.data = encode_reviews(kept)
+            archive.save()
+    return dropped
+
+
+def _existing_ids(model, ids) -> set:
+    ids = list(ids)
+    existing = set()
+    for first in range(0, len(ids), ID_CHUNK):
+        existing.update(
+            model.objects.filter(pk__in=ids[first:first + ID_CHUNK])
+            .values_list('pk', flat=True)
+        )
+    return existing
+
+
+def archived_history(user_ids=None):
+    """
+    Streams the archived reviews in user and time order
+
+    One archive is decoded at a time. Reviews of cards or sessions deleted
+    after archiving are dropped from the archives (see
+    cards/signals.py); any still left, e.g. of a deleted deck, are skipped
+    here, as their rows would have been deleted with them.
+
+    Args:
+        user_ids: Only these users (default: everyone)
+
+    Yields:
+        Tuples of a user id and a Review
+    """
+    archives = ReviewArchive.objects.order_by('user_id', 'month')
+    if user_ids is not None:
+        archives = archives.filter(user_id__in=user_ids)
+    for archive in archives.iterator(chunk_size=ARCHIVE_CHUNK):
+        reviews = decode_reviews(archive.data)
+        cards = _existing_ids(Card, {review.card_id for review in reviews})
+        sessions = _existing_ids(
+            LearningSession, {review.session_id for review in reviews}
+        )
+        for review in reviews:
+            if review.card_id in cards and review.session_id in sessions:
+                yield archive.user_id, review
+
+
+def _by_user(entry):
+    user_id, review = entry
+    return user_id, review.created_at, review.id
+
+
+def _by_user_card(entry):
+    user_id, review = entry
+    return user_id, review.card_id, review.created_at, review.id
+
+
+def _by_card(entry):
+    user_id, review = entry
+    return review.card_id, user_id, review.created_at, review.id
+
+
+# Order of review_history(): ORDER BY of the live rows, and the same order
+# as a sort key of (user id, Review) tuples
+ORDERS = {
+    'user': (('session__user_id', 'created_at', 'id'), _by_user),
+    'user_card': (('session__user_id', 'card_id', 'created_at', 'id'), _by_user_card),
+    'card': (('card_id', 'session__user_id', 'created_at', 'id'), _by_card),
+}
+
+# Archived reviews sorted in memory at a time when they are not read in
+# their stored order; larger histories are sorted in temporary files
+RUN_SIZE = 200_000
+RUN_RECORD = struct.Struct('<qqqqqBqq')
+RUN_READ = RUN_RECORD.size * 4096
+
+
+def _write_run(entries):
+    run = tempfile.TemporaryFile()
+    for user_id, review in entries:
+        run.write(RUN_RECORD.pack(
+            user_id,
+            review.id,
+            review.session_id,
+            review.deck_id,
+            review.card_id,
+            review.is_correct,
+            review.time_taken,
+            (review.created_at - EPOCH) // MICROSECOND,
+        ))
+    run.seek(0)
+    return run
+
+
+def _read_run(run):
+    while data := run.read(RUN_READ):
+        for user_id, *fields, created_at in RUN_RECORD.iter_unpack(data):
+            fields[4] = bool(fields[4])
+            yield user_id, Review(*fields, EPOCH + created_at * MICROSECOND)
+
+
+def _sorted_archives(user_ids, key):
+    """
+    The archived reviews in the order of key (an external merge sort)
+
+    Runs of RUN_SIZE reviews are sorted in memory and written to temporary
+    files, which are then merged; only one run and a read buffer per run
+    are held at a time.
+    """
+    with ExitStack() as files:
+        runs = []
+        buffer = []
+        for entry in archived_history(user_ids):
+            buffer.append(entry)
+            if len(buffer) >= RUN_SIZE:
+                runs.append(files.enter_context(_write_run(sorted(buffer, key=key))))
+                buffer = []
+        buffer.sort(key=key)
+        if not runs:
+            yield from buffer
+            return
+        runs.append(files.enter_context(_write_run(buffer)))
+        del buffer
+        yield from heapq.merge(*(_read_run(run) for run in runs), key=key)
+
+
+def review_history(
+    user_ids=None,
+    order: str = 'user',
+    batch_size: int = 2000,
+):
+    """
+    Streams the complete review history, archived and live reviews merged
+
+    Live rows are fetched batch_size at a time in the requested order. In
+    the default order the archives are merged as they are stored, one at a
+    time; for the other orders they are sorted in temporary files first
+    (see _sorted_archives). Memory use does not depend on the number of
+    reviews.
+
+    Args:
+        user_ids: Only these users (default: everyone)
+        order: 'user' (user, time), 'user_card' (user, card, time) or
+            'card' (card, user, time)
+        batch_size: Rows per fetch
+
+    Yields:
+        Tuples of a user id and a Review
+    """
+    order_by, key = ORDERS[order]
+    live = CardReview.objects.order_by(*order_by)
+    if user_ids is not None:
+        live = live.filter(session__user_id__in=user_ids)
+    live = (
+        (row[0], Review(*row[1:]))
+        for row in live.values_list('session__user_id', *REVIEW_FIELDS).iterator(
+            chunk_size=batch_size
+        )
+    )
+    if order == 'user':
+        archived = archived_history(user_ids)
+    else:
+        archived = _sorted_archives(user_ids, key)
+    yield from heapq.merge(archived, live, key=key)
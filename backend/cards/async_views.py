@@ -0,0 +1,308 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, permissions, status
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .ai_service import AsyncAIService
+from .cache import invalidate_deck, invalidate_user
+from .dedup import LSHIndex, signature, store_signatures
+from .idempotency import REPLAY_HEADER, claim, complete, idempotency_key
+from .models import Card, Deck
+from .serializers import DeckDetailSerializer
+
+
+class AsyncAPIView(View):
+    """
+    Async counterpart of APIView for endpoints that wait on network I/O
+
+    Authentication (including the CSRF check of session authentication),
+    permissions and body parsing reuse DRF's classes and run in a worker
+    thread; the handlers themselves are coroutines, so under ASGI a waiting
+    request does not occupy a worker.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [JSONParser, FormParser, MultiPartParser]
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Like APIView: CSRF is enforced by SessionAuthentication only.
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        handler = getattr(self, request.method.lower(), None)
+        if request.method.lower() not in self.http_method_names or handler is None:
+            return await self.http_method_not_allowed(request, *args, **kwargs)
+
+        try:
+            drf_request = await sync_to_async(self.initialize_request)(request)
+        except exceptions.APIException as exc:
+            return self.handle_exception(request, exc)
+        return await handler(drf_request, *args, **kwargs)
+
+    def initialize_request(self, request):
+        """
+        Authenticates, checks permissions and parses the body
+
+        Returns:
+            The DRF request with user and data resolved
+        """
+        drf_request = Request(
+            request,
+            parsers=[parser() for parser in self.parser_classes],
+            authenticators=[
+                auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+            ],
+        )
+        for permission in [permission() for permission in self.permission_classes]:
+            if not permission.has_permission(drf_request, self):
+                if drf_request.authenticators and not (
+                    drf_request.successful_authenticator
+                ):
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied()
+        _ = drf_request.data
+        return drf_request
+
+    def handle_exception(self, request, exc):
+        response = JsonResponse({'detail': str(exc.detail)}, status=exc.status_code)
+        if isinstance(exc, exceptions.NotAuthenticated):
+            auth = api_settings.DEFAULT_AUTHENTICATION_CLASSES[0]()
+            response['WWW-Authenticate'] = auth.authenticate_header(request)
+        return response
+
+    async def idempotent(self, request, scope, handler):
+        """
+        Async counterpart of idempotency.idempotent
+
+        Runs the handler coroutine once per Idempotency-Key header; retries
+        get the stored response without running it again.
+        """
+        try:
+            key = idempotency_key(request)
+            if key is None:
+                return await handler(request)
+            record, replay = await sync_to_async(claim)(
+                request.user, key, scope, request.data
+            )
+        except exceptions.APIException as exc:
+            return self.handle_exception(request, exc)
+
+        if replay:
+            response = json_response(record.response, record.status_code)
+            response[REPLAY_HEADER] = 'true'
+            return response
+
+        try:
+            response = await handler(request)
+        except BaseException:
+            await sync_to_async(record.delete)()
+            raise
+        await sync_to_async(complete)(
+            record, response.status_code, json.loads(response.content)
+        )
+        return response
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    return JsonResponse(
+        data,
+        status=status_code,
+        safe=False,
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+class AIGenerateView(AsyncAPIView):
+    """
+    AI-powered flashcard generation
+    """
+
+    async def post(self, request):
+        """
+        Generate flashcards using AI based on a prompt
+
+        `count` (default 5, at most AI_GENERATE_MAX_CARDS) cards are
+        generated in parallel chunks. Send an Idempotency-Key header to make
+        retries safe: a retry gets the deck of the first request instead of
+        a second generation.
+        """
+        return await self.idempotent(request, 'ai-generate', self.generate)
+
+    async def generate(self, request):
+        prompt = request.data.get('prompt')
+        language = request.data.get('language', 'de')
+        max_cards = getattr(settings, 'AI_GENERATE_MAX_CARDS', 200)
+
+        if not prompt:
+            return json_response({
+                'error': 'Prompt ist erforderlich'
+            }, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            count = int(request.data.get('count', 5))
+        except (TypeError, ValueError):
+            count = 0
+        if not 1 <= count <= max_cards:
+            return json_response({
+                'error': f'count muss zwischen 1 und {max_cards} liegen'
+            }, status.HTTP_400_BAD_REQUEST)
+
+        ai_service = AsyncAIService()
+
+        if not await ai_service.is_service_available():
+            return json_response({
+                'error': 'AI Service ist nicht verfügbar'
+            }, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        result = await ai_service.generate_flashcards_chunked(
+            prompt, language, count=count
+        )
+
+        if result is None:
+            return json_response({
+                'error': 'Fehler bei der Flashcard-Generierung'
+            }, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        try:
+            deck_data, cards_created, duplicates = await sync_to_async(
+                self.create_deck
+            )(request.user, result)
+            return json_response({
+                'message': f'Deck erfolgreich erstellt mit {cards_created} Karten',
+                'deck': deck_data,
+                'cards_created': cards_created,
+                'duplicates_skipped': duplicates,
+                'failed_chunks': result.get('failed_chunks', 0),
+            }, status.HTTP_201_CREATED)
+        except Exception as e:
+            return json_response({
+                'error': f'Fehler beim Erstellen des Decks: {str(e)}'
+            }, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @staticmethod
+    @transaction.atomic
+    def create_deck(user, result):
+        """
+        Stores the generated deck and its cards
+
+        Near-duplicates among the generated cards are dropped; the model
+        tends to repeat itself on long decks.
+
+        Returns:
+            Tuple of the serialized deck, the number of created cards and
+            the number of skipped duplicates
+        """
+        deck_data = result.get('deck', {})
+        deck = Deck.objects.create(
+            owner=user,
+            title=deck_data.get('title', 'AI-generiertes Deck'),
+            description=deck_data.get('description', ''),
+            is_public=False
+        )
+
+        index = LSHIndex()
+        cards, signatures = [], []
+        for card_data in result.get('cards', []):
+            front = card_data.get('question', '')
+            back = card_data.get('answer', '')
+            minhash = signature(front, back)
+            if index.find(minhash) is not None:
+                continue
+            index.add(len(cards), minhash)
+            cards.append(Card(deck=deck, front=front, back=back))
+            signatures.append(minhash)
+
+        cards = Card.objects.bulk_create(cards)
+        store_signatures(zip(cards, signatures, strict=True))
+        # bulk_create sends no signals
+        invalidate_deck(deck.pk)
+        invalidate_user(user.pk)
+
+        skipped = len(result.get('cards', [])) - len(cards)
+        return DeckDetailSerializer(deck).data, len(cards), skipped
+
+
+class AIAnswerCheckView(AsyncAPIView):
+    """
+    AI-powered answer correctness checking
+    """
+
+    async def post(self, request):
+        """
+        Check the correctness of a user's answer using AI
+        """
+        answer = request.data.get('answer')
+        user_answer = request.data.get('user_answer')
+
+        if not answer or not user_answer:
+            return json_response({
+                'error': 'Sowohl answer als auch user_answer sind erforderlich'
+            }, status.HTTP_400_BAD_REQUEST)
+
+        ai_service = AsyncAIService()
+
+        if not await ai_service.is_service_available():
+            return json_response({
+                'error': 'AI Service ist nicht verfügbar'
+            }, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        similarity = await ai_service.check_answer_correctness(answer, user_answer)
+
+        if similarity is None:
+            return json_response({
+                'error': 'Fehler bei der Antwortbewertung'
+            }, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        if similarity >= 0.8:
+            category = 'correct'
+            feedback = 'Sehr gut! Deine Antwort ist korrekt.'
+        elif similarity >= 0.6:
+            category = 'partially_correct'
+            feedback = 'Fast richtig! Deine Antwort ist teilweise korrekt.'
+        elif similarity >= 0.4:
+            category = 'close'
+            feedback = 'Du bist nah dran, aber die Antwort ist nicht ganz richtig.'
+        else:
+            category = 'incorrect'
+            feedback = 'Das ist leider nicht richtig. Versuche es nochmal!'
+
+        return json_response({
+            'similarity': similarity,
+            'category': category,
+            'feedback': feedback,
+            'is_correct': similarity >= 0.6
+        })
+
+
+class AIHealthCheckView(AsyncAPIView):
+    """
+    Health check for AI service
+    """
+    permission_classes = []
+
+    async def get(self, request):
+        """
+        Check if AI service is available
+        """
+        ai_service = AsyncAIService()
+        is_available = await ai_service.is_service_available()
+
+        return json_response({
+            'ai_service_available': is_available,
+            'ai_service_type': 'ssh',
+            'ssh_host': ai_service.ssh_host,
+            'ssh_port': ai_service.ssh_port,
+            'ssh_username': ai_service.ssh_username,
+            'endpoints': ai_service.router.snapshot(),
+            'available_tools': (
+                await ai_service.get_available_tools() if is_available else None
+            )
+        })
@@ -0,0 +1,215 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+
+from .cache import invalidate_user
+
+logger = logging.getLogger(__name__)
+
+AVATAR_SIZES = (300, 128, 64)
+AVATAR_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 85, 'optimize': True, 'progressive': True},
+}
+
+_executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Lazily create the worker pool that processes avatars off-request"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'AVATAR_PROCESSING_WORKERS', 2),
+            thread_name_prefix='avatar',
+        )
+    return _executor
+
+
+def file_checksum(file) -> str:
+    """
+    Calculates the SHA-256 checksum of a file without decoding the image
+
+    Args:
+        file: The uploaded file or FieldFile to hash
+
+    Returns:
+        The hex digest of the file content
+    """
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def is_valid_image(file) -> bool:
+    """
+    Checks that an upload is an image Pillow can read, without decoding it
+
+    Image.verify only parses the file structure, so it stays cheap enough
+    for the request; the pixels are decoded later by render_variants.
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(file) as img:
+            img.verify()
+    except Exception:
+        return False
+    finally:
+        file.seek(0)
+    return True
+
+
+def variant_path(username: str, checksum: str, size: int, ext: str) -> str:
+    """Storage path of one avatar variant, unique per uploaded file"""
+    return os.path.join('avatars', username, f'avatar_{checksum[:12]}_{size}.{ext}')
+
+
+def delete_variants(variants: dict) -> None:
+    """Removes all variant files listed in a User.avatar_variants mapping"""
+    for formats in variants.values():
+        for path in formats.values():
+            try:
+                default_storage.delete(path)
+            except Exception as e:
+                logger.warning(f"Avatar-Variante konnte nicht gelöscht werden: {e}")
+
+
+def render_variants(source, username: str, checksum: str) -> dict:
+    """
+    Decodes the uploaded image once and writes all sizes in all formats
+
+    JPEG sources are decoded with Image.draft, which lets the decoder scale
+    down by a power of two while reading instead of decoding every pixel.
+
+    Args:
+        source: The original image file
+        username: The owner of the avatar
+        checksum: Checksum of the original, used in the variant file names
+
+    Returns:
+        Mapping of size to format to storage path
+    """
+    from PIL import Image
+
+    largest = max(AVATAR_SIZES)
+    source.seek(0)
+    with Image.open(source) as img:
+        img.draft('RGB', (largest, largest))
+        img = img.convert('RGB')
+        img.thumbnail((largest, largest), Image.Resampling.LANCZOS)
+
+        variants = {}
+        for size in sorted(AVATAR_SIZES, reverse=True):
+            if size != largest:
+                img.thumbnail((size, size), Image.Resampling.LANCZOS)
+            variants[str(size)] = {}
+            for ext, options in AVATAR_FORMATS.items():
+                output = BytesIO()
+                img.save(output, **options)
+                path = variant_path(username, checksum, size, ext)
+                if default_storage.exists(path):
+                    default_storage.delete(path)
+                variants[str(size)][ext] = default_storage.save(
+                    path, ContentFile(output.getvalue())
+                )
+    return variants
+
+
+def process_avatar(user_id: int, checksum: str) -> None:
+    """
+    Generates the avatar variants of a user
+
+    The variants are only stored if the avatar was not replaced in the
+    meantime, otherwise the freshly rendered files are discarded.
+
+    Args:
+        user_id: ID of the user whose avatar was uploaded
+        checksum: Checksum of the upload that should be processed
+    """
+    from .models import User
+
+    user = User.objects.filter(pk=user_id, avatar_checksum=checksum).first()
+    if user is None or not user.avatar:
+        return
+
+    try:
+        with user.avatar.open('rb') as source:
+            variants = render_variants(source, user.username, checksum)
+    except Exception as e:
+        logger.error(f"Avatar-Verarbeitung fehlgeschlagen: {e}")
+        return
+
+    updated = User.objects.filter(pk=user_id, avatar_checksum=checksum).update(
+        avatar_variants=variants
+    )
+    if updated:
+        # update() sends no signals; payloads embedding the profile depend
+        # on the user's cache version (see DeckViewSet.with_owner_version)
+        invalidate_user(user_id)
+    else:
+        delete_variants(variants)
+
+
+def _process_in_worker(user_id: int, checksum: str) -> None:
+    """Runs process_avatar in a pool thread and releases its DB connection"""
+    try:
+        process_avatar(user_id, checksum)
+    finally:
+        connection.close()
+
+
+def schedule_avatar_processing(user) -> None:
+    """
+    Queues the variant generation once the current transaction commits
+
+    Args:
+        user: The user whose avatar changed
+    """
+    user_id, checksum = user.pk, user.avatar_checksum
+
+    def submit():
+        if getattr(settings, 'AVATAR_PROCESSING_ASYNC', True):
+            _get_executor().submit(_process_in_worker, user_id, checksum)
+        else:
+            process_avatar(user_id, checksum)
+
+    transaction.on_commit(submit)
+
+
+def reprocess_pending_avatars() -> int:
+    """
+    Generates the variants of avatars whose processing never finished
+
+    Covers uploads whose pool thread was lost, e.g. because the worker
+    restarted before the transaction's on_commit callback ran. Avatars
+    still being processed are rendered twice at worst; process_avatar
+    only stores the result if the avatar was not replaced meanwhile.
+
+    Returns:
+        Number of avatars that have their variants now
+    """
+    from .models import User
+
+    pending = (
+        User.objects.exclude(avatar='').exclude(avatar__isnull=True)
+        .exclude(avatar_checksum='')
+        .filter(avatar_variants={})
+        .values_list('pk', 'avatar_checksum')
+    )
+    processed = 0
+    for user_id, checksum in pending:
+        process_avatar(user_id, checksum)
+        processed += User.objects.filter(pk=user_id).exclude(
+            avatar_variants={}
+        ).exists()
+    return processed
@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+KEY_PREFIX = 'flashcards'
+
+_MISSING = object()
+_stats_lock = threading.Lock()
+_stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+
+def _version_key(scope: str, object_id) -> str:
+    return f'{KEY_PREFIX}:{scope}:{object_id}:version'
+
+
+def _get_version(scope: str, object_id) -> int:
+    """
+    Current cache version of a user or deck
+
+    Missing versions start at the current time in nanoseconds, so a version
+    key evicted from the cache can never bring stale entries back to life.
+    """
+    key = _version_key(scope, object_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(scope: str, object_id) -> None:
+    key = _version_key(scope, object_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate_user(user_id) -> None:
+    """Drops every cached read model of a user"""
+    if user_id is not None:
+        _bump_version('user', user_id)
+
+
+def invalidate_deck(deck_id) -> None:
+    """Drops every cached read model that depends on a deck's cards"""
+    if deck_id is not None:
+        _bump_version('deck', deck_id)
+
+
+def user_version(user_id) -> int:
+    """
+    Current cache version of a user
+
+    It moves whenever the user's cached read models are invalidated, so it
+    also serves as a validator for payloads that embed them.
+    """
+    return _get_version('user', user_id)
+
+
+def user_key(user_id, name: str) -> str:
+    """
+    Cache key of a per-user read model
+
+    Args:
+        user_id: ID of the user
+        name: Name of the read model
+
+    Returns:
+        The versioned cache key
+    """
+    version = _get_version('user', user_id)
+    return f'{KEY_PREFIX}:user:{user_id}:v{version}:{name}'
+
+
+def deck_key(user_id, deck_id, name: str) -> str:
+    """
+    Cache key of a per-user, per-deck read model
+
+    Args:
+        user_id: ID of the user
+        deck_id: ID of the deck
+        name: Name of the read model
+
+    Returns:
+        The versioned cache key
+    """
+    user_version = _get_version('user', user_id)
+    deck_version = _get_version('deck', deck_id)
+    return (
+        f'{KEY_PREFIX}:deck:{deck_id}:v{deck_version}'
+        f':user:{user_id}:v{user_version}:{name}'
+    )
+
+
+def get_or_compute(key: str, namespace: str, compute, timeout=None):
+    """
+    Returns the cached value or computes and stores it
+
+    Args:
+        key: Cache key built with user_key or deck_key
+        namespace: Name under which hits and misses are counted
+        compute: Callable producing the value on a miss
+        timeout: Seconds until expiry, defaults to STATS_CACHE_TIMEOUT
+
+    Returns:
+        The cached or freshly computed value
+    """
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        _record(namespace, 'hits')
+        return value
+
+    _record(namespace, 'misses')
+    value = compute()
+    if timeout is None:
+        timeout = getattr(settings, 'STATS_CACHE_TIMEOUT', 300)
+    cache.set(key, value, timeout)
+    return value
+
+
+def _record(namespace: str, outcome: str) -> None:
+    with _stats_lock:
+        _stats[namespace][outcome] += 1
+
+
+def get_cache_stats() -> dict:
+    """
+    Hit/miss statistics of this process, per namespace and in total
+
+    The counters are kept in memory, so with several gunicorn workers every
+    worker reports only the requests it served itself, whatever the cache
+    backend. The pid tells the workers apart.
+
+    Returns:
+        Dict with backend, pid, per-namespace counters and overall hit rate
+    """
+    with _stats_lock:
+        namespaces = {name: dict(counts) for name, counts in _stats.items()}
+
+    hits = sum(counts['hits'] for counts in namespaces.values())
+    misses = sum(counts['misses'] for counts in namespaces.values())
+    for counts in namespaces.values():
+        total = counts['hits'] + counts['misses']
+        counts['hit_rate'] = counts['hits'] / total if total else 0.0
+
+    return {
+        'backend': settings.CACHES['default']['BACKEND'],
+        'pid': os.getpid(),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+        'namespaces': namespaces,
+    }
+
+
+def reset_cache_stats() -> None:
+    """Resets the hit/miss counters of this process"""
+    with _stats_lock:
+        _stats.clear()
@@ -0,0 +1,106 @@
+import hashlib
+from datetime import datetime
+from functools import partial
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin:
+    """
+    Conditional GET (ETag / Last-Modified) for list and detail views
+
+    The validators are computed with a single aggregate query over the
+    filtered queryset. If the client already holds the current version the
+    view answers 304 Not Modified without loading or serializing any rows.
+
+    Lists only send an ETag: the row count is part of it, so deletions
+    change the tag even though max(updated_at) does not move.
+    """
+    conditional_list_aggregates = {
+        'last_updated': Max('updated_at'),
+        'count': Count('id', distinct=True),
+    }
+    conditional_detail_aggregates = {
+        'last_updated': Max('updated_at'),
+    }
+    conditional_detail_last_modified = True
+
+    def get_list_validators(self, queryset):
+        """Aggregate validators for the filtered list queryset"""
+        return queryset.order_by().aggregate(**self.conditional_list_aggregates)
+
+    def get_detail_validators(self, queryset):
+        """Aggregate validators for the object addressed by the URL"""
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = queryset.filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        return queryset.order_by().aggregate(**self.conditional_detail_aggregates)
+
+    def list(self, request, *args, **kwargs):
+        validators = self.get_list_validators(
+            self.filter_queryset(self.get_queryset())
+        )
+        render = partial(super().list, request, *args, **kwargs)
+        return self.conditional_response(request, validators, render)
+
+    def retrieve(self, request, *args, **kwargs):
+        validators = self.get_detail_validators(
+            self.filter_queryset(self.get_queryset())
+        )
+        render = partial(super().retrieve, request, *args, **kwargs)
+        if validators.get('last_updated') is None:
+            # Not found or not visible: let the regular view raise the 404.
+            return render()
+        last_modified = (
+            validators['last_updated']
+            if self.conditional_detail_last_modified
+            else None
+        )
+        return self.conditional_response(request, validators, render, last_modified)
+
+    def conditional_response(self, request, validators, render, last_modified=None):
+        """
+        Answers 304 if the client's validators match, otherwise renders
+
+        Args:
+            request: The current request
+            validators: Values that change whenever the payload changes
+            render: Callable producing the full response
+            last_modified: Optional exact modification time of the payload
+
+        Returns:
+            A 304 response or the rendered response with validator headers
+        """
+        etag = self.make_etag(request, validators)
+        timestamp = (
+            int(last_modified.timestamp())
+            if isinstance(last_modified, datetime)
+            else None
+        )
+
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if not_modified is not None:
+            return not_modified
+
+        response = render()
+        if request.method in ('GET', 'HEAD') and 200 <= response.status_code < 300:
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    @staticmethod
+    def make_etag(request, validators):
+        """Strong ETag over user, URL and validator values"""
+        raw = '|'.join([
+            str(request.user.pk),
+            request.get_full_path(),
+            *(f'{key}={value!r}' for key, value in sorted(validators.items())),
+        ])
+        return quote_etag(hashlib.sha1(raw.encode()).hexdigest())
@@ -0,0 +1,345 @@
+import hashlib
+import random
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .archive import rewrite_archives
+from .cache import invalidate_deck, invalidate_user
+from .models import (
+    Card,
+    CardBucket,
+    CardReview,
+    CardSchedule,
+    CardSignature,
+    LearningSession,
+)
+
+# Characters per shingle of the normalized card text
+SHINGLE_SIZE = 4
+# Signature length = BANDS * ROWS_PER_BAND. Two cards become candidates if
+# all rows of one band agree: at a Jaccard similarity of 0.8 that happens
+# with a probability of 99.98 %, at 0.3 with 12 %.
+BANDS = 16
+ROWS_PER_BAND = 4
+NUM_PERMUTATIONS = BANDS * ROWS_PER_BAND
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Fixed seed: signatures are stored, so every process must use the same
+# permutations.
+_random = random.Random(20241019)
+_PERMUTATIONS = [
+    (_random.randrange(1, _MERSENNE_PRIME), _random.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def duplicate_threshold() -> float:
+    return getattr(settings, 'CARD_DUPLICATE_THRESHOLD', 0.8)
+
+
+def normalize(text: str) -> str:
+    """Lowercase words without punctuation, separated by single spaces"""
+    return ' '.join(re.findall(r'\w+', text.lower()))
+
+
+def _hash(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big')
+
+
+def shingles(front: str, back: str) -> set:
+    """Hashed character shingles of a card's normalized front and back"""
+    text = f'{normalize(front)}|{normalize(back)}'
+    if len(text) <= SHINGLE_SIZE:
+        return {_hash(text.encode())}
+    return {
+        _hash(text[i:i + SHINGLE_SIZE].encode())
+        for i in range(len(text) - SHINGLE_SIZE + 1)
+    }
+
+
+def signature(front: str, back: str) -> list:
+    """
+    MinHash signature of a card
+
+    The share of positions two signatures agree on estimates the Jaccard
+    similarity of the cards' shingle sets.
+    """
+    values = shingles(front, back)
+    return [
+        min(((a * value + b) % _MERSENNE_PRIME) & _MAX_HASH for value in values)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def band_keys(minhash: list) -> list:
+    """One bucket key per band of a signature"""
+    keys = []
+    for band in range(BANDS):
+        rows = minhash[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(
+            repr((band, rows)).encode(), digest_size=8
+        ).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
+
+
+def similarity(a: list, b: list) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(x == y for x, y in zip(a, b, strict=True)) / NUM_PERMUTATIONS
+
+
+def _best_match(minhash, candidates, threshold):
+    """
+    The original of the most similar candidate at or above the threshold
+
+    Args:
+        candidates: Iterable of (card id, signature, original id or None),
+            in insertion order, so ties go to the older card
+    """
+    best, best_similarity = None, threshold
+    for card_id, other, original_id in candidates:
+        value = similarity(minhash, other)
+        if value >= best_similarity and (best is None or value > best_similarity):
+            best, best_similarity = original_id or card_id, value
+    return best
+
+
+class LSHIndex:
+    """
+    In-memory LSH index of the cards of one deck
+
+    Used where a whole batch of cards is checked at once: generated decks
+    and the bulk rebuild.
+    """
+
+    def __init__(self, threshold=None):
+        self.threshold = duplicate_threshold() if threshold is None else threshold
+        self.buckets = defaultdict(list)
+        self.signatures = {}
+        self.originals = {}
+
+    def find(self, minhash):
+        """The original of the most similar indexed card, or None"""
+        seen = {}
+        for key in band_keys(minhash):
+            for item in self.buckets.get(key, ()):
+                seen.setdefault(item, None)
+        return _best_match(
+            minhash,
+            ((item, self.signatures[item], self.originals[item]) for item in seen),
+            self.threshold,
+        )
+
+    def add(self, item, minhash, original=None):
+        self.signatures[item] = minhash
+        self.originals[item] = original
+        for key in band_keys(minhash):
+            self.buckets[key].append(item)
+
+
+def find_duplicate(deck_id, minhash, exclude=None):
+    """
+    The card of a deck that a card with this signature duplicates
+
+    Only the cards sharing a bucket with the signature are read and
+    compared, in a single query. A match that is itself flagged as a
+    duplicate resolves to its original.
+
+    Returns:
+        ID of the original card, or None
+    """
+    candidates = (
+        CardSignature.objects.filter(
+            card__buckets__deck_id=deck_id,
+            card__buckets__key__in=band_keys(minhash),
+        )
+        .order_by('card_id')
+        .values_list('card_id', 'minhash', 'card__duplicate_of_id')
+    )
+    if exclude is not None:
+        candidates = candidates.exclude(card_id=exclude)
+
+    unique = {}
+    for card_id, other, original_id in candidates:
+        unique.setdefault(card_id, (card_id, other, original_id))
+    return _best_match(minhash, unique.values(), duplicate_threshold())
+
+
+def _index_rows(card_id, deck_id, minhash):
+    return (
+        CardSignature(card_id=card_id, minhash=minhash),
+        [
+            CardBucket(deck_id=deck_id, card_id=card_id, key=key)
+            for key in band_keys(minhash)
+        ],
+    )
+
+
+def store_signatures(cards, replace=False) -> None:
+    """
+    Adds cards to the index of their decks
+
+    Call it in the transaction that saves the cards, so no card is left
+    without its index rows.
+
+    Args:
+        cards: Iterable of (card, signature) pairs
+        replace: Whether the cards may already be indexed (after an edit)
+    """
+    signatures, buckets = [], []
+    for card, minhash in cards:
+        row, card_buckets = _index_rows(card.pk, card.deck_id, minhash)
+        signatures.append(row)
+        buckets.extend(card_buckets)
+    if replace:
+        card_ids = [row.card_id for row in signatures]
+        CardBucket.objects.filter(card_id__in=card_ids).delete()
+        CardSignature.objects.filter(card_id__in=card_ids).delete()
+    CardSignature.objects.bulk_create(signatures)
+    CardBucket.objects.bulk_create(buckets)
+
+
+def rebuild_index(
+    deck_ids=None,
+    threshold=None,
+    batch_size: int = 1000,
+) -> dict:
+    """
+    Recomputes the signatures, buckets and duplicate flags of whole decks
+
+    The cards are streamed deck by deck in creation order and checked
+    against an in-memory index of their deck, so the older card of a pair
+    is always the original.
+
+    Args:
+        deck_ids: Only rebuild these decks (default: all)
+        threshold: Similarity threshold (default: CARD_DUPLICATE_THRESHOLD)
+        batch_size: Rows per INSERT or UPDATE
+
+    Returns:
+        Dict mapping the ID of every duplicate card to its original
+    """
+    cards = Card.objects.all()
+    signatures = CardSignature.objects.all()
+    buckets = CardBucket.objects.all()
+    if deck_ids is not None:
+        cards = cards.filter(deck_id__in=deck_ids)
+        signatures = signatures.filter(card__deck_id__in=deck_ids)
+        buckets = buckets.filter(deck_id__in=deck_ids)
+
+    duplicates = {}
+    with transaction.atomic():
+        buckets.delete()
+        signatures.delete()
+
+        index, deck_id, now = None, None, timezone.now()
+        new_signatures, new_buckets, changed = [], [], []
+        rows = cards.order_by('deck_id', 'id').values_list(
+            'id', 'deck_id', 'front', 'back', 'duplicate_of_id'
+        )
+        for card_id, card_deck_id, front, back, flagged in rows.iterator(
+            chunk_size=batch_size
+        ):
+            if card_deck_id != deck_id:
+                index, deck_id = LSHIndex(threshold), card_deck_id
+            minhash = signature(front, back)
+            original = index.find(minhash)
+            index.add(card_id, minhash, original)
+            if original is not None:
+                duplicates[card_id] = original
+            if original != flagged:
+                changed.append(Card(
+                    pk=card_id, duplicate_of_id=original, updated_at=now
+                ))
+
+            row, card_buckets = _index_rows(card_id, card_deck_id, minhash)
+            new_signatures.append(row)
+            new_buckets.extend(card_buckets)
+            if len(new_signatures) >= batch_size:
+                CardSignature.objects.bulk_create(new_signatures)
+                CardBucket.objects.bulk_create(new_buckets, batch_size=batch_size)
+                new_signatures, new_buckets = [], []
+
+        CardSignature.objects.bulk_create(new_signatures)
+        CardBucket.objects.bulk_create(new_buckets, batch_size=batch_size)
+        Card.objects.bulk_update(
+            changed, ['duplicate_of', 'updated_at'], batch_size=batch_size
+        )
+    return duplicates
+
+
+@transaction.atomic
+def merge_duplicates(duplicates: dict) -> int:
+    """
+    Folds duplicate cards into their originals and deletes them
+
+    Reviews, archived ones included, move to the original. Of the
+    schedules a learner has for an original and its duplicates, the most
+    recently reviewed one is kept and moved to the original.
+
+    Args:
+        duplicates: Dict mapping duplicate card IDs to their originals,
+            as returned by rebuild_index
+
+    Returns:
+        Number of deleted cards
+    """
+    if not duplicates:
+        return 0
+    by_original = defaultdict(list)
+    for duplicate, original in duplicates.items():
+        by_original[original].append(duplicate)
+    for original, group in by_original.items():
+        CardReview.objects.filter(card_id__in=group).update(card_id=original)
+    deck_ids = set(
+        Card.objects.filter(pk__in=duplicates).values_list('deck_id', flat=True)
+    )
+    learners = LearningSession.objects.filter(deck_id__in=deck_ids)
+    rewrite_archives(
+        learners.values('user_id'),
+        lambda review: review._replace(
+            card_id=duplicates.get(review.card_id, review.card_id)
+        ),
+    )
+
+    kept, dropped = {}, []
+    schedules = CardSchedule.objects.filter(
+        card_id__in=[*duplicates, *by_original]
+    ).values_list('id', 'user_id', 'card_id', 'last_reviewed')
+    for schedule_id, user_id, card_id, last_reviewed in schedules:
+        key = (user_id, duplicates.get(card_id, card_id))
+        current = kept.get(key)
+        if current is None:
+            kept[key] = (schedule_id, card_id, last_reviewed)
+            continue
+        newer = last_reviewed is not None and (
+            current[2] is None or last_reviewed > current[2]
+        )
+        if newer:
+            dropped.append(current[0])
+            kept[key] = (schedule_id, card_id, last_reviewed)
+        else:
+            dropped.append(schedule_id)
+    CardSchedule.objects.filter(pk__in=dropped).delete()
+    for (_, original), (schedule_id, card_id, _) in kept.items():
+        if card_id != original:
+            CardSchedule.objects.filter(pk=schedule_id).update(card_id=original)
+
+    _, deleted = Card.objects.filter(pk__in=duplicates).delete()
+
+    # Reviews and schedules were moved with update(), which sends no signals
+    for deck_id in deck_ids:
+        invalidate_deck(deck_id)
+    user_ids = (
+        LearningSession.objects.filter(deck_id__in=deck_ids)
+        .values_list('user_id', flat=True)
+        .distinct()
+    )
+    for user_id in user_ids:
+        invalidate_user(user_id)
+    return deleted.get(Card._meta.label, 0)
@@ -0,0 +1,168 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+class InvalidIdempotencyKey(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = f'Der {HEADER} muss 1 bis {MAX_KEY_LENGTH} Zeichen lang sein.'
+    default_code = 'invalid_idempotency_key'
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = (
+        f'Der {HEADER} wurde bereits für einen anderen Request verwendet.'
+    )
+    default_code = 'idempotency_key_reused'
+
+
+class RequestInProgress(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = f'Ein Request mit diesem {HEADER} läuft noch.'
+    default_code = 'idempotency_request_in_progress'
+
+
+def idempotency_key(request):
+    """
+    The Idempotency-Key header of a request, or None if it has none
+
+    Raises:
+        InvalidIdempotencyKey: If the key is empty or too long
+    """
+    key = request.headers.get(HEADER)
+    if key is None:
+        return None
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise InvalidIdempotencyKey()
+    return key
+
+
+def fingerprint(scope: str, data) -> str:
+    payload = json.dumps([scope, data], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def claim(user, key: str, scope: str, data):
+    """
+    Reserves a key for a new request or finds the response of an earlier one
+
+    A retry costs a single SELECT. A new key is inserted without a response
+    and expires after IDEMPOTENCY_PENDING_TIMEOUT, so a worker that dies
+    mid-request does not block the key until the regular expiry.
+
+    Args:
+        user: The requesting user; keys are per user
+        key: The Idempotency-Key header
+        scope: Name of the endpoint, so a key cannot be replayed elsewhere
+        data: The request body
+
+    Returns:
+        Tuple of the key row and whether its stored response is to be replayed
+
+    Raises:
+        IdempotencyKeyReused: If the key was used with a different body
+        RequestInProgress: If the first request with the key still runs
+    """
+    digest = fingerprint(scope, data)
+    now = timezone.now()
+    record = IdempotencyKey.objects.filter(user=user, key=key).first()
+    if record is not None and record.expires_at <= now:
+        IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=now).delete()
+        record = None
+
+    if record is None:
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=user,
+                    key=key,
+                    fingerprint=digest,
+                    expires_at=now + timedelta(
+                        seconds=getattr(settings, 'IDEMPOTENCY_PENDING_TIMEOUT', 300)
+                    ),
+                )
+            return record, False
+        except IntegrityError:
+            # A concurrent request with the same key won the insert
+            record = IdempotencyKey.objects.filter(user=user, key=key).first()
+            if record is None:
+                raise RequestInProgress() from None
+
+    if record.fingerprint != digest:
+        raise IdempotencyKeyReused()
+    if record.status_code is None:
+        raise RequestInProgress()
+    return record, True
+
+
+def complete(record: IdempotencyKey, status_code: int, data) -> None:
+    """
+    Stores the response of a claimed key for IDEMPOTENCY_KEY_TTL
+
+    Server errors are not stored but release the key, so the client's
+    retry runs the request again.
+    """
+    if status_code >= 500:
+        record.delete()
+        return
+    record.status_code = status_code
+    record.response = data
+    record.expires_at = timezone.now() + timedelta(
+        seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 86400)
+    )
+    record.save(update_fields=['status_code', 'response', 'expires_at'])
+
+
+def purge_expired_keys() -> int:
+    """Deletes expired keys; returns the number of deleted rows"""
+    deleted, _ = IdempotencyKey.objects.filter(
+        expires_at__lte=timezone.now()
+    ).delete()
+    return deleted
+
+
+def idempotent(request, scope: str, handler):
+    """
+    Runs a DRF handler once per Idempotency-Key
+
+    Requests without the header run as before. A retry gets the stored
+    response with an Idempotent-Replayed header instead of running the
+    handler again.
+
+    Args:
+        request: The DRF request
+        scope: Name of the endpoint
+        handler: Callable returning the Response of the first request
+    """
+    key = idempotency_key(request)
+    if key is None:
+        return handler()
+
+    record, replay = claim(request.user, key, scope, request.data)
+    if replay:
+        response = Response(record.response, status=record.status_code)
+        response[REPLAY_HEADER] = 'true'
+        return response
+
+    try:
+        response = handler()
+    except BaseException:
+        record.delete()
+        raise
+    complete(record, response.status_code, response.data)
+    return response
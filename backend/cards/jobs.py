@@ -0,0 +1,110 @@
+"""
+Periodic maintenance jobs run by `python manage.py run_scheduler`
+
+See cards/scheduler.py. Every job can also be run once by hand with
+`run_scheduler --job <name>`.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from .analytics import analyze_reviews
+from .archive import archive_reviews
+from .avatars import reprocess_pending_avatars
+from .cache import invalidate_user
+from .idempotency import purge_expired_keys
+from .models import CardReview, LearningSession
+from .ranking import refresh_rankings
+from .scheduler import periodic
+
+
+def session_stale_hours() -> int:
+    return getattr(settings, 'LEARNING_SESSION_STALE_HOURS', 12)
+
+
+@periodic(timedelta(minutes=15))
+def abandon_stale_sessions(now=None) -> int:
+    """
+    Marks active sessions without recent reviews as abandoned
+
+    A session is stale if it was started and last reviewed more than
+    LEARNING_SESSION_STALE_HOURS ago. Its end is set to its last review
+    (or its start, if it has none), so session durations in the stats are
+    not stretched by the hours it was left open.
+
+    Returns:
+        Number of abandoned sessions
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(hours=session_stale_hours())
+    stale = (
+        LearningSession.objects
+        .filter(status=LearningSession.Status.ACTIVE, started_at__lt=cutoff)
+        .exclude(reviews__created_at__gte=cutoff)
+    )
+    user_ids = set(stale.values_list('user_id', flat=True))
+    if not user_ids:
+        return 0
+
+    last_review = (
+        CardReview.objects.filter(session=OuterRef('pk'))
+        .order_by('-created_at')
+        .values('created_at')[:1]
+    )
+    abandoned = stale.update(
+        status=LearningSession.Status.ABANDONED,
+        ended_at=Coalesce(Subquery(last_review), F('started_at')),
+    )
+    # update() sends no post_save, so the learners' stats are invalidated here
+    for user_id in user_ids:
+        invalidate_user(user_id)
+    return abandoned
+
+
+@periodic(timedelta(minutes=15))
+def reprocess_avatars() -> int:
+    return reprocess_pending_avatars()
+
+
+@periodic(timedelta(days=1))
+def purge_expired_tokens(now=None) -> int:
+    """
+    Deletes expired refresh tokens and their blacklist entries
+
+    The simplejwt token blacklist records every issued refresh token and,
+    with BLACKLIST_AFTER_ROTATION, every rotated one; expired tokens are
+    rejected anyway, so their rows only grow the tables.
+
+    Returns:
+        Number of deleted outstanding tokens
+    """
+    _, per_model = OutstandingToken.objects.filter(
+        expires_at__lte=now or timezone.now()
+    ).delete()
+    return per_model.get(OutstandingToken._meta.label, 0)
+
+
+@periodic(timedelta(hours=1))
+def purge_idempotency_keys() -> int:
+    return purge_expired_keys()
+
+
+@periodic(timedelta(hours=1))
+def refresh_deck_rankings() -> int:
+    return refresh_rankings()
+
+
+@periodic(timedelta(days=1))
+def refresh_review_analytics() -> str:
+    cards, decks = analyze_reviews()
+    return f'{cards} Karten, {decks} Decks'
+
+
+@periodic(timedelta(days=1))
+def archive_old_reviews() -> str:
+    reviews, archives = archive_reviews()
+    return f'{reviews} Reviews, {archives} Archive'
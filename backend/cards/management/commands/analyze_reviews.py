@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cards.analytics import analyze_reviews
+
+
+class Command(BaseCommand):
+    help = 'Recomputes lapse rates, leech flags and weakness scores from all reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, batch_size=5000, **options):
+        started = time.perf_counter()
+        cards, decks = analyze_reviews(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'{cards} Karten in {decks} Decks in '
+            f'{time.perf_counter() - started:.1f} s analysiert'
+        ))
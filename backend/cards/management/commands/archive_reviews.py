@@ -0,0 +1,36 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from cards.archive import archive_reviews, month_start
+
+
+class Command(BaseCommand):
+    help = 'Moves old reviews into compressed monthly archives per user'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--before',
+            type=date.fromisoformat,
+            help='Archive the months before this date, YYYY-MM-DD '
+                 '(default: REVIEW_ARCHIVE_AFTER_DAYS ago)',
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Only archive this user (can be given several times)',
+        )
+
+    def handle(self, *args, before=None, user_ids=None, **options):
+        started = time.perf_counter()
+        reviews, archives = archive_reviews(
+            before=month_start(before) if before else None,
+            user_ids=user_ids,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{reviews} Reviews in {archives} Monatsarchive in '
+            f'{time.perf_counter() - started:.1f} s archiviert'
+        ))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cards.dedup import merge_duplicates, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the duplicate index of the decks and flags or merges duplicates'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--deck',
+            type=int,
+            action='append',
+            dest='deck_ids',
+            help='Only deduplicate this deck (can be given several times)',
+        )
+        parser.add_argument(
+            '--merge',
+            action='store_true',
+            help='Fold duplicates into their originals instead of flagging them',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            help='Similarity threshold (default: CARD_DUPLICATE_THRESHOLD)',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(
+        self, *args, deck_ids=None, merge=False, threshold=None, batch_size=1000,
+        **options,
+    ):
+        started = time.perf_counter()
+        duplicates = rebuild_index(
+            deck_ids=deck_ids, threshold=threshold, batch_size=batch_size
+        )
+        if merge:
+            merged = merge_duplicates(duplicates)
+            message = f'{merged} Duplikate zusammengeführt'
+        else:
+            message = f'{len(duplicates)} Duplikate markiert'
+        self.stdout.write(self.style.SUCCESS(
+            f'{message} in {time.perf_counter() - started:.1f} s'
+        ))
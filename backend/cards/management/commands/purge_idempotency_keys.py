@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from cards.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired Idempotency-Key responses'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_keys()
+        self.stdout.write(self.style.SUCCESS(
+            f'{deleted} abgelaufene Idempotency-Keys gelöscht'
+        ))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cards.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recreates the daily review rollups from the CardReview history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Only rebuild this user (can be given several times)',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, user_ids=None, batch_size=1000, **options):
+        started = time.perf_counter()
+        written = rebuild_rollups(user_ids=user_ids, batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'{written} Rollup-Zeilen in {time.perf_counter() - started:.1f} s '
+            f'neu aufgebaut'
+        ))
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cards.ranking import refresh_rankings
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the popularity ranking of the public deck catalog'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        ranked = refresh_rankings()
+        self.stdout.write(self.style.SUCCESS(
+            f'{ranked} öffentliche Decks in {time.perf_counter() - started:.1f} s '
+            f'neu bewertet'
+        ))
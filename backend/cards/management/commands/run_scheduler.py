@@ -0,0 +1,80 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cards.scheduler import Scheduler, registered_jobs
+
+
+class Command(BaseCommand):
+    help = 'Runs the periodic maintenance jobs on the elected leader scheduler'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Run the due jobs once and exit (e.g. from cron)'
+        )
+        parser.add_argument(
+            '--job', action='append', dest='jobs', metavar='NAME',
+            help='Run this job now, whether it is due or not (repeatable)'
+        )
+        parser.add_argument(
+            '--tick', type=float,
+            help='Seconds between checks for due jobs (SCHEDULER_TICK_SECONDS)'
+        )
+        parser.add_argument(
+            '--list', action='store_true', dest='list_jobs',
+            help='List the jobs and exit'
+        )
+
+    def handle(self, *args, once=False, jobs=None, tick=None, list_jobs=False,
+               **options):
+        registered = registered_jobs()
+        if list_jobs:
+            for job in registered.values():
+                self.stdout.write(f'{job.name:<28} alle {job.interval}')
+            return
+        unknown = sorted(set(jobs or ()) - set(registered))
+        if unknown:
+            raise CommandError(f"Unbekannte Jobs: {', '.join(unknown)}")
+
+        scheduler = Scheduler(registered)
+        if once or jobs:
+            runs = scheduler.run_pending(only=jobs)
+            leader = scheduler.leader
+            scheduler.release()
+            if not leader:
+                self.stdout.write(self.style.WARNING(
+                    'Ein anderer Scheduler ist Leader, keine Jobs ausgeführt'
+                ))
+            elif not runs:
+                self.stdout.write('Keine Jobs fällig')
+            for run in runs:
+                self.report(run)
+            return
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *args: stop.set())
+        self.stdout.write(self.style.SUCCESS(
+            f'Scheduler {scheduler.owner} gestartet mit {len(registered)} Jobs'
+        ))
+        try:
+            scheduler.run_forever(
+                stop,
+                tick or getattr(settings, 'SCHEDULER_TICK_SECONDS', 30),
+                on_run=self.report,
+            )
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write('Scheduler beendet')
+
+    def report(self, run):
+        if run.error:
+            self.stdout.write(self.style.ERROR(
+                f'{run.name} nach {run.duration:.1f} s fehlgeschlagen: {run.error}'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'{run.name} in {run.duration:.1f} s: {run.result}'
+            ))
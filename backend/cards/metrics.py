@@ -0,0 +1,341 @@
+import contextvars
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+JOB_DURATION_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+HISTOGRAMS = {
+    'flashcards_request_duration_seconds': (
+        'Request latency per view',
+        LATENCY_BUCKETS,
+    ),
+    'flashcards_request_sql_queries': (
+        'Number of SQL queries per request',
+        QUERY_COUNT_BUCKETS,
+    ),
+    'flashcards_request_sql_duration_seconds': (
+        'Total SQL time per request',
+        LATENCY_BUCKETS,
+    ),
+    'flashcards_request_ai_duration_seconds': (
+        'Time spent in AIService calls per request',
+        LATENCY_BUCKETS,
+    ),
+    'flashcards_ai_call_duration_seconds': (
+        'Duration of single AIService calls per tool',
+        LATENCY_BUCKETS,
+    ),
+    'flashcards_job_duration_seconds': (
+        'Duration of periodic maintenance jobs (cards/scheduler.py)',
+        JOB_DURATION_BUCKETS,
+    ),
+}
+
+_current_request = contextvars.ContextVar('flashcards_request_stats', default=None)
+_ai_fan_out = contextvars.ContextVar('flashcards_ai_fan_out', default=False)
+
+
+class RequestStats:
+    """
+    Costs accumulated while one request is handled
+
+    Stored in a context variable, so SQL queries and AI calls made from
+    sync_to_async threads are attributed to the request that caused them.
+    """
+
+    def __init__(self, keep_queries: int = 0):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.query_time = 0.0
+        self.ai_time = 0.0
+        self.keep_queries = keep_queries
+        self.slowest_queries = []
+
+    def add_query(self, sql: str, duration: float) -> None:
+        self.query_count += 1
+        self.query_time += duration
+        if self.keep_queries:
+            entry = (duration, self.query_count, sql)
+            if len(self.slowest_queries) < self.keep_queries:
+                heapq.heappush(self.slowest_queries, entry)
+            else:
+                heapq.heappushpop(self.slowest_queries, entry)
+
+    def top_queries(self):
+        return sorted(self.slowest_queries, reverse=True)
+
+
+class MetricsRegistry:
+    """
+    Thread-safe in-process histograms with Prometheus text export
+
+    With METRICS_MULTIPROCESS_DIR set, every gunicorn worker periodically
+    writes its histograms to that directory and /metrics sums the files of
+    all workers. Files of dead workers, or not written for
+    METRICS_WORKER_TTL seconds, are removed instead of summed forever.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {name: {} for name in HISTOGRAMS}
+        self._last_flush = 0.0
+
+    def observe(self, name: str, labels: dict, value: float) -> None:
+        buckets = HISTOGRAMS[name][1]
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values[name].get(key)
+            if series is None:
+                series = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+                self._values[name][key] = series
+            index = bisect_left(buckets, value)
+            if index < len(buckets):
+                series['buckets'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                name: [
+                    {
+                        'labels': dict(key),
+                        'buckets': list(series['buckets']),
+                        'sum': series['sum'],
+                        'count': series['count'],
+                    }
+                    for key, series in values.items()
+                ]
+                for name, values in self._values.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values = {name: {} for name in HISTOGRAMS}
+
+    def maybe_flush(self, force: bool = False) -> None:
+        """Writes this worker's snapshot to the multiprocess directory"""
+        directory = getattr(settings, 'METRICS_MULTIPROCESS_DIR', None)
+        if not directory:
+            return
+        now = time.monotonic()
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+        if not force and now - self._last_flush < interval:
+            return
+        self._last_flush = now
+
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'worker-{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Metriken konnten nicht geschrieben werden: {e}")
+
+    def collect(self) -> dict:
+        """Snapshot of this process, or the sum over all worker files"""
+        directory = getattr(settings, 'METRICS_MULTIPROCESS_DIR', None)
+        if not directory:
+            return self.snapshot()
+
+        self.maybe_flush(force=True)
+        ttl = getattr(settings, 'METRICS_WORKER_TTL', 86400)
+        now = time.time()
+        merged = {name: {} for name in HISTOGRAMS}
+        for filename in os.listdir(directory):
+            if not filename.endswith('.json'):
+                continue
+            path = os.path.join(directory, filename)
+            try:
+                if _is_stale(path, filename, now, ttl):
+                    os.remove(path)
+                    continue
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, series_list in snapshot.items():
+                if name not in merged:
+                    continue
+                for series in series_list:
+                    key = tuple(sorted(series['labels'].items()))
+                    target = merged[name].setdefault(key, {
+                        'labels': series['labels'],
+                        'buckets': [0] * len(series['buckets']),
+                        'sum': 0.0,
+                        'count': 0,
+                    })
+                    target['buckets'] = [
+                        a + b
+                        for a, b in zip(
+                            target['buckets'], series['buckets'], strict=True
+                        )
+                    ]
+                    target['sum'] += series['sum']
+                    target['count'] += series['count']
+        return {name: list(values.values()) for name, values in merged.items()}
+
+
+def _is_stale(path: str, filename: str, now: float, ttl: int) -> bool:
+    """
+    Whether a worker file belongs to a dead worker or was not written for ttl
+
+    The TTL also covers pids reused by an unrelated process; a live but idle
+    worker whose file expired is summed again after its next flush.
+    """
+    if now - os.path.getmtime(path) > ttl:
+        return True
+    pid = filename.removeprefix('worker-').removesuffix('.json')
+    if not pid.isdigit() or os.name != 'posix':
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        # The process exists but belongs to another user
+        return False
+    return False
+
+
+registry = MetricsRegistry()
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    parts = []
+    for key, value in sorted(labels.items()):
+        value = (
+            str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        )
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def render_prometheus(snapshot: dict, extra_counters=()) -> str:
+    """
+    Renders histograms (and optional counters) in Prometheus text format
+
+    Args:
+        snapshot: Output of MetricsRegistry.collect()
+        extra_counters: Iterable of (name, help, [(labels, value), ...])
+
+    Returns:
+        The exposition text
+    """
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for series in snapshot.get(name, []):
+            cumulative = 0
+            for bound, count in zip(buckets, series['buckets'], strict=True):
+                cumulative += count
+                labels = _format_labels({**series['labels'], 'le': repr(float(bound))})
+                lines.append(f'{name}_bucket{labels} {cumulative}')
+            labels = _format_labels({**series['labels'], 'le': '+Inf'})
+            lines.append(f"{name}_bucket{labels} {series['count']}")
+            labels = _format_labels(series['labels'])
+            lines.append(f"{name}_sum{labels} {series['sum']}")
+            lines.append(f"{name}_count{labels} {series['count']}")
+
+    for name, help_text, samples in extra_counters:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for labels, value in samples:
+            lines.append(f'{name}{_format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def start_request(keep_queries: int = 0):
+    """Starts collecting costs for the current request context"""
+    stats = RequestStats(keep_queries=keep_queries)
+    return stats, _current_request.set(stats)
+
+
+def finish_request(token) -> None:
+    _current_request.reset(token)
+
+
+def sql_execute_wrapper(execute, sql, params, many, context):
+    """
+    Database execute wrapper installed on every connection
+
+    Attributes query count and time to the request being handled, if any.
+    """
+    stats = _current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add_query(sql, time.perf_counter() - started)
+
+
+def install_sql_wrapper(sender, connection, **kwargs):
+    """connection_created receiver adding sql_execute_wrapper once"""
+    if sql_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_execute_wrapper)
+
+
+@contextmanager
+def track_ai_call(tool: str):
+    """
+    Times an AIService call and adds it to the current request
+
+    Args:
+        tool: Name of the MCP tool or command
+    """
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        duration = time.perf_counter() - started
+        registry.observe(
+            'flashcards_ai_call_duration_seconds',
+            {'tool': tool, 'outcome': outcome},
+            duration,
+        )
+        stats = _current_request.get()
+        if stats is not None and not _ai_fan_out.get():
+            stats.ai_time += duration
+
+
+@contextmanager
+def track_ai_fan_out():
+    """
+    Adds the elapsed time of concurrent AI calls to the current request
+
+    Calls made inside (also from tasks started inside) still show up in
+    flashcards_ai_call_duration_seconds, but the request is charged the
+    wall time of the whole fan-out instead of the sum of its calls.
+    """
+    started = time.perf_counter()
+    token = _ai_fan_out.set(True)
+    try:
+        yield
+    finally:
+        _ai_fan_out.reset(token)
+        stats = _current_request.get()
+        if stats is not None:
+            stats.ai_time += time.perf_counter() - started
@@ -0,0 +1,88 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import finish_request, registry, start_request
+
+logger = logging.getLogger(__name__)
+
+
+class PerformanceMiddleware:
+    """
+    Records latency, SQL query count, SQL time and AIService time per view
+
+    Works for sync and async views alike, so the async AI endpoints are not
+    forced back into a worker thread. Requests slower than
+    METRICS_SLOW_REQUEST_MS are logged together with their slowest queries.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            finish_request(token)
+        self.finish(request, response, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            finish_request(token)
+        self.finish(request, response, stats)
+        return response
+
+    def start(self, request):
+        keep_queries = (
+            getattr(settings, 'METRICS_SLOW_REQUEST_TOP_QUERIES', 5)
+            if getattr(settings, 'METRICS_SLOW_REQUEST_MS', 0)
+            else 0
+        )
+        return start_request(keep_queries=keep_queries)
+
+    def finish(self, request, response, stats):
+        duration = time.perf_counter() - stats.started
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        labels = {'view': view, 'method': request.method}
+
+        registry.observe(
+            'flashcards_request_duration_seconds',
+            {**labels, 'status': str(response.status_code)},
+            duration,
+        )
+        registry.observe('flashcards_request_sql_queries', labels, stats.query_count)
+        registry.observe(
+            'flashcards_request_sql_duration_seconds', labels, stats.query_time
+        )
+        registry.observe(
+            'flashcards_request_ai_duration_seconds', labels, stats.ai_time
+        )
+        registry.maybe_flush()
+
+        slow_ms = getattr(settings, 'METRICS_SLOW_REQUEST_MS', 0)
+        if slow_ms and duration * 1000 >= slow_ms:
+            top = '\n'.join(
+                f'  {query_time * 1000:.1f} ms: {sql[:500]}'
+                for query_time, _, sql in stats.top_queries()
+            )
+            logger.warning(
+                f"Langsamer Request {request.method} {request.path} ({view}): "
+                f"{duration * 1000:.0f} ms, {stats.query_count} Queries "
+                f"({stats.query_time * 1000:.0f} ms SQL, "
+                f"{stats.ai_time * 1000:.0f} ms AI)\n{top}"
+            )
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-19 08:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0004_card_average_review_time_card_correct_count_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_checksum',
+            field=models.CharField(blank=True, help_text='SHA-256 des hochgeladenen Profilbilds', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avatar_variants',
+            field=models.JSONField(blank=True, default=dict, help_text='Verkleinerte Profilbilder je Größe und Format'),
+        ),
+    ]
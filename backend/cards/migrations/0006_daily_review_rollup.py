@@ -0,0 +1,90 @@
+# Generated by Django 5.2.3 on 2026-10-19 08:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, Count, F, Q, Sum, When
+from django.db.models.functions import TruncDate
+
+
+def build_rollups(apps, schema_editor, batch_size=1000):
+    # Aggregation of cards.rollups.rebuild_rollups as of this migration;
+    # older clients sent seconds, so values up to 1000 count as seconds.
+    CardReview = apps.get_model('cards', 'CardReview')
+    DailyReviewRollup = apps.get_model('cards', 'DailyReviewRollup')
+
+    bounds = (0, 2000, 5000, 10000, 30000, 60000, None)
+    fields = (
+        'time_under_2s',
+        'time_under_5s',
+        'time_under_10s',
+        'time_under_30s',
+        'time_under_60s',
+        'time_over_60s',
+    )
+    buckets = {}
+    for field, lower, upper in zip(fields, bounds, bounds[1:], strict=False):
+        in_bucket = Q(time_ms__gte=lower)
+        if upper is not None:
+            in_bucket &= Q(time_ms__lt=upper)
+        buckets[field] = Count('id', filter=in_bucket)
+
+    rows = (
+        CardReview.objects.order_by()
+        .annotate(time_ms=Case(
+            When(time_taken__gt=1000, then=F('time_taken')),
+            default=F('time_taken') * 1000,
+        ))
+        .values('session__user_id', 'session__deck_id', day=TruncDate('created_at'))
+        .annotate(
+            review_count=Count('id'),
+            correct_count=Count('id', filter=Q(is_correct=True)),
+            total_time=Sum('time_ms'),
+            **buckets,
+        )
+    )
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(DailyReviewRollup(
+            user_id=row.pop('session__user_id'),
+            deck_id=row.pop('session__deck_id'),
+            **row,
+        ))
+        if len(batch) >= batch_size:
+            DailyReviewRollup.objects.bulk_create(batch)
+            batch = []
+    DailyReviewRollup.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0005_user_avatar_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyReviewRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('review_count', models.IntegerField(default=0)),
+                ('correct_count', models.IntegerField(default=0)),
+                ('total_time', models.BigIntegerField(default=0, help_text='Summe der Antwortzeiten in Millisekunden')),
+                ('time_under_2s', models.IntegerField(default=0)),
+                ('time_under_5s', models.IntegerField(default=0)),
+                ('time_under_10s', models.IntegerField(default=0)),
+                ('time_under_30s', models.IntegerField(default=0)),
+                ('time_under_60s', models.IntegerField(default=0)),
+                ('time_over_60s', models.IntegerField(default=0)),
+                ('deck', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_rollups', to='cards.deck')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['user', 'day'], name='cards_daily_user_id_65a5d2_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'deck', 'day'), name='unique_daily_review_rollup')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
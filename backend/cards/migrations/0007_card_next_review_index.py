@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-19 08:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0006_daily_review_rollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(fields=['deck', 'next_review'], name='cards_card_deck_id_e67f8f_idx'),
+        ),
+    ]
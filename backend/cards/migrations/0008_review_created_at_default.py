@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-19 08:52
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0007_card_next_review_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cardreview',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,159 @@
+# Generated by Django 5.2.3 on 2026-10-19 09:04
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def schedule_review(schedule, is_correct, taken_time, reviewed_at):
+    """SM-2 update of cards.srs.schedule_review as of this migration"""
+    schedule.last_reviewed = reviewed_at
+
+    schedule.total_review_time += round(taken_time)
+    total_reviews = schedule.repetition_count + schedule.incorrect_count
+    if total_reviews > 0:
+        schedule.average_review_time = schedule.total_review_time / total_reviews
+
+    if not is_correct:
+        schedule.incorrect_count += 1
+        schedule.repetition_count = 0
+        schedule.interval = 1
+        schedule.next_review = reviewed_at + timedelta(days=1)
+        return
+
+    schedule.correct_count += 1
+    if schedule.average_review_time > 0:
+        if taken_time < schedule.average_review_time * 0.75:
+            q = 5
+        elif taken_time > schedule.average_review_time * 1.25:
+            q = 2
+        else:
+            q = 4
+    else:
+        q = 4
+    schedule.ease_factor = max(
+        1.3, schedule.ease_factor + (0.1 - (5 - q) * (0.08 + (5 - q) * 0.02))
+    )
+
+    schedule.repetition_count += 1
+    if schedule.repetition_count == 1:
+        schedule.interval = 1
+    elif schedule.repetition_count == 2:
+        schedule.interval = 6
+    else:
+        schedule.interval = round(schedule.interval * schedule.ease_factor)
+    schedule.next_review = reviewed_at + timedelta(days=schedule.interval)
+
+
+def build_schedules(apps, schema_editor, batch_size=1000):
+    # Each user's SRS state is replayed from their own reviews; the shared
+    # state on the cards cannot be split between users.
+    CardReview = apps.get_model('cards', 'CardReview')
+    CardSchedule = apps.get_model('cards', 'CardSchedule')
+
+    reviews = (
+        CardReview.objects.order_by('session__user_id', 'card_id', 'created_at', 'id')
+        .values_list(
+            'session__user_id', 'card_id', 'is_correct', 'time_taken', 'created_at'
+        )
+        .iterator(chunk_size=batch_size)
+    )
+    batch, schedule = [], None
+    for user_id, card_id, is_correct, time_taken, created_at in reviews:
+        if schedule is None or (schedule.user_id, schedule.card_id) != (
+            user_id, card_id
+        ):
+            if len(batch) >= batch_size:
+                CardSchedule.objects.bulk_create(batch)
+                batch = []
+            schedule = CardSchedule(user_id=user_id, card_id=card_id)
+            batch.append(schedule)
+        schedule_review(schedule, is_correct, float(time_taken), created_at)
+    CardSchedule.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0009_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CardSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('interval', models.IntegerField(default=0)),
+                ('ease_factor', models.FloatField(default=2.5)),
+                ('repetition_count', models.IntegerField(default=0)),
+                ('last_reviewed', models.DateTimeField(blank=True, null=True)),
+                ('next_review', models.DateTimeField(blank=True, null=True)),
+                ('total_review_time', models.IntegerField(default=0)),
+                ('average_review_time', models.IntegerField(default=0)),
+                ('correct_count', models.IntegerField(default=0)),
+                ('incorrect_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='cardschedule',
+            name='card',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedules', to='cards.card'),
+        ),
+        migrations.AddField(
+            model_name='cardschedule',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='card_schedules', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='cardschedule',
+            index=models.Index(fields=['user', 'next_review'], name='cards_cards_user_id_2007ff_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cardschedule',
+            constraint=models.UniqueConstraint(fields=('user', 'card'), name='unique_card_schedule'),
+        ),
+        migrations.RunPython(build_schedules, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='card',
+            name='cards_card_deck_id_e67f8f_idx',
+        ),
+        migrations.RemoveField(
+            model_name='card',
+            name='average_review_time',
+        ),
+        migrations.RemoveField(
+            model_name='card',
+            name='correct_count',
+        ),
+        migrations.RemoveField(
+            model_name='card',
+            name='ease_factor',
+        ),
+        migrations.RemoveField(
+            model_name='card',
+            name='incorrect_count',
+        ),
+        migrations.RemoveField(
+            model_name='card',
+            name='interval',
+        ),
+        migrations.RemoveField(
+            model_name='card',
+            name='last_reviewed',
+        ),
+        migrations.RemoveField(
+            model_name='card',
+            name='next_review',
+        ),
+        migrations.RemoveField(
+            model_name='card',
+            name='repetition_count',
+        ),
+        migrations.RemoveField(
+            model_name='card',
+            name='total_review_time',
+        ),
+    ]
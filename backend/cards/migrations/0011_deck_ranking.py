@@ -0,0 +1,108 @@
+# Generated by Django 5.2.3 on 2026-10-19 09:17
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+# Ranking parameters of cards.ranking as of this migration
+RANKING_WINDOW_DAYS = 30
+ACCURACY_PRIOR = 0.7
+ACCURACY_PRIOR_REVIEWS = 20
+
+
+def build_rankings(apps, schema_editor):
+    Deck = apps.get_model('cards', 'Deck')
+    LearningSession = apps.get_model('cards', 'LearningSession')
+    DailyReviewRollup = apps.get_model('cards', 'DailyReviewRollup')
+    DeckRanking = apps.get_model('cards', 'DeckRanking')
+
+    now = timezone.now()
+    since = now - timedelta(days=RANKING_WINDOW_DAYS)
+    sessions = {
+        row['deck']: row
+        for row in LearningSession.objects.filter(
+            deck__is_public=True, started_at__gte=since
+        )
+        .values('deck')
+        .annotate(learners=Count('user', distinct=True), sessions=Count('id'))
+        .order_by()
+    }
+    reviews = {
+        row['deck']: row
+        for row in DailyReviewRollup.objects.filter(
+            deck__is_public=True, day__gte=timezone.localdate(since)
+        )
+        .values('deck')
+        .annotate(reviews=Sum('review_count'), correct=Sum('correct_count'))
+        .order_by()
+    }
+
+    entries = []
+    decks = (
+        Deck.objects.filter(is_public=True)
+        .annotate(card_total=Count('cards'))
+        .values_list('id', 'card_total', 'updated_at')
+        .order_by()
+    )
+    for deck_id, cards, updated_at in decks:
+        activity = sessions.get(deck_id, {})
+        learners = activity.get('learners', 0)
+        session_count = activity.get('sessions', 0)
+        review_count = reviews.get(deck_id, {}).get('reviews', 0)
+        correct = reviews.get(deck_id, {}).get('correct', 0)
+        accuracy = (correct + ACCURACY_PRIOR * ACCURACY_PRIOR_REVIEWS) / (
+            review_count + ACCURACY_PRIOR_REVIEWS
+        )
+        entry = DeckRanking(
+            deck_id=deck_id,
+            score=(learners + 0.2 * session_count) * accuracy,
+            card_count=cards,
+            learner_count=learners,
+            session_count=session_count,
+            review_count=review_count,
+            accuracy=correct / review_count if review_count else None,
+            refreshed_at=now,
+        )
+        entries.append((entry, updated_at))
+
+    entries.sort(
+        key=lambda item: (item[0].score, item[1], item[0].deck_id), reverse=True
+    )
+    for rank, (entry, _) in enumerate(entries, start=1):
+        entry.rank = rank
+    DeckRanking.objects.bulk_create([entry for entry, _ in entries], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0010_card_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeckRanking',
+            fields=[
+                ('deck', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='cards.deck')),
+                ('rank', models.PositiveIntegerField(unique=True)),
+                ('score', models.FloatField(default=0)),
+                ('card_count', models.IntegerField(default=0)),
+                ('learner_count', models.IntegerField(default=0)),
+                ('session_count', models.IntegerField(default=0)),
+                ('review_count', models.IntegerField(default=0)),
+                ('accuracy', models.FloatField(blank=True, help_text='Anteil richtiger Antworten im Ranking-Zeitraum', null=True)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['rank'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='deck',
+            index=models.Index(fields=['owner', '-updated_at'], name='cards_deck_owner_i_e9825c_idx'),
+        ),
+        migrations.RunPython(build_rankings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,147 @@
+# Generated by Django 5.2.3 on 2026-10-19 09:26
+
+import hashlib
+import random
+import re
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+# MinHash / LSH parameters of cards.dedup as of this migration. The stored
+# signatures are compared with those of the live code, so the permutations
+# must come out the same.
+SHINGLE_SIZE = 4
+BANDS = 16
+ROWS_PER_BAND = 4
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_random = random.Random(20241019)
+_PERMUTATIONS = [
+    (_random.randrange(1, _MERSENNE_PRIME), _random.randrange(0, _MERSENNE_PRIME))
+    for _ in range(BANDS * ROWS_PER_BAND)
+]
+
+
+def _hash(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big')
+
+
+def signature(front, back):
+    """MinHash signature of cards.dedup.signature as of this migration"""
+    text = '|'.join(
+        ' '.join(re.findall(r'\w+', part.lower())) for part in (front, back)
+    )
+    if len(text) <= SHINGLE_SIZE:
+        values = {_hash(text.encode())}
+    else:
+        values = {
+            _hash(text[i:i + SHINGLE_SIZE].encode())
+            for i in range(len(text) - SHINGLE_SIZE + 1)
+        }
+    return [
+        min(((a * value + b) % _MERSENNE_PRIME) & _MAX_HASH for value in values)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def band_keys(minhash):
+    keys = []
+    for band in range(BANDS):
+        rows = minhash[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(
+            repr((band, rows)).encode(), digest_size=8
+        ).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
+
+
+def build_index(apps, schema_editor, batch_size=1000):
+    # Cards are checked deck by deck in creation order, so the older card
+    # of a pair is always the original.
+    Card = apps.get_model('cards', 'Card')
+    CardSignature = apps.get_model('cards', 'CardSignature')
+    CardBucket = apps.get_model('cards', 'CardBucket')
+    threshold = getattr(settings, 'CARD_DUPLICATE_THRESHOLD', 0.8)
+
+    deck_id, now = None, timezone.now()
+    signatures, buckets, changed = [], [], []
+    rows = Card.objects.order_by('deck_id', 'id').values_list(
+        'id', 'deck_id', 'front', 'back'
+    )
+    for card_id, card_deck_id, front, back in rows.iterator(chunk_size=batch_size):
+        if card_deck_id != deck_id:
+            deck_id, index, indexed = card_deck_id, defaultdict(list), {}
+        minhash = signature(front, back)
+        keys = band_keys(minhash)
+
+        original, best = None, threshold
+        candidates = dict.fromkeys(
+            other for key in keys for other in index.get(key, ())
+        )
+        for other in candidates:
+            other_minhash, other_original = indexed[other]
+            value = sum(
+                x == y for x, y in zip(minhash, other_minhash, strict=True)
+            ) / len(minhash)
+            if value >= best and (original is None or value > best):
+                original, best = other_original or other, value
+
+        indexed[card_id] = (minhash, original)
+        for key in keys:
+            index[key].append(card_id)
+        if original is not None:
+            changed.append(Card(pk=card_id, duplicate_of_id=original, updated_at=now))
+
+        signatures.append(CardSignature(card_id=card_id, minhash=minhash))
+        buckets.extend(
+            CardBucket(deck_id=card_deck_id, card_id=card_id, key=key)
+            for key in keys
+        )
+        if len(signatures) >= batch_size:
+            CardSignature.objects.bulk_create(signatures)
+            CardBucket.objects.bulk_create(buckets, batch_size=batch_size)
+            signatures, buckets = [], []
+
+    CardSignature.objects.bulk_create(signatures)
+    CardBucket.objects.bulk_create(buckets, batch_size=batch_size)
+    Card.objects.bulk_update(
+        changed, ['duplicate_of', 'updated_at'], batch_size=batch_size
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0011_deck_ranking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CardSignature',
+            fields=[
+                ('card', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='cards.card')),
+                ('minhash', models.JSONField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, help_text='Ältere Karte desselben Decks mit (fast) gleichem Inhalt', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='cards.card'),
+        ),
+        migrations.CreateModel(
+            name='CardBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField()),
+                ('card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='cards.card')),
+                ('deck', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='card_buckets', to='cards.deck')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['deck', 'key'], name='cards_cardb_deck_id_b04e8a_idx')],
+            },
+        ),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
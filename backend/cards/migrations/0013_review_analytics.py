@@ -0,0 +1,44 @@
+# Generated by Django 5.2.3 on 2026-10-19 09:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0012_card_duplicates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeckAnalytics',
+            fields=[
+                ('deck', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='analytics', serialize=False, to='cards.deck')),
+                ('review_count', models.IntegerField(default=0)),
+                ('correct_count', models.IntegerField(default=0)),
+                ('lapse_count', models.IntegerField(default=0)),
+                ('leech_count', models.IntegerField(default=0, help_text='Karten, die für mindestens einen Lernenden ein Leech sind')),
+                ('weakness', models.FloatField(default=0, help_text='Geglättete Fehlerquote')),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CardAnalytics',
+            fields=[
+                ('card', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='analytics', serialize=False, to='cards.card')),
+                ('review_count', models.IntegerField(default=0)),
+                ('correct_count', models.IntegerField(default=0)),
+                ('learner_count', models.IntegerField(default=0)),
+                ('lapse_count', models.IntegerField(default=0, help_text='Falsche Antworten nach einer richtigen Antwort')),
+                ('lapse_rate', models.FloatField(default=0, help_text='Anteil der Lapses an den Antworten nach einer richtigen Antwort')),
+                ('leech_count', models.IntegerField(default=0, help_text='Lernende, für die die Karte ein Leech ist')),
+                ('weakness', models.FloatField(default=0, help_text='Geglättete Fehlerquote')),
+                ('refreshed_at', models.DateTimeField()),
+                ('deck', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='card_analytics', to='cards.deck')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['deck', '-weakness'], name='cards_carda_deck_id_4fb4e9_idx')],
+            },
+        ),
+    ]
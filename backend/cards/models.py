@@ -1,10 +1,17 @@
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 import os
-from PIL import Image
-from io import BytesIO
-from django.core.files import File
+
+from .avatars import (
+    delete_variants,
+    file_checksum,
+    schedule_avatar_processing,
+)
+from .cache import get_or_compute, user_key
 
 
 def user_avatar_path(instance, filename):
@@ -37,6 +44,16 @@ class User(AbstractUser):
         null=True,
         help_text=_('Profilbild des Benutzers')
     )
+    avatar_checksum = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text=_('SHA-256 des hochgeladenen Profilbilds')
+    )
+    avatar_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text=_('Verkleinerte Profilbilder je Größe und Format')
+    )
 
     class Meta:
         verbose_name = _('Benutzer')
@@ -50,42 +67,69 @@ class User(AbstractUser):
         return f"{self.first_name} {self.last_name}".strip() or self.username
 
     def save(self, *args, **kwargs):
-        # Resize avatar if it exists and is being saved
-        if self.avatar:
-            self.resize_avatar()
+        # Only a freshly assigned upload is uncommitted; profile edits that
+        # keep the avatar never touch the image.
+        avatar_changed = bool(self.avatar) and not self.avatar._committed
+        if avatar_changed:
+            checksum = file_checksum(self.avatar)
+            avatar_changed = checksum != self.avatar_checksum
+            if avatar_changed:
+                delete_variants(self.avatar_variants)
+                self.avatar_checksum = checksum
+                self.avatar_variants = {}
+        elif not self.avatar and self.avatar_checksum:
+            delete_variants(self.avatar_variants)
+            self.avatar_checksum = ''
+            self.avatar_variants = {}
         super().save(*args, **kwargs)
-
-    def resize_avatar(self):
-        """Resize avatar to 300x300 pixels"""
-        if self.avatar:
-            img = Image.open(self.avatar)
-            
-            # Convert to RGB if necessary
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # Resize image
-            img.thumbnail((300, 300), Image.Resampling.LANCZOS)
-            
-            # Save the resized image
-            output = BytesIO()
-            img.save(output, format='JPEG', quality=85, optimize=True)
-            output.seek(0)
-            
-            # Update the avatar field
-            self.avatar.save(
-                os.path.basename(self.avatar.name),
-                File(output),
-                save=False
-            )
+        if avatar_changed:
+            schedule_avatar_processing(self)
 
     @property
     def avatar_url(self):
         """Get avatar URL or default avatar"""
         if self.avatar:
+            variant = self.avatar_variants.get('300', {}).get('jpeg')
+            if variant:
+                return self.avatar.storage.url(variant)
             return self.avatar.url
         return f"https://api.dicebear.com/7.x/initials/svg?seed={self.username}"
 
+    @property
+    def avatar_urls(self):
+        """URLs of all processed avatar sizes, empty until processing finished"""
+        storage = self.avatar.storage
+        return {
+            size: {ext: storage.url(path) for ext, path in formats.items()}
+            for size, formats in self.avatar_variants.items()
+        }
+
+    @cached_property
+    def cached_stats(self):
+        """Dashboard counters of the user, served from the stats cache"""
+        return get_or_compute(
+            user_key(self.pk, 'profile_stats'),
+            'user_stats',
+            self._compute_stats,
+        )
+
+    def _compute_stats(self):
+        reviews = self.review_rollups.aggregate(
+            reviewed=models.Sum('review_count', default=0),
+            correct=models.Sum('correct_count', default=0),
+        )
+        return {
+            'total_cards_created': self.total_cards_created,
+            'total_decks_created': self.total_decks_created,
+            'total_learning_sessions': self.total_learning_sessions,
+            'total_cards_reviewed': reviews['reviewed'],
+            'total_correct_answers': reviews['correct'],
+            'learning_accuracy': (
+                reviews['correct'] / reviews['reviewed'] * 100
+                if reviews['reviewed'] else 0
+            ),
+        }
+
     @property
     def total_cards_created(self):
         """Calculate the total number of cards created"""
@@ -104,12 +148,16 @@ class User(AbstractUser):
     @property
     def total_cards_reviewed(self):
         """Calculate the total number of cards reviewed"""
-        return CardReview.objects.filter(session__user=self).count()
+        return self.review_rollups.aggregate(
+            total=models.Sum('review_count', default=0)
+        )['total']
 
     @property
     def total_correct_answers(self):
         """Calculate the total number of correct answers"""
-        return CardReview.objects.filter(session__user=self, is_correct=True).count()
+        return self.review_rollups.aggregate(
+            total=models.Sum('correct_count', default=0)
+        )['total']
 
     @property
     def learning_accuracy(self):
@@ -136,13 +184,17 @@ class Deck(models.Model):
 
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            # The personal deck list: own decks, newest first
+            models.Index(fields=['owner', '-updated_at']),
+        ]
 
     def __str__(self):
         return self.title
 
-    @property
+    @cached_property
     def card_count(self):
-        """Number of cards in the deck"""
+        """Number of cards in the deck, unless annotated by the queryset"""
         return self.cards.count()
 
 class Card(models.Model):
@@ -156,6 +208,88 @@ class Card(models.Model):
     )
     front = models.TextField()
     back = models.TextField()
+    duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='duplicates',
+        help_text=_('Ältere Karte desselben Decks mit (fast) gleichem Inhalt')
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return self.front[:50] + "..." if len(self.front) > 50 else self.front
+
+class CardSignature(models.Model):
+    """
+    MinHash signature of a card's front and back
+
+    Compared against the signatures of the candidates found through the
+    card's CardBucket rows; see cards/dedup.py.
+    """
+    card = models.OneToOneField(
+        Card,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature',
+    )
+    minhash = models.JSONField()
+
+    def __str__(self):
+        return str(self.card_id)
+
+class CardBucket(models.Model):
+    """
+    LSH bucket of a card: one row per band of its signature
+
+    Cards of the same deck sharing a bucket key are duplicate candidates,
+    so a lookup reads a few index entries instead of every card of the deck.
+    """
+    deck = models.ForeignKey(
+        Deck,
+        on_delete=models.CASCADE,
+        related_name='card_buckets',
+    )
+    card = models.ForeignKey(
+        Card,
+        on_delete=models.CASCADE,
+        related_name='buckets',
+    )
+    key = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deck', 'key']),
+        ]
+
+    def __str__(self):
+        return f"{self.deck_id} - {self.key}"
+
+class CardSchedule(models.Model):
+    """
+    SRS state of one card for one user
+
+    Kept apart from the card content, so any number of users can study a
+    public deck without copying its cards or writing to the same rows.
+    Created on a user's first review of the card; cards without a schedule
+    are new and due.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='card_schedules',
+    )
+    card = models.ForeignKey(
+        Card,
+        on_delete=models.CASCADE,
+        related_name='schedules',
+    )
 
     interval = models.IntegerField(default=0)
     ease_factor = models.FloatField(default=2.5)
@@ -167,14 +301,21 @@ class Card(models.Model):
     correct_count = models.IntegerField(default=0)
     incorrect_count = models.IntegerField(default=0)
 
-    created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        ordering = ['created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'card'],
+                name='unique_card_schedule',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'next_review']),
+        ]
 
     def __str__(self):
-        return self.front[:50] + "..." if len(self.front) > 50 else self.front
+        return f"{self.user_id} - {self.card_id}"
 
 class LearningSession(models.Model):
     """
@@ -225,10 +366,274 @@ class CardReview(models.Model):
     )
     is_correct = models.BooleanField(default=False)
     time_taken = models.IntegerField(default=0)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: reviews synced from offline clients keep the time
+    # they were made.
+    created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ['-created_at']
 
     def __str__(self):
         return f"{self.session.user.username} - {self.card.front}"
+
+class DailyReviewRollup(models.Model):
+    """
+    Reviews of a user in one deck on one day
+
+    Kept up to date on every review, so statistics read a few rollup rows
+    instead of scanning CardReview. `rebuild_review_rollups` recreates
+    them from the review history.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='review_rollups',
+    )
+    deck = models.ForeignKey(
+        Deck,
+        on_delete=models.CASCADE,
+        related_name='review_rollups',
+    )
+    day = models.DateField()
+    review_count = models.IntegerField(default=0)
+    correct_count = models.IntegerField(default=0)
+    total_time = models.BigIntegerField(
+        default=0,
+        help_text='Summe der Antwortzeiten in Millisekunden'
+    )
+    time_under_2s = models.IntegerField(default=0)
+    time_under_5s = models.IntegerField(default=0)
+    time_under_10s = models.IntegerField(default=0)
+    time_under_30s = models.IntegerField(default=0)
+    time_under_60s = models.IntegerField(default=0)
+    time_over_60s = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'deck', 'day'],
+                name='unique_daily_review_rollup',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.deck_id} - {self.day}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Stored response of a POST sent with an Idempotency-Key header
+
+    A retry with the same key is answered from this row instead of running
+    the request again. While the first request is still running the row has
+    no response yet; see cards/idempotency.py.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys',
+    )
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(
+        max_length=64,
+        help_text='SHA-256 über Endpunkt und Request-Body'
+    )
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'key'],
+                name='unique_idempotency_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.key}"
+
+
+class DeckRanking(models.Model):
+    """
+    Precomputed catalog entry of a public deck
+
+    Rebuilt periodically by `refresh_deck_rankings` (see cards/ranking.py),
+    so the public catalog reads this table in rank order instead of
+    scanning and sorting every public deck per request.
+    """
+    deck = models.OneToOneField(
+        Deck,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='ranking',
+    )
+    rank = models.PositiveIntegerField(unique=True)
+    score = models.FloatField(default=0)
+    card_count = models.IntegerField(default=0)
+    learner_count = models.IntegerField(default=0)
+    session_count = models.IntegerField(default=0)
+    review_count = models.IntegerField(default=0)
+    accuracy = models.FloatField(
+        null=True,
+        blank=True,
+        help_text='Anteil richtiger Antworten im Ranking-Zeitraum'
+    )
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['rank']
+
+    def __str__(self):
+        return f"{self.rank}. {self.deck_id}"
+
+
+class CardAnalytics(models.Model):
+    """
+    Learning statistics of a card over all its learners
+
+    Recomputed nightly from the review history by `analyze_reviews` (see
+    cards/analytics.py), so the weakness endpoint reads these rows instead
+    of scanning CardReview.
+    """
+    card = models.OneToOneField(
+        Card,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='analytics',
+    )
+    deck = models.ForeignKey(
+        Deck,
+        on_delete=models.CASCADE,
+        related_name='card_analytics',
+    )
+    review_count = models.IntegerField(default=0)
+    correct_count = models.IntegerField(default=0)
+    learner_count = models.IntegerField(default=0)
+    lapse_count = models.IntegerField(
+        default=0,
+        help_text='Falsche Antworten nach einer richtigen Antwort'
+    )
+    lapse_rate = models.FloatField(
+        default=0,
+        help_text='Anteil der Lapses an den Antworten nach einer richtigen Antwort'
+    )
+    leech_count = models.IntegerField(
+        default=0,
+        help_text='Lernende, für die die Karte ein Leech ist'
+    )
+    weakness = models.FloatField(
+        default=0,
+        help_text='Geglättete Fehlerquote'
+    )
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # The weakest cards of a deck
+            models.Index(fields=['deck', '-weakness']),
+        ]
+
+    def __str__(self):
+        return f"{self.card_id}: {self.weakness:.2f}"
+
+
+class DeckAnalytics(models.Model):
+    """
+    Learning statistics of a deck, summed up from its CardAnalytics
+    """
+    deck = models.OneToOneField(
+        Deck,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='analytics',
+    )
+    review_count = models.IntegerField(default=0)
+    correct_count = models.IntegerField(default=0)
+    lapse_count = models.IntegerField(default=0)
+    leech_count = models.IntegerField(
+        default=0,
+        help_text='Karten, die für mindestens einen Lernenden ein Leech sind'
+    )
+    weakness = models.FloatField(
+        default=0,
+        help_text='Geglättete Fehlerquote'
+    )
+    refreshed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.deck_id}: {self.weakness:.2f}"
+
+
+class SchedulerLock(models.Model):
+    """
+    Leader lease of the maintenance scheduler (`run_scheduler`)
+
+    Only the process whose owner is stored here and whose lease has not
+    expired runs jobs; see cards/scheduler.py.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    owner = models.CharField(max_length=255, blank=True)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name}: {self.owner or '-'}"
+
+
+class ScheduledJob(models.Model):
+    """
+    Last run of a periodic maintenance job
+
+    Stored in the database, so a new leader knows which jobs are due after
+    a restart or failover.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    last_started_at = models.DateTimeField(null=True, blank=True)
+    last_finished_at = models.DateTimeField(null=True, blank=True)
+    last_duration = models.FloatField(
+        null=True,
+        blank=True,
+        help_text='Dauer des letzten Laufs in Sekunden'
+    )
+    last_result = models.CharField(max_length=255, blank=True)
+    last_error = models.TextField(blank=True)
+    run_count = models.IntegerField(default=0)
+    failure_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return self.name
+
+
+class ReviewArchive(models.Model):
+    """
+    Reviews of a user in one month, moved out of CardReview
+
+    `archive_reviews` packs old reviews column by column into data (see
+    cards/archive.py) and deletes their rows; their daily rollups are kept,
+    so the statistics do not change.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='review_archives',
+    )
+    month = models.DateField(help_text='Erster Tag des Monats')
+    review_count = models.IntegerField()
+    data = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'month'],
+                name='unique_review_archive',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.month:%Y-%m}"
@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import DailyReviewRollup, Deck, DeckRanking, LearningSession
+
+# Activity older than this does not count towards the ranking
+RANKING_WINDOW_DAYS = 30
+# Decks with few reviews are pulled towards this accuracy
+ACCURACY_PRIOR = 0.7
+ACCURACY_PRIOR_REVIEWS = 20
+
+
+def deck_score(learners: int, sessions: int, reviews: int, correct: int) -> float:
+    """
+    Ranking score of a public deck from its recent activity
+
+    Popularity (distinct learners, plus sessions at a lower weight so a
+    single heavy user cannot carry a deck) times the smoothed accuracy.
+    """
+    popularity = learners + 0.2 * sessions
+    accuracy = (correct + ACCURACY_PRIOR * ACCURACY_PRIOR_REVIEWS) / (
+        reviews + ACCURACY_PRIOR_REVIEWS
+    )
+    return popularity * accuracy
+
+
+def refresh_rankings(
+    now=None,
+    batch_size: int = 1000,
+) -> int:
+    """
+    Recomputes the catalog ranking of all public decks
+
+    Three grouped queries collect the activity of the last
+    RANKING_WINDOW_DAYS (sessions and, from the daily rollups, reviews);
+    the ranking table is then replaced in one transaction, so readers
+    never see a half-written ranking. Ties go to the more recently
+    updated deck.
+
+    Args:
+        now: Reference time (default: now)
+        batch_size: Rows per INSERT
+
+    Returns:
+        Number of ranked decks
+    """
+    now = now or timezone.now()
+    since = now - timedelta(days=RANKING_WINDOW_DAYS)
+
+    sessions = {
+        row['deck']: row
+        for row in LearningSession.objects.filter(
+            deck__is_public=True, started_at__gte=since
+        )
+        .values('deck')
+        .annotate(learners=Count('user', distinct=True), sessions=Count('id'))
+        .order_by()
+    }
+    reviews = {
+        row['deck']: row
+        for row in DailyReviewRollup.objects.filter(
+            deck__is_public=True, day__gte=timezone.localdate(since)
+        )
+        .values('deck')
+        .annotate(reviews=Sum('review_count'), correct=Sum('correct_count'))
+        .order_by()
+    }
+
+    entries = []
+    decks = (
+        Deck.objects.filter(is_public=True)
+        .annotate(card_total=Count('cards'))
+        .values_list('id', 'card_total', 'updated_at')
+        .order_by()
+    )
+    for deck_id, cards, updated_at in decks:
+        activity = sessions.get(deck_id, {})
+        learners = activity.get('learners', 0)
+        session_count = activity.get('sessions', 0)
+        review_count = reviews.get(deck_id, {}).get('reviews', 0)
+        correct = reviews.get(deck_id, {}).get('correct', 0)
+        entry = DeckRanking(
+            deck_id=deck_id,
+            score=deck_score(learners, session_count, review_count, correct),
+            card_count=cards,
+            learner_count=learners,
+            session_count=session_count,
+            review_count=review_count,
+            accuracy=correct / review_count if review_count else None,
+            refreshed_at=now,
+        )
+        entries.append((entry, updated_at))
+
+    entries.sort(
+        key=lambda item: (item[0].score, item[1], item[0].deck_id), reverse=True
+    )
+    for rank, (entry, _) in enumerate(entries, start=1):
+        entry.rank = rank
+
+    with transaction.atomic():
+        DeckRanking.objects.all().delete()
+        DeckRanking.objects.bulk_create(
+            [entry for entry, _ in entries], batch_size=batch_size
+        )
+    return len(entries)
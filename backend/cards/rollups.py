@@ -0,0 +1,274 @@
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Q, Sum, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .archive import archived_history, rewrite_archives
+from .models import CardReview, DailyReviewRollup, LearningSession
+
+# Upper bounds (exclusive, in ms) of the response time histogram columns;
+# the last column takes everything slower.
+TIME_BUCKETS = (2000, 5000, 10000, 30000, 60000)
+TIME_BUCKET_FIELDS = (
+    'time_under_2s',
+    'time_under_5s',
+    'time_under_10s',
+    'time_under_30s',
+    'time_under_60s',
+    'time_over_60s',
+)
+
+
+def review_time_ms(time_taken: int) -> int:
+    """
+    Response time of a review in milliseconds
+
+    Older clients sent seconds; values up to 1000 are taken as seconds,
+    as the statistics always did.
+    """
+    return time_taken if time_taken > 1000 else time_taken * 1000
+
+
+def time_bucket_field(time_ms: int) -> str:
+    return TIME_BUCKET_FIELDS[bisect_right(TIME_BUCKETS, time_ms)]
+
+
+def _count_review(counts: Counter, review) -> None:
+    """Adds a review to the day totals of a rollup"""
+    time_ms = review_time_ms(review.time_taken)
+    counts['review_count'] += 1
+    counts['correct_count'] += 1 if review.is_correct else 0
+    counts['total_time'] += time_ms
+    counts[time_bucket_field(time_ms)] += 1
+
+
+def record_review(review: CardReview, sign: int = 1) -> None:
+    """
+    Adds a review to (or with sign=-1 removes it from) its daily rollup
+
+    Runs as a single UPDATE with F() expressions, so concurrent reviews of
+    the same user and deck never lose counts. The first review of a day
+    creates the row.
+    """
+    if CardReview.session.is_cached(review):
+        user_id, deck_id = review.session.user_id, review.session.deck_id
+    else:
+        user_id, deck_id = (
+            LearningSession.objects.filter(pk=review.session_id)
+            .values_list('user_id', 'deck_id')
+            .first()
+        ) or (None, None)
+    if user_id is None:
+        return
+
+    time_ms = review_time_ms(review.time_taken)
+    correct = 1 if review.is_correct else 0
+    bucket = time_bucket_field(time_ms)
+    rollup = DailyReviewRollup.objects.filter(
+        user_id=user_id,
+        deck_id=deck_id,
+        day=timezone.localdate(review.created_at),
+    )
+    changes = {
+        'review_count': F('review_count') + sign,
+        'correct_count': F('correct_count') + sign * correct,
+        'total_time': F('total_time') + sign * time_ms,
+        bucket: F(bucket) + sign,
+    }
+    if rollup.update(**changes) or sign < 0:
+        return
+
+    try:
+        with transaction.atomic():
+            DailyReviewRollup.objects.create(
+                user_id=user_id,
+                deck_id=deck_id,
+                day=timezone.localdate(review.created_at),
+                review_count=1,
+                correct_count=correct,
+                total_time=time_ms,
+                **{bucket: 1},
+            )
+    except IntegrityError:
+        # Another review created the row in the meantime
+        rollup.update(**changes)
+
+
+def rebuild_rollups(
+    user_ids=None,
+    batch_size: int = 1000,
+) -> int:
+    """
+    Recreates the daily rollups from the review history
+
+    The aggregation runs in the database and the result is streamed, so
+    memory use does not depend on the number of reviews. Archived reviews
+    (cards/archive.py) are added one archive at a time.
+
+    Args:
+        user_ids: Only rebuild these users (default: everyone)
+        batch_size: Rows per INSERT
+
+    Returns:
+        Number of rollup rows written
+    """
+    reviews = CardReview.objects.all()
+    rollups = DailyReviewRollup.objects.all()
+    if user_ids is not None:
+        reviews = reviews.filter(session__user_id__in=user_ids)
+        rollups = rollups.filter(user_id__in=user_ids)
+
+    bounds = (0,) + TIME_BUCKETS + (None,)
+    buckets = {}
+    for field, lower, upper in zip(
+        TIME_BUCKET_FIELDS, bounds, bounds[1:], strict=False
+    ):
+        in_bucket = Q(time_ms__gte=lower)
+        if upper is not None:
+            in_bucket &= Q(time_ms__lt=upper)
+        buckets[field] = Count('id', filter=in_bucket)
+
+    rows = (
+        reviews.order_by()
+        .annotate(time_ms=Case(
+            When(time_taken__gt=1000, then=F('time_taken')),
+            default=F('time_taken') * 1000,
+        ))
+        .values('session__user_id', 'session__deck_id', day=TruncDate('created_at'))
+        .annotate(
+            review_count=Count('id'),
+            correct_count=Count('id', filter=Q(is_correct=True)),
+            total_time=Sum('time_ms'),
+            **buckets,
+        )
+    )
+
+    written = 0
+    with transaction.atomic():
+        rollups.delete()
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(DailyReviewRollup(
+                user_id=row.pop('session__user_id'),
+                deck_id=row.pop('session__deck_id'),
+                **row,
+            ))
+            if len(batch) >= batch_size:
+                DailyReviewRollup.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        DailyReviewRollup.objects.bulk_create(batch)
+        written += len(batch)
+        written += _add_archived(user_ids, batch_size)
+    return written
+
+
+def _add_archived(user_ids, batch_size: int) -> int:
+    """
+    Adds the archived reviews to the rebuilt rollups; returns new rows
+
+    The archives are read one at a time; only the day totals of the
+    current user are held.
+    """
+    written = 0
+    for user_id, reviews in groupby(archived_history(user_ids), key=itemgetter(0)):
+        days = defaultdict(Counter)
+        for _, review in reviews:
+            _count_review(
+                days[(review.deck_id, timezone.localdate(review.created_at))], review
+            )
+
+        # Late-synced reviews may share a day with archived ones
+        existing = {
+            (rollup.deck_id, rollup.day): rollup
+            for rollup in DailyReviewRollup.objects.filter(
+                user_id=user_id,
+                day__gte=min(day for _, day in days),
+                day__lte=max(day for _, day in days),
+            )
+        }
+        changed, new = [], []
+        for (deck_id, day), counts in days.items():
+            rollup = existing.get((deck_id, day))
+            if rollup is None:
+                new.append(DailyReviewRollup(
+                    user_id=user_id, deck_id=deck_id, day=day, **counts
+                ))
+                continue
+            for field, value in counts.items():
+                setattr(rollup, field, getattr(rollup, field) + value)
+            changed.append(rollup)
+        DailyReviewRollup.objects.bulk_update(
+            changed,
+            ['review_count', 'correct_count', 'total_time', *TIME_BUCKET_FIELDS],
+            batch_size=batch_size,
+        )
+        DailyReviewRollup.objects.bulk_create(new, batch_size=batch_size)
+        written += len(new)
+    return written
+
+
+def drop_archived(user_ids, matches) -> set:
+    """
+    Deletes archived reviews and takes them out of their daily rollups
+
+    Archived reviews have no rows whose deletion would update the rollups
+    (see remove_review_from_rollup), so this is done per rollup row here.
+
+    Args:
+        user_ids: Users whose archives are read (ids or a subquery)
+        matches: Called with every archived Review; True drops it
+
+    Returns:
+        IDs of the users whose rollups changed
+    """
+    dropped = rewrite_archives(
+        user_ids, lambda review: None if matches(review) else review
+    )
+    days = defaultdict(Counter)
+    for user_id, review in dropped:
+        _count_review(
+            days[(user_id, review.deck_id, timezone.localdate(review.created_at))],
+            review,
+        )
+    for (user_id, deck_id, day), counts in days.items():
+        DailyReviewRollup.objects.filter(
+            user_id=user_id, deck_id=deck_id, day=day
+        ).update(**{field: F(field) - value for field, value in counts.items()})
+    return {user_id for user_id, _, _ in days}
+
+
+def recent_review_totals(user, min_reviews: int) -> dict:
+    """
+    Totals of the most recent review days covering at least min_reviews
+
+    Reads at most min_reviews days of rollups (every day has at least one
+    review) in a single query.
+
+    Returns:
+        Dict with reviews, correct and total_time (ms)
+    """
+    days = (
+        DailyReviewRollup.objects.filter(user=user)
+        .values('day')
+        .annotate(
+            reviews=Sum('review_count'),
+            correct=Sum('correct_count'),
+            time=Sum('total_time'),
+        )
+        .filter(reviews__gt=0)
+        .order_by('-day')[:min_reviews]
+    )
+    totals = {'reviews': 0, 'correct': 0, 'total_time': 0}
+    for day in days:
+        totals['reviews'] += day['reviews']
+        totals['correct'] += day['correct']
+        totals['total_time'] += day['time']
+        if totals['reviews'] >= min_reviews:
+            break
+    return totals
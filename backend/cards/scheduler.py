@@ -0,0 +1,228 @@
+"""
+In-process scheduler of periodic maintenance jobs
+
+Jobs are plain functions registered with `@periodic(interval)` (see
+cards/jobs.py) and run by `python manage.py run_scheduler`. Any number of
+scheduler processes may run, e.g. one per host: they elect a leader
+through a single SchedulerLock row, and only the leader runs jobs. The
+lease is taken and renewed with one conditional UPDATE, so no external
+broker or lock service is needed; when the leader dies, another process
+takes over once the lease has expired.
+
+When a job ran last is stored in ScheduledJob, so a restart or a new
+leader does not run every job again at once. Every run is timed in the
+flashcards_job_duration_seconds histogram.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+from importlib import import_module
+from typing import Callable
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .metrics import registry
+from .models import ScheduledJob, SchedulerLock
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = 'maintenance'
+MAX_RESULT_LENGTH = 255
+
+
+@dataclass(frozen=True)
+class Job:
+    name: str
+    interval: timedelta
+    func: Callable
+
+
+@dataclass
+class JobRun:
+    """Outcome of one run of a job"""
+    name: str
+    duration: float
+    result: str = ''
+    error: str = ''
+
+
+JOBS = {}
+
+
+def periodic(interval: timedelta, name: str = None):
+    """
+    Registers a function as a job that runs every interval
+
+    The function is called without arguments; its return value is stored
+    (as text) as the result of the run.
+    """
+    def decorator(func):
+        job_name = name or func.__name__
+        JOBS[job_name] = Job(job_name, interval, func)
+        return func
+    return decorator
+
+
+def registered_jobs() -> dict:
+    """All jobs, after importing the module that registers them"""
+    import_module('cards.jobs')
+    return dict(JOBS)
+
+
+def lease_seconds() -> int:
+    return getattr(settings, 'SCHEDULER_LEASE_SECONDS', 300)
+
+
+def acquire_lock(owner: str, seconds: int = None, now=None) -> bool:
+    """
+    Takes or renews the leader lease
+
+    Succeeds if the lease is held by owner already or has expired. The
+    check and the write are one UPDATE, so two processes can never both
+    succeed.
+
+    Returns:
+        Whether owner is the leader until now + seconds
+    """
+    now = now or timezone.now()
+    seconds = seconds or lease_seconds()
+    SchedulerLock.objects.get_or_create(name=LOCK_NAME, defaults={'expires_at': now})
+    return bool(
+        SchedulerLock.objects.filter(name=LOCK_NAME)
+        .filter(Q(owner=owner) | Q(expires_at__lte=now))
+        .update(owner=owner, expires_at=now + timedelta(seconds=seconds))
+    )
+
+
+def release_lock(owner: str) -> None:
+    """Gives up the lease, so another process can take over at once"""
+    SchedulerLock.objects.filter(name=LOCK_NAME, owner=owner).update(
+        owner='', expires_at=timezone.now()
+    )
+
+
+def default_owner() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+class Scheduler:
+    """
+    Runs the due jobs while holding the leader lease
+
+    Args:
+        jobs: Dict of name to Job (default: all registered jobs)
+        owner: Name of this process in the lock row
+        lease: Seconds the lease lasts without renewal; it is renewed on
+            every tick and before every job, so it has to be longer than
+            the slowest job
+    """
+
+    def __init__(self, jobs: dict = None, owner: str = None, lease: int = None):
+        self.jobs = jobs if jobs is not None else registered_jobs()
+        self.owner = owner or default_owner()
+        self.lease = lease or lease_seconds()
+        self.leader = False
+
+    def due_jobs(self, now=None) -> list:
+        now = now or timezone.now()
+        started = dict(
+            ScheduledJob.objects.filter(name__in=self.jobs)
+            .values_list('name', 'last_started_at')
+        )
+        return [
+            job for name, job in self.jobs.items()
+            if started.get(name) is None or started[name] + job.interval <= now
+        ]
+
+    def run_pending(self, now=None, only=None) -> list:
+        """
+        Runs the due jobs if this process is (or becomes) the leader
+
+        Args:
+            now: Timestamp to decide which jobs are due (default: now)
+            only: Names of jobs to run now whether they are due or not
+
+        Returns:
+            List of JobRun, empty if another process is the leader
+        """
+        self.leader = acquire_lock(self.owner, self.lease)
+        if not self.leader:
+            return []
+        if only:
+            jobs = [self.jobs[name] for name in only]
+        else:
+            jobs = self.due_jobs(now)
+
+        runs = []
+        for job in jobs:
+            # Keeps the lease of a long series of jobs alive; stops if the
+            # lease was lost, e.g. after the process hung
+            if runs and not acquire_lock(self.owner, self.lease):
+                self.leader = False
+                logger.warning(f"Scheduler-Lease verloren vor Job {job.name}")
+                break
+            runs.append(self.run_job(job))
+        return runs
+
+    def run_job(self, job: Job) -> JobRun:
+        """Runs one job, recording its duration, result or error"""
+        ScheduledJob.objects.update_or_create(
+            name=job.name, defaults={'last_started_at': timezone.now()}
+        )
+        started = time.perf_counter()
+        run = JobRun(job.name, 0.0)
+        try:
+            result = job.func()
+            run.result = '' if result is None else str(result)[:MAX_RESULT_LENGTH]
+        except Exception as e:
+            logger.exception(f"Job {job.name} fehlgeschlagen")
+            run.error = f'{type(e).__name__}: {e}'
+            close_old_connections()
+        run.duration = time.perf_counter() - started
+
+        registry.observe(
+            'flashcards_job_duration_seconds',
+            {'job': job.name, 'outcome': 'error' if run.error else 'ok'},
+            run.duration,
+        )
+        registry.maybe_flush(force=True)
+        ScheduledJob.objects.filter(name=job.name).update(
+            last_finished_at=timezone.now(),
+            last_duration=run.duration,
+            last_result=run.result,
+            last_error=run.error,
+            run_count=F('run_count') + 1,
+            failure_count=F('failure_count') + (1 if run.error else 0),
+        )
+        return run
+
+    def run_forever(self, stop: threading.Event, tick: float, on_run=None) -> None:
+        """
+        Checks for due jobs every tick seconds until stop is set
+
+        Args:
+            on_run: Called with every JobRun, e.g. to print it
+        """
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                for run in self.run_pending():
+                    if on_run:
+                        on_run(run)
+                stop.wait(tick)
+        finally:
+            self.release()
+            close_old_connections()
+
+    def release(self) -> None:
+        if self.leader:
+            release_lock(self.owner)
+            self.leader = False
@@ -1,7 +1,20 @@
+from datetime import timedelta
+
+from django.utils import timezone
 from djoser.serializers import UserCreateSerializer
 from rest_framework import serializers
 
-from .models import Card, CardReview, Deck, LearningSession, User
+from .models import (
+    Card,
+    CardAnalytics,
+    CardReview,
+    Deck,
+    DeckAnalytics,
+    DeckRanking,
+    LearningSession,
+    User,
+)
+from .sync import MAX_UPLOAD_REVIEWS
 
 
 class UserCreateSerializer(UserCreateSerializer):
@@ -20,25 +33,39 @@ class UserSerializer(serializers.ModelSerializer):
     """
     User serializer
     """
-    total_cards_created = serializers.ReadOnlyField()
-    total_decks_created = serializers.ReadOnlyField()
-    total_learning_sessions = serializers.ReadOnlyField()
-    total_cards_reviewed = serializers.ReadOnlyField()
-    total_correct_answers = serializers.ReadOnlyField()
-    learning_accuracy = serializers.ReadOnlyField()
+    total_cards_created = serializers.ReadOnlyField(
+        source='cached_stats.total_cards_created'
+    )
+    total_decks_created = serializers.ReadOnlyField(
+        source='cached_stats.total_decks_created'
+    )
+    total_learning_sessions = serializers.ReadOnlyField(
+        source='cached_stats.total_learning_sessions'
+    )
+    total_cards_reviewed = serializers.ReadOnlyField(
+        source='cached_stats.total_cards_reviewed'
+    )
+    total_correct_answers = serializers.ReadOnlyField(
+        source='cached_stats.total_correct_answers'
+    )
+    learning_accuracy = serializers.ReadOnlyField(
+        source='cached_stats.learning_accuracy'
+    )
     avatar_url = serializers.ReadOnlyField()
+    avatar_urls = serializers.ReadOnlyField()
     
     class Meta:
         model = User
         fields = [
             'id', 'username', 'email', 'first_name', 'last_name', 
-            'bio', 'last_active', 'is_public', 'avatar', 'avatar_url',
+            'bio', 'last_active', 'is_public', 'avatar', 'avatar_url', 'avatar_urls',
             'total_cards_created', 'total_decks_created',
             'total_learning_sessions', 'total_cards_reviewed', 'total_correct_answers',
             'learning_accuracy'
         ]
         read_only_fields = [
-            'id', 'last_active', 'avatar_url', 'total_cards_created', 'total_decks_created',
+            'id', 'last_active', 'avatar_url', 'avatar_urls',
+            'total_cards_created', 'total_decks_created',
             'total_learning_sessions', 'total_cards_reviewed', 'total_correct_answers',
             'learning_accuracy'
         ]
@@ -70,6 +97,55 @@ class DeckDetailSerializer(DeckSerializer):
     def get_cards(self, obj):
         return CardSerializer(obj.cards.all(), many=True).data
 
+class DeckCatalogSerializer(serializers.ModelSerializer):
+    """
+    Public catalog entry: deck summary with its precomputed ranking
+    """
+    id = serializers.ReadOnlyField(source='deck.id')
+    title = serializers.ReadOnlyField(source='deck.title')
+    description = serializers.ReadOnlyField(source='deck.description')
+    owner = serializers.ReadOnlyField(source='deck.owner.username')
+    updated_at = serializers.ReadOnlyField(source='deck.updated_at')
+
+    class Meta:
+        model = DeckRanking
+        fields = [
+            'id', 'title', 'description', 'owner', 'updated_at',
+            'rank', 'score', 'card_count', 'learner_count', 'session_count',
+            'review_count', 'accuracy', 'refreshed_at'
+        ]
+
+class DeckAnalyticsSerializer(serializers.ModelSerializer):
+    """
+    Weakness statistics of a deck from the last analytics run
+    """
+    class Meta:
+        model = DeckAnalytics
+        fields = [
+            'review_count', 'correct_count', 'lapse_count', 'leech_count',
+            'weakness', 'refreshed_at'
+        ]
+
+class CardAnalyticsSerializer(serializers.ModelSerializer):
+    """
+    Weakness statistics of a card from the last analytics run
+    """
+    id = serializers.ReadOnlyField(source='card_id')
+    front = serializers.ReadOnlyField(source='card.front')
+    back = serializers.ReadOnlyField(source='card.back')
+    is_leech = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CardAnalytics
+        fields = [
+            'id', 'front', 'back', 'review_count', 'correct_count',
+            'learner_count', 'lapse_count', 'lapse_rate', 'leech_count',
+            'is_leech', 'weakness'
+        ]
+
+    def get_is_leech(self, obj):
+        return obj.leech_count > 0
+
 class CardSerializer(serializers.ModelSerializer):
     """
     Card serializer
@@ -81,8 +157,11 @@ class CardSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Card
-        fields = ['id', 'front', 'back', 'deck', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        fields = [
+            'id', 'front', 'back', 'deck', 'duplicate_of',
+            'created_at', 'updated_at',
+        ]
+        read_only_fields = ['id', 'duplicate_of', 'created_at', 'updated_at']
 
 class LearningSessionSerializer(serializers.ModelSerializer):
     """
@@ -106,6 +185,9 @@ class LearningSessionSerializer(serializers.ModelSerializer):
         read_only_fields = ['started_at', 'ended_at', 'user']
 
     def get_reviews_count(self, obj):
+        # Annotated by the viewset querysets; counted for new sessions
+        if hasattr(obj, 'reviews_count'):
+            return obj.reviews_count
         return obj.reviews.count()
 
 class CardReviewSerializer(serializers.ModelSerializer):
@@ -131,4 +213,33 @@ class CardReviewSerializer(serializers.ModelSerializer):
             'id', 'session', 'session_id', 'card', 'card_id',
             'is_correct', 'time_taken', 'created_at'
         ]
-        read_only_fields = ['created_at']
\ No newline at end of file
+        read_only_fields = ['created_at']
+
+class SyncReviewSerializer(serializers.Serializer):
+    """
+    Review made offline
+    """
+    card_id = serializers.IntegerField()
+    is_correct = serializers.BooleanField()
+    time_taken = serializers.IntegerField(min_value=0)
+    reviewed_at = serializers.DateTimeField()
+    card_changed_at = serializers.DateTimeField(
+        help_text='changed_at of the card in the downloaded bundle'
+    )
+
+    def validate_reviewed_at(self, value):
+        if value > timezone.now() + timedelta(minutes=5):
+            raise serializers.ValidationError(
+                'Review liegt in der Zukunft.'
+            )
+        return value
+
+class SyncUploadSerializer(serializers.Serializer):
+    """
+    Batch of offline reviews
+    """
+    reviews = serializers.ListField(
+        child=SyncReviewSerializer(),
+        allow_empty=False,
+        max_length=MAX_UPLOAD_REVIEWS,
+    )
@@ -0,0 +1,155 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import invalidate_deck, invalidate_user
+from .models import Card, CardReview, Deck, LearningSession, User
+from .rollups import drop_archived, record_review
+
+
+def _is_cascade(sender, kwargs) -> bool:
+    """
+    Whether a delete signal was caused by deleting a parent object
+
+    The parent's receiver already invalidates everything below it, so the
+    cascaded children can skip their own (per-row) lookups.
+    """
+    origin = kwargs.get('origin')
+    if origin is None or isinstance(origin, sender):
+        return False
+    return not (isinstance(origin, QuerySet) and origin.model is sender)
+
+
+def _drops_rollups(kwargs) -> bool:
+    """Whether a delete comes from a deck or user, whose rollups go with it"""
+    origin = kwargs.get('origin')
+    if isinstance(origin, QuerySet):
+        return issubclass(origin.model, (Deck, User))
+    return isinstance(origin, (Deck, User))
+
+
+def _invalidate_learners(**filters) -> None:
+    user_ids = (
+        LearningSession.objects.filter(**filters)
+        .values_list('user_id', flat=True)
+        .distinct()
+    )
+    for user_id in user_ids:
+        invalidate_user(user_id)
+
+
+@receiver([post_save, post_delete], sender=Deck)
+def invalidate_deck_caches(sender, instance, **kwargs):
+    """Deck changes affect the deck's stats and the owner's dashboard"""
+    invalidate_deck(instance.pk)
+    invalidate_user(instance.owner_id)
+
+
+@receiver(pre_delete, sender=Deck)
+def invalidate_deck_learners(sender, instance, **kwargs):
+    """Deleting a deck also deletes the sessions and reviews of its learners"""
+    _invalidate_learners(deck=instance)
+
+
+@receiver([post_save, post_delete], sender=Card)
+def invalidate_card_caches(sender, instance, **kwargs):
+    """Card changes affect deck and owner stats"""
+    if _is_cascade(sender, kwargs):
+        return
+    invalidate_deck(instance.deck_id)
+    if Card.deck.is_cached(instance):
+        owner_id = instance.deck.owner_id
+    else:
+        owner_id = (
+            Deck.objects.filter(pk=instance.deck_id)
+            .values_list('owner_id', flat=True)
+            .first()
+        )
+    invalidate_user(owner_id)
+
+
+@receiver(pre_delete, sender=Card)
+def invalidate_card_learners(sender, instance, **kwargs):
+    """Deleting a card also deletes its reviews"""
+    if not _is_cascade(sender, kwargs):
+        _invalidate_learners(reviews__card=instance)
+
+
+@receiver(pre_delete, sender=Card)
+def touch_card_duplicates(sender, instance, **kwargs):
+    """
+    Deleting an original clears duplicate_of of its duplicates
+
+    SET_NULL is applied with update(), which leaves updated_at (and with it
+    the cards' ETags) untouched.
+    """
+    if not _is_cascade(sender, kwargs):
+        Card.objects.filter(duplicate_of=instance).update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Card)
+def drop_archived_card_reviews(sender, instance, **kwargs):
+    """
+    Archived reviews of a deleted card leave the archives and rollups
+
+    Archives are per user; the card's learners are the users with a
+    session on its deck.
+    """
+    if _drops_rollups(kwargs):
+        return
+    learners = LearningSession.objects.filter(deck_id=instance.deck_id)
+    user_ids = drop_archived(
+        learners.values('user_id'), lambda review: review.card_id == instance.pk
+    )
+    for user_id in user_ids:
+        invalidate_user(user_id)
+
+
+@receiver(pre_delete, sender=LearningSession)
+def drop_archived_session_reviews(sender, instance, **kwargs):
+    """Archived reviews of a deleted session leave the archives and rollups"""
+    if not _drops_rollups(kwargs):
+        drop_archived(
+            [instance.user_id], lambda review: review.session_id == instance.pk
+        )
+
+
+@receiver([post_save, post_delete], sender=LearningSession)
+def invalidate_session_caches(sender, instance, **kwargs):
+    """Starting or completing a session changes the learner's stats"""
+    invalidate_user(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=CardReview)
+def invalidate_review_caches(sender, instance, **kwargs):
+    """A review changes the reviewer's stats"""
+    if _is_cascade(sender, kwargs):
+        return
+    if CardReview.session.is_cached(instance):
+        user_id = instance.session.user_id
+    else:
+        user_id = (
+            LearningSession.objects.filter(pk=instance.session_id)
+            .values_list('user_id', flat=True)
+            .first()
+        )
+    invalidate_user(user_id)
+
+
+@receiver(post_save, sender=CardReview)
+def add_review_to_rollup(sender, instance, created, **kwargs):
+    """New reviews are counted in their daily rollup in the same transaction"""
+    if created:
+        record_review(instance)
+
+
+@receiver(post_delete, sender=CardReview)
+def remove_review_from_rollup(sender, instance, **kwargs):
+    """
+    Deleted reviews are taken out of their rollup again
+
+    Rollups of a deleted deck or user are deleted with it.
+    """
+    if not _drops_rollups(kwargs):
+        record_review(instance, sign=-1)
@@ -1,20 +1,70 @@
 from datetime import timedelta
-from django.db.models import F, Q, FloatField
+from django.db import transaction
+from django.db.models import F, FilteredRelation, Q, FloatField, Value
 from django.db.models.expressions import ExpressionWrapper
 from django.db.models.fields import DurationField
-from django.db.models.functions import Coalesce
+from django.db.models.functions import Coalesce, Greatest
 from django.utils import timezone
-from cards.models import Card, Deck
+from cards.archive import review_history
+from cards.cache import invalidate_user
+from cards.models import Card, CardSchedule, Deck
 import random
 
+# Columns written by a review
+SRS_FIELDS = (
+    'interval',
+    'ease_factor',
+    'repetition_count',
+    'last_reviewed',
+    'next_review',
+    'total_review_time',
+    'average_review_time',
+    'correct_count',
+    'incorrect_count',
+)
+
+# SRS state of a card the user has never reviewed
+NEW_CARD = {
+    'interval': 0,
+    'ease_factor': 2.5,
+    'repetition_count': 0,
+    'total_review_time': 0,
+    'average_review_time': 0,
+    'correct_count': 0,
+    'incorrect_count': 0,
+}
+
+
+def with_schedule(cards, user):
+    """
+    Annotates cards with the user's SRS state
 
-def get_cards_for_review(deck: Deck, limit: int = 20) -> list[Card]:
+    The user's CardSchedule rows are LEFT JOINed, so never reviewed cards
+    stay in with the NEW_CARD values and no next_review. changed_at is
+    the later of the last content edit and the user's last review.
+    """
+    return cards.annotate(
+        schedule=FilteredRelation('schedules', condition=Q(schedules__user=user)),
+    ).annotate(
+        next_review=F('schedule__next_review'),
+        last_reviewed=F('schedule__last_reviewed'),
+        changed_at=Greatest(
+            'updated_at', Coalesce('schedule__updated_at', 'updated_at')
+        ),
+        **{
+            field: Coalesce(f'schedule__{field}', Value(default))
+            for field, default in NEW_CARD.items()
+        },
+    )
+
+
+def get_cards_for_review(deck: Deck, user, limit: int = 20) -> list[Card]:
     """
     Selects cards for a review session based on due dates and a weighting algorithm.
     """
     now = timezone.now()
 
-    due_cards_qs = Card.objects.filter(deck=deck).filter(
+    due_cards_qs = with_schedule(Card.objects.filter(deck=deck), user).filter(
         Q(next_review__lte=now) | Q(next_review__isnull=True)
     )
 
@@ -48,48 +98,133 @@ def get_cards_for_review(deck: Deck, limit: int = 20) -> list[Card]:
     return top_cards + remaining_cards
 
 
-def evaluate_review(card: Card, is_correct: bool, taken_time: float) -> None:
+def get_schedule(user, card) -> CardSchedule:
+    """The user's schedule of a card, created on the first review"""
+    schedule, _ = CardSchedule.objects.get_or_create(user=user, card=card)
+    return schedule
+
+
+def schedule_review(
+    schedule: CardSchedule,
+    is_correct: bool,
+    taken_time: float,
+    reviewed_at,
+) -> None:
     """
-    Evaluates a card review based on correctness and time taken,
-    then updates the card's SRS attributes using a SM-2 algorithm.
+    Applies a review to the SRS attributes of a schedule in memory (SM-2)
     """
-    card.last_reviewed = timezone.now()
+    schedule.last_reviewed = reviewed_at
 
-    card.total_review_time += round(taken_time)
-    total_reviews = card.repetition_count + card.incorrect_count
+    schedule.total_review_time += round(taken_time)
+    total_reviews = schedule.repetition_count + schedule.incorrect_count
     if total_reviews > 0:
-        card.average_review_time = card.total_review_time / total_reviews
+        schedule.average_review_time = schedule.total_review_time / total_reviews
 
     if not is_correct:
-        card.incorrect_count += 1
-        card.repetition_count = 0
-        card.interval = 1
-        card.next_review = timezone.now() + timedelta(days=1)
+        schedule.incorrect_count += 1
+        schedule.repetition_count = 0
+        schedule.interval = 1
+        schedule.next_review = reviewed_at + timedelta(days=1)
     else:
-        card.correct_count += 1
+        schedule.correct_count += 1
         
-        if card.average_review_time > 0:
-            if taken_time < card.average_review_time * 0.75:
+        if schedule.average_review_time > 0:
+            if taken_time < schedule.average_review_time * 0.75:
                 q = 5
-            elif taken_time > card.average_review_time * 1.25:
+            elif taken_time > schedule.average_review_time * 1.25:
                 q = 2
             else:
                 q = 4
         else:
             q = 4
 
-        new_ease_factor = card.ease_factor + (0.1 - (5 - q) * (0.08 + (5 - q) * 0.02))
-        card.ease_factor = max(1.3, new_ease_factor)
+        new_ease_factor = (
+            schedule.ease_factor + (0.1 - (5 - q) * (0.08 + (5 - q) * 0.02))
+        )
+        schedule.ease_factor = max(1.3, new_ease_factor)
 
-        card.repetition_count += 1
+        schedule.repetition_count += 1
 
-        if card.repetition_count == 1:
-            card.interval = 1
-        elif card.repetition_count == 2:
-            card.interval = 6
+        if schedule.repetition_count == 1:
+            schedule.interval = 1
+        elif schedule.repetition_count == 2:
+            schedule.interval = 6
         else:
-            card.interval = round(card.interval * card.ease_factor)
+            schedule.interval = round(schedule.interval * schedule.ease_factor)
+
+        schedule.next_review = reviewed_at + timedelta(days=schedule.interval)
 
-        card.next_review = timezone.now() + timedelta(days=card.interval)
 
-    card.save()
\ No newline at end of file
+def evaluate_review(
+    schedule: CardSchedule,
+    is_correct: bool,
+    taken_time: float,
+    reviewed_at=None,
+) -> None:
+    """
+    Evaluates a card review based on correctness and time taken,
+    then updates the user's schedule of the card using a SM-2 algorithm.
+
+    The result is written with a single UPDATE of the SRS columns that only
+    matches while the schedule still has the review counts it was evaluated
+    on. Every review increments one of them, so if another review of the
+    card by the same user (e.g. from a second device) committed in between,
+    nothing is written; the schedule is reloaded and evaluated again.
+
+    reviewed_at defaults to now; offline reviews are replayed with the
+    time they were made on the client.
+    """
+    reviewed_at = reviewed_at or timezone.now()
+    while True:
+        seen = {
+            'correct_count': schedule.correct_count,
+            'incorrect_count': schedule.incorrect_count,
+        }
+        schedule_review(schedule, is_correct, taken_time, reviewed_at)
+        schedule.updated_at = timezone.now()
+        written = CardSchedule.objects.filter(pk=schedule.pk, **seen).update(
+            updated_at=schedule.updated_at,
+            **{field: getattr(schedule, field) for field in SRS_FIELDS},
+        )
+        if written:
+            break
+        schedule.refresh_from_db(fields=SRS_FIELDS)
+
+    # update() sends no post_save; the schedule only affects its user
+    invalidate_user(schedule.user_id)
+
+
+def rebuild_schedules(batch_size: int = 1000) -> int:
+    """
+    Recreates every user's card schedules by replaying the review history
+
+    The history, archived reviews included (see cards/archive.py), is
+    streamed per user and card in chronological order, so memory use does
+    not depend on the number of reviews.
+
+    Args:
+        batch_size: Rows per INSERT
+
+    Returns:
+        Number of schedules written
+    """
+    written = 0
+    with transaction.atomic():
+        CardSchedule.objects.all().delete()
+        batch, schedule = [], None
+        for user_id, review in review_history(order='user_card', batch_size=batch_size):
+            if schedule is None or (schedule.user_id, schedule.card_id) != (
+                user_id, review.card_id
+            ):
+                if len(batch) >= batch_size:
+                    CardSchedule.objects.bulk_create(batch)
+                    written += len(batch)
+                    batch = []
+                schedule = CardSchedule(user_id=user_id, card_id=review.card_id)
+                batch.append(schedule)
+            schedule_review(
+                schedule, review.is_correct, float(review.time_taken), review.created_at
+            )
+        CardSchedule.objects.bulk_create(batch)
+        written += len(batch)
+    return written
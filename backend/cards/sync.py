@@ -0,0 +1,171 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .cache import invalidate_user
+from .models import Card, CardReview, Deck, LearningSession
+from .srs import evaluate_review, get_schedule, with_schedule
+
+MAX_BUNDLE_CARDS = 2000
+MAX_UPLOAD_REVIEWS = 1000
+
+# Column order of the cards in a bundle; rows are plain lists to keep the
+# bundle small. The SRS columns are the user's schedule of the card.
+BUNDLE_CARD_FIELDS = (
+    'id',
+    'deck_id',
+    'front',
+    'back',
+    'interval',
+    'ease_factor',
+    'repetition_count',
+    'next_review',
+    'changed_at',
+)
+
+
+def studied_decks(user):
+    """Decks a user can study offline: own decks and studied public decks"""
+    return Deck.objects.filter(
+        Q(owner=user) | Q(is_public=True, learning_sessions__user=user)
+    ).distinct()
+
+
+def _card_rows(cards, limit=None) -> list:
+    """Bundle rows of cards annotated by with_schedule"""
+    return [
+        [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in row
+        ]
+        for row in cards.values_list(*BUNDLE_CARD_FIELDS)[:limit]
+    ]
+
+
+def build_bundle(user, days: int) -> dict:
+    """
+    Cards due within the next days across all studied decks
+
+    Returns:
+        Dict with the decks, the card field names and one row per card
+    """
+    now = timezone.now()
+    until = now + timedelta(days=days)
+    decks = list(studied_decks(user).values('id', 'title'))
+    cards = (
+        with_schedule(
+            Card.objects.filter(deck_id__in=[deck['id'] for deck in decks]), user
+        )
+        .filter(Q(next_review__lt=until) | Q(next_review__isnull=True))
+        .order_by(F('next_review').asc(nulls_first=True), 'id')
+    )
+    return {
+        'generated_at': now.isoformat(),
+        'until': until.isoformat(),
+        'decks': decks,
+        'card_fields': BUNDLE_CARD_FIELDS,
+        'cards': _card_rows(cards, limit=MAX_BUNDLE_CARDS),
+    }
+
+
+@transaction.atomic
+def replay_reviews(user, reviews: list) -> dict:
+    """
+    Applies a batch of offline reviews in chronological order
+
+    Every review runs through evaluate_review with its client timestamp.
+    A card whose changed_at differs from the version the client studied
+    has changed on the server in the meantime (edited, or reviewed on
+    another device); its reviews are reported as conflicts and skipped.
+    The reviews of each deck are stored in one completed session.
+
+    Args:
+        user: The reviewing user
+        reviews: Validated reviews with card_id, is_correct, time_taken,
+            reviewed_at and card_changed_at
+
+    Returns:
+        Dict with the created session ids, the applied count, rejected
+        and conflicting reviews and the new state of the reviewed cards
+    """
+    reviews = sorted(reviews, key=lambda review: review['reviewed_at'])
+    cards = {
+        card.pk: card
+        for card in with_schedule(Card.objects.all(), user)
+        .select_for_update(of=('self',))
+        .filter(
+            pk__in={review['card_id'] for review in reviews},
+            deck__in=studied_decks(user),
+        )
+    }
+
+    rejected, conflicts, accepted = [], [], []
+    checked = set()
+    conflicting = set()
+    for review in reviews:
+        card = cards.get(review['card_id'])
+        if card is None:
+            rejected.append(review['card_id'])
+            continue
+        if card.pk not in checked:
+            checked.add(card.pk)
+            if card.changed_at != review['card_changed_at']:
+                conflicting.add(card.pk)
+        if card.pk in conflicting:
+            conflicts.append({
+                'card_id': card.pk,
+                'reviewed_at': review['reviewed_at'].isoformat(),
+            })
+            continue
+        accepted.append((card, review))
+
+    sessions, spans, schedules = {}, {}, {}
+    for card, review in accepted:
+        session = sessions.get(card.deck_id)
+        if session is None:
+            session = sessions[card.deck_id] = LearningSession.objects.create(
+                user=user,
+                deck_id=card.deck_id,
+                status=LearningSession.Status.COMPLETED,
+            )
+            spans[card.deck_id] = [review['reviewed_at']] * 2
+        spans[card.deck_id][1] = review['reviewed_at']
+        CardReview.objects.create(
+            session=session,
+            card=card,
+            is_correct=review['is_correct'],
+            time_taken=review['time_taken'],
+            created_at=review['reviewed_at'],
+        )
+        if card.pk not in schedules:
+            schedules[card.pk] = get_schedule(user, card)
+        evaluate_review(
+            schedules[card.pk],
+            is_correct=review['is_correct'],
+            taken_time=float(review['time_taken']),
+            reviewed_at=review['reviewed_at'],
+        )
+
+    for deck_id, session in sessions.items():
+        started_at, ended_at = spans[deck_id]
+        LearningSession.objects.filter(pk=session.pk).update(
+            started_at=started_at,
+            ended_at=ended_at,
+        )
+
+    # Session times were set with update(), which sends no signals
+    invalidate_user(user.pk)
+
+    reviewed = {card.pk for card, _ in accepted} | conflicting
+    return {
+        'session_ids': [session.pk for session in sessions.values()],
+        'applied': len(accepted),
+        'rejected': rejected,
+        'conflicts': conflicts,
+        'card_fields': BUNDLE_CARD_FIELDS,
+        'cards': _card_rows(
+            with_schedule(Card.objects.filter(pk__in=reviewed), user).order_by('id')
+        ),
+    }
@@ -1,9 +1,99 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+import asyncssh
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import (
+    AsyncClient,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
 from rest_framework import status
 from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from benchmarks.ai_stub import Behaviour, StubAIServer, generated_cards
+from benchmarks.startup import measure
 
-from .models import Card, Deck, LearningSession, User
+from .ai_protocol import (
+    FrameDecoder,
+    MessageTooLarge,
+    ProtocolError,
+    final_response,
+)
+from .ai_routing import Endpoint, EndpointRouter, NoEndpointAvailable
+from .ai_service import AIService, AsyncAIService
+from .analytics import analyze_reviews
+from .archive import (
+    ArchiveFormatError,
+    Review,
+    archive_reviews,
+    decode_reviews,
+    encode_reviews,
+    month_start,
+    review_history,
+)
+from .avatars import reprocess_pending_avatars
+from .cache import get_cache_stats, get_or_compute, reset_cache_stats, user_key
+from .dedup import (
+    BANDS,
+    find_duplicate,
+    merge_duplicates,
+    rebuild_index,
+    signature,
+    similarity,
+)
+from .jobs import abandon_stale_sessions, purge_expired_tokens
+from .metrics import finish_request, registry, start_request, track_ai_call
+from .models import (
+    Card,
+    CardAnalytics,
+    CardBucket,
+    CardReview,
+    CardSchedule,
+    CardSignature,
+    DailyReviewRollup,
+    Deck,
+    DeckAnalytics,
+    DeckRanking,
+    IdempotencyKey,
+    LearningSession,
+    ReviewArchive,
+    ScheduledJob,
+    SchedulerLock,
+    User,
+)
+from .ranking import RANKING_WINDOW_DAYS, refresh_rankings
+from .rollups import rebuild_rollups
+from .scheduler import Job, Scheduler, acquire_lock, release_lock
+from .srs import evaluate_review, get_schedule, rebuild_schedules, with_schedule
 
 
 class ModelTests(TestCase):
@@ -102,6 +192,37 @@ class APITests(APITestCase):
         self.assertEqual(len(response.data['results']), 1)
         self.assertEqual(response.data['results'][0]['title'], 'Test Deck')
 
+    def test_list_counts(self):
+        """
+        Test the counts annotated by the list querysets
+        """
+        Card.objects.create(deck=self.deck, front='Zweite', back='Karte')
+        Deck.objects.create(owner=self.user, title='Leer')
+        session = LearningSession.objects.create(user=self.user, deck=self.deck)
+        CardReview.objects.create(
+            session=session, card=self.card, is_correct=True, time_taken=3000
+        )
+        CardReview.objects.create(
+            session=session, card=self.card, is_correct=False, time_taken=5000
+        )
+
+        response = self.client.get(reverse('deck-list'))
+        counts = {
+            deck['title']: deck['card_count'] for deck in response.data['results']
+        }
+        self.assertEqual(counts, {'Test Deck': 2, 'Leer': 0})
+
+        response = self.client.get(reverse('learningsession-list'))
+        result = response.data['results'][0]
+        self.assertEqual(result['reviews_count'], 2)
+        self.assertEqual(result['deck']['card_count'], 2)
+
+        response = self.client.get(reverse('cardreview-list'))
+        self.assertEqual(
+            [review['session']['reviews_count'] for review in response.data['results']],
+            [2, 2],
+        )
+
     def test_deck_create(self):
         """
         Test Deck-Creation API
@@ -198,3 +319,3043 @@ class APITests(APITestCase):
 
         response = self.client.patch(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class SQLitePerformanceModeTests(SimpleTestCase):
+    """
+    Test the opt-in SQLite performance pragmas
+    """
+    def test_pragmas_applied_on_connection(self):
+        """
+        Test that every new connection gets WAL and the tuned pragmas
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            wrapper = DatabaseWrapper({
+                **connection.settings_dict,
+                'NAME': os.path.join(tmp_dir, 'perf.db'),
+                'OPTIONS': settings.SQLITE_PERFORMANCE_OPTIONS,
+            }, alias='perf')
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    self.assertEqual(cursor.fetchone()[0], 'wal')
+                    cursor.execute('PRAGMA synchronous')
+                    self.assertEqual(cursor.fetchone()[0], 1)
+                    cursor.execute('PRAGMA busy_timeout')
+                    self.assertEqual(
+                        cursor.fetchone()[0], settings.SQLITE_BUSY_TIMEOUT * 1000
+                    )
+                self.assertEqual(wrapper.transaction_mode, 'IMMEDIATE')
+            finally:
+                wrapper.close()
+
+
+class AvatarProcessingTests(APITestCase):
+    """
+    Test the off-request avatar pipeline
+    """
+    def setUp(self):
+        """
+        Set up a temporary media root and an authenticated user
+        """
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(
+            MEDIA_ROOT=self.media_root, AVATAR_PROCESSING_ASYNC=False
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user(
+            username='avataruser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def make_jpeg(self, color='red'):
+        output = BytesIO()
+        Image.new('RGB', (1200, 900), color).save(output, format='JPEG')
+        return SimpleUploadedFile(
+            'me.jpg', output.getvalue(), content_type='image/jpeg'
+        )
+
+    def upload(self, upload):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.post(
+                reverse('avatar'), {'avatar': upload}, format='multipart'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, callbacks
+
+    def test_upload_creates_variants(self):
+        """
+        Test that an upload serves the original and then all variants
+        """
+        response, callbacks = self.upload(self.make_jpeg())
+        self.assertEqual(len(callbacks), 1)
+        self.assertIn('me', response.data['avatar_url'])
+
+        self.user.refresh_from_db()
+        self.assertEqual(set(self.user.avatar_variants), {'300', '128', '64'})
+        for size, formats in self.user.avatar_variants.items():
+            self.assertEqual(set(formats), {'webp', 'jpeg'})
+            with default_storage.open(formats['webp']) as f, Image.open(f) as img:
+                self.assertEqual(img.format, 'WEBP')
+                self.assertEqual(max(img.size), int(size))
+        self.assertIn('_300.jpeg', self.user.avatar_url)
+
+    def test_profile_edit_skips_processing(self):
+        """
+        Test that saving the profile does not touch the avatar
+        """
+        self.upload(self.make_jpeg())
+        self.user.refresh_from_db()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.bio = 'Neue Bio'
+            self.user.save()
+        self.assertEqual(callbacks, [])
+
+    def test_same_file_is_not_reprocessed(self):
+        """
+        Test that re-uploading identical content keeps the variants
+        """
+        self.upload(self.make_jpeg())
+        self.user.refresh_from_db()
+        variants = self.user.avatar_variants
+
+        _, callbacks = self.upload(self.make_jpeg())
+        self.assertEqual(callbacks, [])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.avatar_variants, variants)
+
+        _, callbacks = self.upload(self.make_jpeg(color='blue'))
+        self.assertEqual(len(callbacks), 1)
+
+    def test_invalid_image_is_rejected(self):
+        """
+        Test that a file that is no readable image is rejected in the request
+        """
+        upload = SimpleUploadedFile(
+            'me.jpg', b'\xff\xd8 kein Bild', content_type='image/jpeg'
+        )
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                reverse('avatar'), {'avatar': upload}, format='multipart'
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(callbacks, [])
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.avatar)
+
+    def test_lost_processing_is_retried(self):
+        """
+        Test that the scheduler job renders avatars whose processing was lost
+        """
+        with mock.patch('cards.models.schedule_avatar_processing'):
+            self.upload(self.make_jpeg())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.avatar_variants, {})
+
+        self.assertEqual(reprocess_pending_avatars(), 1)
+        self.user.refresh_from_db()
+        self.assertEqual(set(self.user.avatar_variants), {'300', '128', '64'})
+        self.assertEqual(reprocess_pending_avatars(), 0)
+
+    def test_delete_removes_variants(self):
+        """
+        Test that deleting the avatar removes all variant files
+        """
+        self.upload(self.make_jpeg())
+        self.user.refresh_from_db()
+        paths = [
+            path
+            for formats in self.user.avatar_variants.values()
+            for path in formats.values()
+        ]
+
+        response = self.client.delete(reverse('avatar'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.avatar_variants, {})
+        self.assertFalse(any(default_storage.exists(path) for path in paths))
+
+
+class ConditionalGetTests(APITestCase):
+    """
+    Test ETag / Last-Modified handling of decks, cards and stats
+    """
+    def setUp(self):
+        """
+        Set up the test environment
+        """
+        self.user = User.objects.create_user(
+            username='etaguser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.deck = Deck.objects.create(owner=self.user, title='ETag Deck')
+        self.card = Card.objects.create(deck=self.deck, front='F', back='B')
+
+    def test_deck_list_not_modified(self):
+        """
+        Test that a matching ETag costs one query and returns 304
+        """
+        url = reverse('deck-list')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Card.objects.create(deck=self.deck, front='F2', back='B2')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_deck_detail_changes_with_cards(self):
+        """
+        Test that deleting a card invalidates the deck detail ETag
+        """
+        url = reverse('deck-detail', args=[self.deck.id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            status.HTTP_304_NOT_MODIFIED
+        )
+
+        self.card.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['cards'], [])
+
+    def test_deck_etag_follows_owner(self):
+        """
+        Test that the nested owner's stats and profile invalidate deck ETags
+        """
+        list_url = reverse('deck-list')
+        detail_url = reverse('deck-detail', args=[self.deck.id])
+        list_etag = self.client.get(list_url)['ETag']
+
+        session = LearningSession.objects.create(user=self.user, deck=self.deck)
+        self.client.post(reverse('cardreview-list'), {
+            'session_id': session.id,
+            'card_id': self.card.id,
+            'is_correct': True,
+            'time_taken': 3000
+        }, format='json')
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['results'][0]['owner']['total_cards_reviewed'], 1
+        )
+
+        detail_etag = self.client.get(detail_url)['ETag']
+        self.user.bio = 'Neue Beschreibung'
+        self.user.save()
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['owner']['bio'], 'Neue Beschreibung')
+
+    def test_card_detail_last_modified(self):
+        """
+        Test If-Modified-Since on a single card
+        """
+        url = reverse('card-detail', args=[self.card.id])
+        response = self.client.get(url)
+        last_modified = response['Last-Modified']
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_missing_deck_still_404(self):
+        """
+        Test that conditional headers do not hide missing objects
+        """
+        url = reverse('deck-detail', args=[9999])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"abc"')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_stats_change_after_review(self):
+        """
+        Test that the stats ETag changes when a review updates a card
+        """
+        url = reverse('deck-stats')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            status.HTTP_304_NOT_MODIFIED
+        )
+
+        session = LearningSession.objects.create(user=self.user, deck=self.deck)
+        self.client.post(reverse('cardreview-list'), {
+            'session_id': session.id,
+            'card_id': self.card.id,
+            'is_correct': True,
+            'time_taken': 3000
+        }, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_stats_values(self):
+        """
+        Test the statistics of the last completed session and of an empty deck
+        """
+        empty_deck = Deck.objects.create(title='Empty', owner=self.user)
+        session = LearningSession.objects.create(
+            user=self.user, deck=self.deck, status='completed'
+        )
+        for is_correct in (True, False, False, True):
+            CardReview.objects.create(
+                session=session, card=self.card, is_correct=is_correct,
+                time_taken=3000,
+            )
+
+        response = self.client.get(reverse('deck-stats'))
+        stats = {deck['id']: deck for deck in response.data}
+        self.assertEqual(stats[self.deck.id]['due_cards_count'], 1)
+        self.assertEqual(stats[self.deck.id]['average_ease_factor'], 2.5)
+        self.assertEqual(stats[self.deck.id]['last_session_accuracy'], 50.0)
+        self.assertEqual(
+            stats[self.deck.id]['last_session_date'], session.started_at.isoformat()
+        )
+        self.assertEqual(stats[empty_deck.id], {
+            'id': empty_deck.id,
+            'due_cards_count': 0,
+            'average_ease_factor': 2.5,
+            'last_session_date': None,
+            'last_session_accuracy': None,
+            'next_review_date': None,
+        })
+        self.assertEqual(
+            self.client.get(reverse('deck-deck-stats', args=[self.deck.id])).data,
+            stats[self.deck.id],
+        )
+
+
+class StatsCacheTests(APITestCase):
+    """
+    Test the per-user stats cache and its signal-driven invalidation
+    """
+    def setUp(self):
+        """
+        Set up the test environment with an empty cache
+        """
+        cache.clear()
+        reset_cache_stats()
+        self.user = User.objects.create_user(
+            username='cacheuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.deck = Deck.objects.create(owner=self.user, title='Cache Deck')
+        self.card = Card.objects.create(deck=self.deck, front='F', back='B')
+
+    def test_learning_stats_served_from_cache(self):
+        """
+        Test that repeated dashboard requests do not touch the database
+        """
+        url = reverse('learning-stats')
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(get_cache_stats()['namespaces']['learning_stats'], {
+            'hits': 1, 'misses': 1, 'hit_rate': 0.5
+        })
+
+    def test_review_invalidates_stats(self):
+        """
+        Test that posting a review and completing a session refresh the stats
+        """
+        url = reverse('learning-stats')
+        self.assertEqual(self.client.get(url).data['due_cards_count'], 1)
+
+        session = LearningSession.objects.create(user=self.user, deck=self.deck)
+        self.client.post(reverse('cardreview-list'), {
+            'session_id': session.id,
+            'card_id': self.card.id,
+            'is_correct': True,
+            'time_taken': 3000
+        }, format='json')
+        response = self.client.get(url)
+        self.assertEqual(response.data['due_cards_count'], 0)
+        self.assertEqual(response.data['recent_accuracy'], 100)
+
+        self.client.post(reverse('learningsession-complete', args=[session.id]))
+        self.assertEqual(self.client.get(url).data['learning_streak'], 1)
+
+    def test_user_stats_invalidated_by_card_save(self):
+        """
+        Test that the cached profile counters follow card creation
+        """
+        url = reverse('user-me')
+        self.assertEqual(self.client.get(url).data['total_cards_created'], 1)
+        Card.objects.create(deck=self.deck, front='F2', back='B2')
+        # Every real request loads a fresh user instance.
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+        self.assertEqual(self.client.get(url).data['total_cards_created'], 2)
+
+    def test_deck_stats_invalidated_by_card_of_public_deck(self):
+        """
+        Test that card changes invalidate deck stats for every learner
+        """
+        other = User.objects.create_user(username='learner', password='pw123456')
+        self.deck.is_public = True
+        self.deck.save()
+        self.client.force_authenticate(user=other)
+        url = reverse('deck-deck-stats', args=[self.deck.id])
+        self.assertEqual(self.client.get(url).data['due_cards_count'], 1)
+
+        Card.objects.create(deck=self.deck, front='F2', back='B2')
+        self.assertEqual(self.client.get(url).data['due_cards_count'], 2)
+
+    def test_cache_stats_endpoint_is_staff_only(self):
+        """
+        Test the hit/miss statistics endpoint
+        """
+        url = reverse('cache-stats')
+        self.assertEqual(
+            self.client.get(url).status_code, status.HTTP_403_FORBIDDEN
+        )
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('hit_rate', response.data)
+
+    def test_file_backend(self):
+        """
+        Test that the cache layer works with the file based backend
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir, override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': tmp_dir,
+            }
+        }):
+            key = user_key(self.user.pk, 'file_test')
+            self.assertEqual(get_or_compute(key, 'file_test', lambda: 42), 42)
+            self.assertEqual(get_or_compute(key, 'file_test', lambda: 0), 42)
+            self.assertEqual(get_cache_stats()['namespaces']['file_test']['hits'], 1)
+
+    def test_db_backend_shares_versions(self):
+        """
+        Test that an invalidation by another worker is seen with the db backend
+        """
+        db_cache = {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'test_flashcards_cache',
+        }
+        call_command('createcachetable', 'test_flashcards_cache')
+        with override_settings(CACHES={'default': db_cache}):
+            key = user_key(self.user.pk, 'db_test')
+            self.assertEqual(get_or_compute(key, 'db_test', lambda: 1), 1)
+
+            # A second worker has its own cache connection but the same table
+            other_worker = caches.create_connection('default')
+            other_worker.incr(f'flashcards:user:{self.user.pk}:version')
+
+            key = user_key(self.user.pk, 'db_test')
+            self.assertEqual(get_or_compute(key, 'db_test', lambda: 2), 2)
+            self.assertEqual(get_cache_stats()['pid'], os.getpid())
+
+
+class AsyncAIViewTests(APITestCase):
+    """
+    Test the async AI endpoints
+    """
+    def setUp(self):
+        """
+        Set up the test environment
+        """
+        self.user = User.objects.create_user(
+            username='aiuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    @mock.patch('cards.async_views.AsyncAIService.generate_flashcards')
+    @mock.patch('cards.async_views.AsyncAIService.is_service_available')
+    def test_generate_creates_deck(self, is_available, generate):
+        """
+        Test that generated cards are stored in a new deck
+        """
+        is_available.return_value = True
+        generate.return_value = {
+            'deck': {'title': 'Python', 'description': 'Grundlagen'},
+            'cards': [
+                {'question': 'Was ist eine Liste?', 'answer': 'Eine Sequenz'},
+                {'question': 'Was ist ein Dict?', 'answer': 'Eine Abbildung'},
+            ],
+        }
+        response = self.client.post(
+            reverse('ai-generate'), {'prompt': 'Python'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['cards_created'], 2)
+        deck = Deck.objects.get(owner=self.user)
+        self.assertEqual(deck.title, 'Python')
+        self.assertEqual(deck.card_count, 2)
+
+    @mock.patch('cards.async_views.AsyncAIService.is_service_available')
+    def test_check_answer_unavailable(self, is_available):
+        """
+        Test that an unreachable AI module yields 503
+        """
+        is_available.return_value = False
+        response = self.client.post(
+            reverse('ai-check-answer'),
+            {'answer': 'A', 'user_answer': 'B'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_requires_authentication(self):
+        """
+        Test that the AI endpoints keep DRF's authentication behavior
+        """
+        self.client.force_authenticate(user=None)
+        response = self.client.post(
+            reverse('ai-generate'), {'prompt': 'Python'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('WWW-Authenticate', response)
+
+    @mock.patch('cards.async_views.AsyncAIService.is_service_available')
+    def test_generate_in_parallel_chunks(self, is_available):
+        """
+        Test that a large deck is generated as concurrent, retried chunks
+        """
+        is_available.return_value = True
+        calls, running = [], {'now': 0, 'max': 0}
+
+        async def generate(service, prompt, language, difficulty, count):
+            calls.append(count)
+            attempt = len(calls)
+            running['now'] += 1
+            running['max'] = max(running['max'], running['now'])
+            await asyncio.sleep(0.05)
+            running['now'] -= 1
+            if attempt == 2:
+                return None
+            return {
+                'deck': {'title': 'Groß'},
+                'cards': [
+                    {
+                        'question': hashlib.sha1(f'{attempt}-{i}'.encode()).hexdigest(),
+                        'answer': f'Antwort {i}',
+                    }
+                    for i in range(count)
+                ],
+            }
+
+        with mock.patch(
+            'cards.async_views.AsyncAIService.generate_flashcards', generate
+        ), override_settings(
+            AI_GENERATE_RETRY_BACKOFF=0.01
+        ), self.assertLogs('cards.ai_service', 'WARNING'):
+            response = self.client.post(
+                reverse('ai-generate'), {'prompt': 'Python', 'count': 45}, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['cards_created'], 45)
+        self.assertEqual(response.json()['failed_chunks'], 0)
+        self.assertEqual(calls, [15, 15, 15, 15])
+        self.assertEqual(running['max'], 3)
+
+    @override_settings(
+        AI_ENDPOINTS=[{'host': 'ai-1', 'max_concurrency': 2}],
+        AI_GENERATE_CHUNK_SIZE=10,
+        AI_GENERATE_PARALLEL_CHUNKS=8,
+        AI_GENERATE_RETRY_BACKOFF=0.05,
+    )
+    def test_chunks_back_off_within_capacity(self):
+        """
+        Test that chunks stay within the endpoints' capacity, pause between
+        attempts and charge the request their wall time only
+        """
+        calls, running = [], {'now': 0, 'max': 0}
+
+        async def generate(service, prompt, language, difficulty, count):
+            calls.append(time.perf_counter())
+            running['now'] += 1
+            running['max'] = max(running['max'], running['now'])
+            with track_ai_call('generate_flashcards'):
+                await asyncio.sleep(0.05)
+            running['now'] -= 1
+            if len(calls) == 1:
+                return None
+            return {'deck': {'title': 'T'}, 'cards': [{'question': 'Q'}] * count}
+
+        async def run(count):
+            stats, token = start_request()
+            try:
+                started = time.perf_counter()
+                with mock.patch.object(AsyncAIService, 'generate_flashcards', generate):
+                    result = await AsyncAIService().generate_flashcards_chunked(
+                        'Python', count=count
+                    )
+                return result, stats.ai_time, time.perf_counter() - started
+            finally:
+                finish_request(token)
+
+        with self.assertLogs('cards.ai_service', 'WARNING'):
+            result, _, _ = async_to_sync(run)(10)
+        self.assertEqual(len(result['cards']), 10)
+        # The retry waited at least half the backoff after the failed call
+        self.assertGreaterEqual(calls[1] - calls[0], 0.05 + 0.025)
+
+        result, ai_time, elapsed = async_to_sync(run)(40)
+        self.assertEqual(len(result['cards']), 40)
+        self.assertEqual(running['max'], 2)
+        self.assertGreaterEqual(ai_time, 0.1)
+        self.assertLessEqual(ai_time, elapsed)
+
+    @mock.patch('cards.async_views.AsyncAIService.generate_flashcards')
+    @mock.patch('cards.async_views.AsyncAIService.is_service_available')
+    def test_generate_count_limits(self, is_available, generate):
+        """
+        Test that chunks failing every retry are left out and count is checked
+        """
+        is_available.return_value = True
+        generate.side_effect = [
+            {
+                'deck': {'title': 'Teilweise'},
+                'cards': [{'question': 'Q', 'answer': 'A'}],
+            },
+            None, None, None,
+        ]
+        with override_settings(
+            AI_GENERATE_CHUNK_SIZE=1,
+            AI_GENERATE_PARALLEL_CHUNKS=1,
+            AI_GENERATE_RETRY_BACKOFF=0,
+        ), self.assertLogs('cards.ai_service', 'WARNING') as logs:
+            response = self.client.post(
+                reverse('ai-generate'), {'prompt': 'Python', 'count': 2}, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['cards_created'], 1)
+        self.assertEqual(response.json()['failed_chunks'], 1)
+        self.assertEqual(generate.call_count, 4)
+        self.assertEqual(len(logs.output), 3)
+
+        for count in (0, 201, 'viele'):
+            response = self.client.post(
+                reverse('ai-generate'),
+                {'prompt': 'Python', 'count': count},
+                format='json',
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_requests_wait_concurrently(self):
+        """
+        Test that slow AI calls overlap instead of queueing
+        """
+        async def slow_check(service):
+            await asyncio.sleep(0.3)
+            return False
+
+        client = AsyncClient()
+        with mock.patch(
+            'cards.async_views.AsyncAIService.is_service_available', slow_check
+        ):
+            started = time.perf_counter()
+            responses = await asyncio.gather(*(
+                client.get(reverse('ai-health')) for _ in range(50)
+            ))
+            elapsed = time.perf_counter() - started
+
+        self.assertTrue(all(r.status_code == 200 for r in responses))
+        self.assertLess(elapsed, 50 * 0.3 / 5)
+
+
+class AIProtocolTests(SimpleTestCase):
+    """
+    Test the framed protocol spoken with the AI module
+    """
+    def test_frames_across_chunks(self):
+        """
+        Test that frames are reassembled however the stream is split
+        """
+        decoder = FrameDecoder(max_size=1000)
+        self.assertEqual(decoder.feed(b'{"status": "conn'), [])
+        self.assertEqual(
+            decoder.feed(b'ected"}\n\n{"id": "a"}\n{"id"'),
+            [{'status': 'connected'}, {'id': 'a'}]
+        )
+        self.assertEqual(decoder.feed(b': "b"}\n'), [{'id': 'b'}])
+        with self.assertRaises(ProtocolError):
+            decoder.feed(b'kein json\n')
+
+    def test_max_message_size(self):
+        """
+        Test that oversized frames are rejected before they are complete
+        """
+        decoder = FrameDecoder(max_size=10)
+        with self.assertRaises(MessageTooLarge):
+            decoder.feed(b'{"data": "' + b'x' * 20)
+        with self.assertRaises(MessageTooLarge):
+            FrameDecoder(max_size=10).feed(b'{"data": "xxxxx"}\n')
+
+    def test_final_response(self):
+        """
+        Test that only the final frame of the own request ends it
+        """
+        frames = [
+            {'status': 'connected', 'state': 'ready'},
+            {'id': 'a', 'status': 'processing'},
+        ]
+        self.assertIsNone(final_response(frames, 'a'))
+        done = {'id': 'a', 'status': 'completed'}
+        self.assertEqual(final_response(frames + [done], 'a'), done)
+        with self.assertRaises(ProtocolError):
+            final_response(frames, 'c')
+        rejected = {'status': 'error', 'error': 'Message exceeds 16 bytes'}
+        with self.assertRaisesMessage(ProtocolError, 'Message exceeds 16 bytes'):
+            final_response([rejected], 'a')
+
+    def test_sync_call_on_exec_channel(self):
+        """
+        Test that a large response arriving in pieces is read completely
+        """
+        cards = [{'question': f'Frage {i}', 'answer': 'x' * 500} for i in range(400)]
+
+        class Channel:
+            def exec_command(self, command):
+                self.command = command
+
+            def settimeout(self, timeout):
+                pass
+
+            def sendall(self, data):
+                request = json.loads(data)
+                body = json.dumps({
+                    'id': request['id'], 'status': 'completed', 'state': 'complete',
+                    'data': {'result': {'deck': {'title': 'T'}, 'cards': cards}},
+                }).encode()
+                self.chunks = [
+                    b'{"status": "connected", "state": "ready"}\n',
+                    *(body[i:i + 1000] for i in range(0, len(body), 1000)),
+                    b'\n',
+                ]
+
+            def recv(self, size):
+                return self.chunks.pop(0) if self.chunks else b''
+
+        channel = Channel()
+        ssh = mock.Mock()
+        ssh.get_transport.return_value.open_session.return_value = channel
+        service = AIService()
+        with mock.patch.object(AIService, '_create_ssh_connection', return_value=ssh):
+            result = service.generate_flashcards('Python', count=400)
+        self.assertEqual(channel.command, 'mcp')
+        self.assertEqual(len(result['cards']), 400)
+        ssh.close.assert_called_once()
+
+
+class AIRoutingTests(SimpleTestCase):
+    """
+    Test the routing of AI calls across several AI endpoints
+    """
+    def router(self, *endpoints, **options):
+        return EndpointRouter(
+            [Endpoint(**endpoint) for endpoint in endpoints], **options
+        )
+
+    def test_least_loaded_endpoint(self):
+        """
+        Test that in-flight calls, latency and weight decide the endpoint
+        """
+        router = self.router({'host': 'a'}, {'host': 'b'})
+        with router.acquire() as first, router.acquire() as second:
+            self.assertNotEqual(first.name, second.name)
+
+        a, b = router.endpoints
+        a.latency, b.latency = 1.0, 4.0
+        with router.acquire() as first, router.acquire() as second:
+            # a with one call in flight still beats the slow b
+            self.assertEqual((first.name, second.name), ('a:2222', 'a:2222'))
+            with router.acquire() as third:
+                self.assertEqual(third.name, 'a:2222')
+            b.weight = 4.0
+            with router.acquire() as third:
+                self.assertEqual(third.name, 'b:2222')
+        self.assertEqual([e['in_flight'] for e in router.snapshot()], [0, 0])
+
+    def test_limits_and_drain(self):
+        """
+        Test that full and draining endpoints get no new calls
+        """
+        router = self.router(
+            {'host': 'a', 'max_concurrency': 1}, {'host': 'b', 'drain': True},
+            queue_timeout=0.05,
+        )
+        with router.acquire() as endpoint:
+            self.assertEqual(endpoint.name, 'a:2222')
+            with self.assertRaises(NoEndpointAvailable):
+                with router.acquire():
+                    pass
+        with router.acquire() as endpoint:
+            self.assertEqual(endpoint.name, 'a:2222')
+
+    def test_full_endpoints_queue_calls(self):
+        """
+        Test that sync and async calls wait for the next free slot
+        """
+        router = self.router({'host': 'a', 'max_concurrency': 1})
+        acquired = []
+
+        def call():
+            with router.acquire() as endpoint:
+                acquired.append(endpoint.name)
+
+        async def call_async():
+            async with router.acquire_async() as endpoint:
+                acquired.append(endpoint.name)
+
+        with router.acquire():
+            waiting = threading.Thread(target=call)
+            waiting.start()
+            waiting_async = threading.Thread(target=async_to_sync(call_async))
+            waiting_async.start()
+            time.sleep(0.05)
+            self.assertEqual(acquired, [])
+        waiting.join(timeout=5)
+        waiting_async.join(timeout=5)
+        self.assertEqual(acquired, ['a:2222', 'a:2222'])
+        self.assertEqual(router.snapshot()[0]['in_flight'], 0)
+
+    def test_failed_endpoint_is_skipped(self):
+        """
+        Test that a failing endpoint rests until nothing else is left
+        """
+        router = self.router({'host': 'a'}, {'host': 'b'})
+        with self.assertLogs('cards.ai_routing', 'WARNING'):
+            with self.assertRaises(OSError):
+                with router.acquire() as endpoint:
+                    self.assertEqual(endpoint.name, 'a:2222')
+                    raise OSError('Connection refused')
+        for _ in range(3):
+            with router.acquire() as endpoint:
+                self.assertEqual(endpoint.name, 'b:2222')
+        self.assertFalse(router.snapshot()[0]['healthy'])
+
+        with self.assertLogs('cards.ai_routing', 'WARNING'):
+            with self.assertRaises(OSError):
+                with router.acquire():
+                    raise OSError('Connection refused')
+        with router.acquire() as endpoint:
+            self.assertEqual(endpoint.name, 'a:2222')
+
+    @override_settings(AI_ENDPOINTS=[
+        {'host': 'ai-1', 'port': 2222}, {'host': 'ai-2', 'port': 2223},
+    ])
+    async def test_calls_spread_over_endpoints(self):
+        """
+        Test that concurrent AI calls are sent to different instances
+        """
+        used = []
+
+        async def send(service, command, endpoint):
+            used.append(endpoint.name)
+            await asyncio.sleep(0.05)
+            return {'status': 'completed', 'state': 'complete',
+                    'data': {'result': {'similarity': 1.0}}}
+
+        with mock.patch.object(AsyncAIService, '_send_ssh_command_untracked', send):
+            results = await asyncio.gather(*(
+                AsyncAIService().check_answer_correctness('A', 'A') for _ in range(4)
+            ))
+        self.assertEqual(results, [1.0] * 4)
+        self.assertCountEqual(used, ['ai-1:2222', 'ai-2:2223'] * 2)
+
+
+class AIStubTests(APITestCase):
+    """
+    Test the AI service against the stand-in of the AI module
+    """
+    def setUp(self):
+        """
+        Set up the test environment
+        """
+        self.user = User.objects.create_user(
+            username='stubuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def serve(self, **behaviour):
+        stub = StubAIServer(**{'latency': 0, **behaviour})
+        context = stub.run_in_thread()
+        context.__enter__()
+        self.addCleanup(context.__exit__, None, None, None)
+        override = override_settings(AI_SSH_HOST='localhost', AI_SSH_PORT=stub.port)
+        override.enable()
+        self.addCleanup(override.disable)
+        return stub
+
+    def test_sync_service(self):
+        """
+        Test that every tool answers deterministically from its parameters
+        """
+        stub = self.serve()
+        service = AIService()
+        result = service.generate_flashcards('Python', difficulty='hard', count=3)
+        self.assertEqual(result['deck']['title'], 'Python')
+        self.assertEqual(result['cards'], generated_cards('Python', 'hard', 0, 3))
+        self.assertEqual(
+            service.check_answer_correctness('Eine Liste', ' eine  liste'), 1.0
+        )
+        self.assertLess(service.check_answer_correctness('Eine Liste', 'Ein Dict'), 0.8)
+        self.assertIn('Was ist ein Dict?', service.explain_concept('Was ist ein Dict?'))
+        self.assertEqual(
+            service.get_available_tools(),
+            ['generate_flashcards', 'check_answer', 'explain'],
+        )
+        self.assertEqual(stub.stats['requests'], 5)
+        self.assertEqual(stub.stats['connections'], 5)
+
+    def test_generate_view(self):
+        """
+        Test a chunked generation through the async view end to end
+        """
+        stub = self.serve(latency=0.2)
+        with override_settings(AI_GENERATE_CHUNK_SIZE=10):
+            response = self.client.post(
+                reverse('ai-generate'), {'prompt': 'Python', 'count': 35}, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['cards_created'], 35)
+        self.assertEqual(response.json()['duplicates_skipped'], 0)
+        self.assertEqual(response.json()['failed_chunks'], 0)
+        self.assertEqual(stub.stats['max_in_flight'], 4)
+
+    def test_injected_failures(self):
+        """
+        Test that every failure mode ends the call without a result
+        """
+        for mode in ('error', 'disconnect', 'hang'):
+            with self.subTest(mode=mode):
+                stub = self.serve(failure_rate=1.0, failure_mode=mode)
+                with override_settings(AI_SSH_TIMEOUT=0.3), \
+                        self.assertLogs('cards', 'ERROR'):
+                    started = time.perf_counter()
+                    self.assertIsNone(AIService().check_answer_correctness('A', 'B'))
+                    check = async_to_sync(AsyncAIService().check_answer_correctness)
+                    self.assertIsNone(check('A', 'B'))
+                self.assertLess(time.perf_counter() - started, 5)
+                self.assertEqual(stub.stats['failures'], 2)
+
+    def test_framing(self):
+        """
+        Test that the stub frames and rejects requests like the AI module
+        """
+        stub = self.serve(max_message_bytes=64)
+
+        async def exchange(chunks):
+            async with asyncssh.connect(
+                'localhost', stub.port, username='test', password='test',
+                known_hosts=None,
+            ) as conn:
+                process = await conn.create_process('mcp', encoding=None)
+                for chunk in chunks:
+                    process.stdin.write(chunk)
+                    await asyncio.sleep(0.01)
+                process.stdin.write_eof()
+                output = await process.stdout.read()
+            return [json.loads(line) for line in output.splitlines()]
+
+        frames = async_to_sync(exchange)([
+            b'{"id": "a", "command": ',
+            b'"mcp_tools"}\n' + b'x' * 50,
+            b'x' * 50 + b'\n{"id": "b", "command": "mcp_execute"}\n',
+            b'{"id": "c"}\nkein json\n',
+        ])
+        self.assertEqual(
+            [(frame.get('id'), frame['status']) for frame in frames],
+            [
+                (None, 'connected'), ('a', 'completed'), (None, 'error'),
+                ('b', 'error'), ('c', 'error'), (None, 'error'),
+            ],
+        )
+        self.assertEqual(frames[2]['error'], 'Message exceeds 64 bytes')
+        self.assertEqual(frames[3]['error'], 'Missing tool or parameters')
+        self.assertTrue(frames[4]['error'].startswith('Invalid JSON'))
+        self.assertTrue(frames[5]['error'].startswith('Invalid JSON'))
+        self.assertEqual(stub.stats['requests'], 1)
+
+    def test_behaviour(self):
+        """
+        Test that delays and failures repeat with the seed and results can be fixed
+        """
+        def run(seed):
+            behaviour = Behaviour(latency=0.1, jitter=0.1, failure_rate=0.5, seed=seed)
+            return [
+                (behaviour.delay('explain', {}), behaviour.failure())
+                for _ in range(20)
+            ]
+        self.assertEqual(run(1), run(1))
+        self.assertNotEqual(run(1), run(2))
+        self.assertEqual({failure for _, failure in run(1)}, {None, 'error'})
+
+        behaviour = Behaviour(per_card=0.01)
+        self.assertAlmostEqual(
+            behaviour.delay('generate_flashcards', {'count': 10}), 0.6
+        )
+        first = behaviour.result('generate_flashcards', {'prompt': 'Go', 'count': 2})
+        second = behaviour.result('generate_flashcards', {'prompt': 'Go', 'count': 2})
+        self.assertEqual(second['cards'], generated_cards('Go', 'medium', 2, 2))
+        self.assertNotEqual(first['cards'], second['cards'])
+
+        canned = {'content': [{'type': 'text', 'text': 'Fest'}]}
+        behaviour = Behaviour(responses={'explain': canned})
+        self.assertEqual(behaviour.result('explain', {'question': 'X'}), canned)
+
+
+class StartupTests(SimpleTestCase):
+    """
+    Test that heavy dependencies stay out of the worker boot
+    """
+    def test_cold_start_skips_heavy_modules(self):
+        """
+        Test that booting and the first request import no heavy module
+        """
+        result = measure('/api/v1/decks/')
+        self.assertEqual(result['status'], '401 Unauthorized')
+        self.assertEqual(result['heavy'], [])
+
+    def test_api_docs_load_on_demand(self):
+        """
+        Test that the docs views build the schema view on first use
+        """
+        response = self.client.get('/redoc/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'redoc')
+
+
+class MetricsTests(APITestCase):
+    """
+    Test the performance middleware and the /metrics endpoint
+    """
+    def setUp(self):
+        """
+        Set up the test environment with empty histograms
+        """
+        registry.reset()
+        self.user = User.objects.create_user(
+            username='metricsuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        Deck.objects.create(owner=self.user, title='Metrics Deck')
+
+    def test_request_recorded_per_view(self):
+        """
+        Test that latency and SQL costs are exported per view
+        """
+        self.client.get(reverse('deck-list'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn(
+            'flashcards_request_sql_queries_count{method="GET",view="deck-list"} 1',
+            body
+        )
+        self.assertIn(
+            'flashcards_request_duration_seconds_bucket'
+            '{le="+Inf",method="GET",status="200",view="deck-list"} 1',
+            body
+        )
+        sql_sum = next(
+            line for line in body.splitlines()
+            if line.startswith('flashcards_request_sql_queries_sum{method="GET",'
+                               'view="deck-list"}')
+        )
+        self.assertGreater(float(sql_sum.split()[-1]), 0)
+
+    def test_ai_time_attributed_to_request(self):
+        """
+        Test that AIService time is added to the running request
+        """
+        stats, token = start_request()
+        try:
+            with track_ai_call('check_answer'):
+                time.sleep(0.01)
+        finally:
+            finish_request(token)
+        self.assertGreaterEqual(stats.ai_time, 0.01)
+        series = registry.snapshot()['flashcards_ai_call_duration_seconds']
+        self.assertEqual(series[0]['labels'], {'outcome': 'ok', 'tool': 'check_answer'})
+
+    @override_settings(METRICS_SLOW_REQUEST_MS=0.001)
+    def test_slow_request_logged_with_queries(self):
+        """
+        Test slow-request logging including the top queries
+        """
+        with self.assertLogs('cards.middleware', level='WARNING') as logs:
+            self.client.get(reverse('deck-list'))
+        self.assertIn('deck-list', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_required_when_configured(self):
+        """
+        Test that /metrics can be protected with a token
+        """
+        self.assertEqual(
+            self.client.get(reverse('metrics')).status_code,
+            status.HTTP_403_FORBIDDEN
+        )
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_multiprocess_snapshots_are_summed(self):
+        """
+        Test that worker files in METRICS_MULTIPROCESS_DIR are aggregated
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir, override_settings(
+            METRICS_MULTIPROCESS_DIR=tmp_dir
+        ):
+            registry.observe(
+                'flashcards_request_sql_queries', {'view': 'deck-list'}, 3
+            )
+            other = registry.snapshot()
+            path = os.path.join(tmp_dir, f'worker-{os.getppid()}.json')
+            with open(path, 'w') as f:
+                json.dump(other, f)
+
+            merged = registry.collect()['flashcards_request_sql_queries']
+        self.assertEqual(merged[0]['count'], 2)
+        self.assertEqual(merged[0]['sum'], 6)
+
+    def test_stale_worker_files_are_pruned(self):
+        """
+        Test that files of dead workers and expired files are not summed
+        """
+        finished = subprocess.Popen(['true'])
+        finished.wait()
+        with tempfile.TemporaryDirectory() as tmp_dir, override_settings(
+            METRICS_MULTIPROCESS_DIR=tmp_dir, METRICS_WORKER_TTL=600
+        ):
+            registry.observe(
+                'flashcards_request_sql_queries', {'view': 'deck-list'}, 3
+            )
+            snapshot = registry.snapshot()
+            live = f'worker-{os.getppid()}.json'
+            expired = 'worker-other-host.json'
+            dead = f'worker-{finished.pid}.json'
+            for filename in (live, expired, dead):
+                with open(os.path.join(tmp_dir, filename), 'w') as f:
+                    json.dump(snapshot, f)
+            an_hour_ago = time.time() - 3600
+            os.utime(os.path.join(tmp_dir, expired), (an_hour_ago, an_hour_ago))
+
+            merged = registry.collect()['flashcards_request_sql_queries']
+            self.assertEqual(merged[0]['count'], 2)
+            self.assertEqual(
+                sorted(os.listdir(tmp_dir)),
+                sorted([live, f'worker-{os.getpid()}.json'])
+            )
+
+
+class ReviewRollupTests(APITestCase):
+    """
+    Test the daily review rollups and the statistics built on them
+    """
+    def setUp(self):
+        """
+        Set up the test environment
+        """
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='rollupuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.deck = Deck.objects.create(owner=self.user, title='Rollup Deck')
+        self.card = Card.objects.create(deck=self.deck, front='F', back='B')
+        self.session = LearningSession.objects.create(user=self.user, deck=self.deck)
+
+    def review(self, is_correct, time_taken):
+        return CardReview.objects.create(
+            session=self.session,
+            card=self.card,
+            is_correct=is_correct,
+            time_taken=time_taken,
+        )
+
+    def test_review_updates_rollup(self):
+        """
+        Test that a posted review is counted in today's rollup
+        """
+        response = self.client.post(reverse('cardreview-list'), {
+            'session_id': self.session.id,
+            'card_id': self.card.id,
+            'is_correct': True,
+            'time_taken': 4000,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.review(is_correct=False, time_taken=12)
+
+        rollup = DailyReviewRollup.objects.get(user=self.user, deck=self.deck)
+        self.assertEqual(rollup.day, timezone.localdate())
+        self.assertEqual(rollup.review_count, 2)
+        self.assertEqual(rollup.correct_count, 1)
+        # Values up to 1000 are seconds
+        self.assertEqual(rollup.total_time, 16000)
+        self.assertEqual(rollup.time_under_5s, 1)
+        self.assertEqual(rollup.time_under_30s, 1)
+
+    def test_deleted_review_is_removed(self):
+        """
+        Test that deleting a review or its card updates the rollup
+        """
+        review = self.review(is_correct=True, time_taken=3000)
+        self.review(is_correct=False, time_taken=3000)
+        review.delete()
+        rollup = DailyReviewRollup.objects.get()
+        self.assertEqual(
+            (rollup.review_count, rollup.correct_count, rollup.time_under_5s),
+            (1, 0, 1)
+        )
+
+        self.card.delete()
+        self.assertEqual(DailyReviewRollup.objects.get().review_count, 0)
+
+        self.deck.delete()
+        self.assertFalse(DailyReviewRollup.objects.exists())
+
+    def test_rebuild_matches_incremental_rollups(self):
+        """
+        Test that the rebuild command reconstructs the same rollups
+        """
+        for i in range(12):
+            self.review(is_correct=i % 3 != 0, time_taken=1500 * i + 10)
+        other = LearningSession.objects.create(user=self.user, deck=self.deck)
+        CardReview.objects.bulk_create([
+            CardReview(session=other, card=self.card, is_correct=True, time_taken=70000)
+        ])
+        CardReview.objects.filter(session=other).update(
+            created_at=timezone.now() - timedelta(days=3)
+        )
+
+        fields = ['day', 'review_count', 'correct_count', 'total_time',
+                  'time_under_2s', 'time_under_5s', 'time_under_10s',
+                  'time_under_30s', 'time_under_60s', 'time_over_60s']
+        incremental = list(DailyReviewRollup.objects.values(*fields))
+        call_command('rebuild_review_rollups', stdout=StringIO())
+        rebuilt = list(DailyReviewRollup.objects.values(*fields))
+
+        self.assertEqual(rebuilt[0], incremental[0])
+        self.assertEqual(len(rebuilt), 2)
+        self.assertEqual(rebuilt[1]['time_over_60s'], 1)
+
+    def test_learning_stats_from_rollups(self):
+        """
+        Test streak, response time and accuracy of the dashboard
+        """
+        for days_ago in (0, 1, 2, 4):
+            session = LearningSession.objects.create(
+                user=self.user, deck=self.deck, status='completed'
+            )
+            LearningSession.objects.filter(pk=session.pk).update(
+                started_at=timezone.now() - timedelta(days=days_ago)
+            )
+        for i in range(4):
+            self.review(is_correct=i != 0, time_taken=6000)
+
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('learning-stats'))
+        self.assertEqual(response.data['learning_streak'], 3)
+        self.assertEqual(response.data['average_response_time'], 6)
+        self.assertEqual(response.data['recent_accuracy'], 75)
+        self.assertEqual(self.user.total_cards_reviewed, 4)
+        self.assertEqual(self.user.learning_accuracy, 75)
+
+
+class ReviewArchiveTests(APITestCase):
+    """
+    Test the archival of old reviews and the history reader
+    """
+    def setUp(self):
+        """
+        Set up the test environment with reviews in three months
+        """
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='archiveuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.deck = Deck.objects.create(owner=self.user, title='Archiv')
+        self.cards = [
+            Card.objects.create(deck=self.deck, front=f'F{i}', back='B')
+            for i in range(2)
+        ]
+        self.session = LearningSession.objects.create(user=self.user, deck=self.deck)
+        self.this_month = month_start(timezone.localdate())
+        now = timezone.now()
+        self.reviews = [
+            CardReview.objects.create(
+                session=self.session,
+                card=self.cards[i % 2],
+                is_correct=i % 3 != 0,
+                time_taken=700 * i + 5,
+                created_at=created_at,
+            )
+            for i, created_at in enumerate([
+                now - timedelta(days=70),
+                now - timedelta(days=70, minutes=-5),
+                now - timedelta(days=40),
+                now - timedelta(days=40, minutes=-1),
+                now,
+            ])
+        ]
+
+    def history(self, order='user'):
+        return [
+            (review.id, review.card_id, review.is_correct, review.time_taken,
+             review.created_at)
+            for _, review in review_history(order=order)
+        ]
+
+    def test_encoding_round_trip(self):
+        """
+        Test that an archive blob decodes to the reviews it was packed from
+        """
+        rows = CardReview.objects.order_by('created_at', 'id').values_list(
+            'id', 'session_id', 'session__deck_id', 'card_id', 'is_correct',
+            'time_taken', 'created_at',
+        )
+        reviews = [Review(*row) for row in rows]
+        self.assertEqual(decode_reviews(encode_reviews(reviews)), reviews)
+        self.assertEqual(decode_reviews(encode_reviews([])), [])
+        with self.assertRaises(ArchiveFormatError):
+            decode_reviews(encode_reviews(reviews)[:-4])
+
+    def test_archive_keeps_stats_and_history(self):
+        """
+        Test that archiving changes neither the rollups nor the full history
+        """
+        fields = ['day', 'review_count', 'correct_count', 'total_time', 'time_under_2s']
+        rollups = list(DailyReviewRollup.objects.order_by('day').values(*fields))
+        history = self.history()
+        heatmap = self.client.get(reverse('learning-stats-heatmap')).data
+
+        out = StringIO()
+        call_command(
+            'archive_reviews', '--before', self.this_month.date().isoformat(),
+            stdout=out,
+        )
+        archived = CardReview.objects.filter(created_at__lt=self.this_month).count()
+        self.assertEqual(archived, 0)
+        self.assertIn(
+            f'{sum(r.created_at < self.this_month for r in self.reviews)} Reviews',
+            out.getvalue()
+        )
+        self.assertEqual(
+            ReviewArchive.objects.count(),
+            len({timezone.localdate(r.created_at).replace(day=1)
+                 for r in self.reviews if r.created_at < self.this_month})
+        )
+
+        self.assertEqual(
+            list(DailyReviewRollup.objects.order_by('day').values(*fields)), rollups
+        )
+        url = reverse('learning-stats-heatmap')
+        self.assertEqual(self.client.get(url).data, heatmap)
+        self.assertEqual(self.history(), history)
+        by_card = sorted(history, key=lambda review: (review[1], review[4], review[0]))
+        self.assertEqual(self.history('card'), by_card)
+        # Archived reviews not in their stored order are sorted in files
+        with mock.patch('cards.archive.RUN_SIZE', 1):
+            self.assertEqual(self.history('card'), by_card)
+        rebuild_rollups()
+        self.assertEqual(
+            list(DailyReviewRollup.objects.order_by('day').values(*fields)), rollups
+        )
+        self.assertEqual(analyze_reviews(), (2, 1))
+        self.assertEqual(
+            sum(CardAnalytics.objects.values_list('review_count', flat=True)), 5
+        )
+
+    def test_late_reviews_are_merged(self):
+        """
+        Test that old reviews synced after archiving join their month's archive
+        """
+        archive_reviews(before=self.this_month)
+        late = CardReview.objects.create(
+            session=self.session,
+            card=self.cards[0],
+            is_correct=True,
+            created_at=self.reviews[0].created_at + timedelta(minutes=1),
+        )
+        self.assertEqual(archive_reviews(before=self.this_month), (1, 1))
+        archive = ReviewArchive.objects.get(
+            month=timezone.localdate(late.created_at).replace(day=1)
+        )
+        reviews = decode_reviews(archive.data)
+        self.assertEqual(archive.review_count, len(reviews))
+        self.assertIn(late.pk, [review.id for review in reviews])
+        self.assertEqual(
+            [review.created_at for review in reviews],
+            sorted(review.created_at for review in reviews)
+        )
+
+    def test_deleted_cards_leave_the_history(self):
+        """
+        Test that archived reviews of deleted cards are not read back
+        """
+        archive_reviews(before=self.this_month)
+        self.cards[1].delete()
+        self.assertEqual(
+            {card_id for _, card_id, *_ in self.history()}, {self.cards[0].pk}
+        )
+        rebuild_schedules()
+        self.assertEqual(
+            list(CardSchedule.objects.values_list('card_id', flat=True)),
+            [self.cards[0].pk]
+        )
+
+    def rollups(self):
+        fields = ['day', 'review_count', 'correct_count', 'total_time', 'time_under_2s']
+        return list(
+            DailyReviewRollup.objects.filter(review_count__gt=0)
+            .order_by('day').values(*fields)
+        )
+
+    def test_deletes_leave_archives_and_rollups(self):
+        """
+        Test that archived reviews of deleted cards and sessions stop counting
+        """
+        archive_reviews(before=self.this_month)
+        self.cards[1].delete()
+        archived = [
+            review for archive in ReviewArchive.objects.all()
+            for review in decode_reviews(archive.data)
+        ]
+        self.assertEqual({review.card_id for review in archived}, {self.cards[0].pk})
+        self.assertEqual(
+            sum(archive.review_count for archive in ReviewArchive.objects.all()),
+            len(archived),
+        )
+        rollups = self.rollups()
+        rebuild_rollups()
+        self.assertEqual(self.rollups(), rollups)
+
+        self.session.delete()
+        self.assertFalse(ReviewArchive.objects.exists())
+        self.assertEqual(self.rollups(), [])
+
+    def test_merge_moves_archived_reviews(self):
+        """
+        Test that merging duplicates moves their archived reviews as well
+        """
+        archive_reviews(before=self.this_month)
+        rollups = self.rollups()
+        self.assertEqual(merge_duplicates({self.cards[1].pk: self.cards[0].pk}), 1)
+        self.assertEqual(
+            {card_id for _, card_id, *_ in self.history()}, {self.cards[0].pk}
+        )
+        self.assertEqual(len(self.history()), len(self.reviews))
+        self.assertEqual(self.rollups(), rollups)
+
+
+class ReviewActivityTests(APITestCase):
+    """
+    Test the review heatmap and the workload forecast
+    """
+    def setUp(self):
+        """
+        Set up the test environment with an empty cache
+        """
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='activityuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.deck = Deck.objects.create(owner=self.user, title='Activity Deck')
+        self.session = LearningSession.objects.create(user=self.user, deck=self.deck)
+
+    def test_heatmap(self):
+        """
+        Test reviews per day with a single query and cache invalidation
+        """
+        card = Card.objects.create(deck=self.deck, front='F', back='B')
+        for days_ago, is_correct in ((0, True), (0, False), (3, True), (400, True)):
+            review = CardReview.objects.create(
+                session=self.session, card=card, is_correct=is_correct
+            )
+            CardReview.objects.filter(pk=review.pk).update(
+                created_at=timezone.now() - timedelta(days=days_ago)
+            )
+        rebuild_rollups()
+
+        url = reverse('learning-stats-heatmap')
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        today = timezone.localdate()
+        self.assertEqual(response.data['total_reviews'], 3)
+        self.assertEqual(response.data['days'], [
+            {
+                'date': (today - timedelta(days=3)).isoformat(),
+                'reviews': 1,
+                'correct': 1,
+            },
+            {'date': today.isoformat(), 'reviews': 2, 'correct': 1},
+        ])
+
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        CardReview.objects.create(session=self.session, card=card, is_correct=True)
+        self.assertEqual(self.client.get(url).data['total_reviews'], 4)
+        self.assertEqual(
+            len(self.client.get(url, {'days': 7}).data['days']), 2
+        )
+
+    def test_forecast(self):
+        """
+        Test cards due per day, counting overdue and new cards as today
+        """
+        now = timezone.now()
+        other = User.objects.create_user(username='mitlerner', password='x')
+        for offset in (None, -5, 0, 1, 1, 29, 30):
+            card = Card.objects.create(deck=self.deck, front='F', back='B')
+            if offset is not None:
+                CardSchedule.objects.create(
+                    user=self.user, card=card, next_review=now + timedelta(days=offset)
+                )
+            # Other learners' schedules of the card do not count
+            CardSchedule.objects.create(user=other, card=card, next_review=now)
+
+        url = reverse('learning-stats-forecast')
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        due = [day['due'] for day in response.data['days']]
+        self.assertEqual(len(due), 30)
+        self.assertEqual(due[0], 3)
+        self.assertEqual(due[1], 2)
+        self.assertEqual(due[29], 1)
+        self.assertEqual(sum(due), 6)
+        self.assertEqual(
+            response.data['days'][1]['date'],
+            (timezone.localdate() + timedelta(days=1)).isoformat()
+        )
+
+        response = self.client.get(url, {'days': 'viele'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class OfflineSyncTests(APITestCase):
+    """
+    Test the offline bundle download and the batch review upload
+    """
+    def setUp(self):
+        """
+        Set up the test environment
+        """
+        self.user = User.objects.create_user(
+            username='syncuser',
+            password='testpass123'
+        )
+        self.other = User.objects.create_user(
+            username='syncother',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.deck = Deck.objects.create(owner=self.user, title='Sync Deck')
+        now = timezone.now()
+        self.due = Card.objects.create(deck=self.deck, front='Fällig', back='B')
+        self.soon = Card.objects.create(deck=self.deck, front='Bald', back='B')
+        self.later = Card.objects.create(deck=self.deck, front='Später', back='B')
+        for card, days in ((self.soon, 3), (self.later, 20)):
+            CardSchedule.objects.create(
+                user=self.user, card=card, next_review=now + timedelta(days=days)
+            )
+        self.private = Card.objects.create(
+            deck=Deck.objects.create(owner=self.other, title='Privat'),
+            front='Fremd', back='B',
+        )
+
+    def upload(self, reviews):
+        return self.client.post(
+            reverse('sync-upload'), {'reviews': reviews}, format='json'
+        )
+
+    def changed_at(self, card):
+        """changed_at of a card as in the downloaded bundle"""
+        response = self.client.get(reverse('sync-download'), {'days': 30})
+        fields = response.data['card_fields']
+        for row in response.data['cards']:
+            if row[fields.index('id')] == card.id:
+                return row[fields.index('changed_at')]
+        return card.updated_at.isoformat()
+
+    def test_download_bundle(self):
+        """
+        Test that the bundle holds due cards of studied decks only
+        """
+        public = Deck.objects.create(
+            owner=self.other, title='Öffentlich', is_public=True
+        )
+        public_card = Card.objects.create(deck=public, front='P', back='B')
+        LearningSession.objects.create(user=self.user, deck=public)
+        # The owner's schedule of the public card does not matter
+        CardSchedule.objects.create(
+            user=self.other, card=public_card,
+            next_review=timezone.now() + timedelta(days=20),
+        )
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('sync-download'), {'days': 7})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        fields = response.data['card_fields']
+        ids = [row[fields.index('id')] for row in response.data['cards']]
+        self.assertCountEqual(ids, [self.due.id, self.soon.id, public_card.id])
+        self.assertEqual(
+            {deck['id'] for deck in response.data['decks']}, {self.deck.id, public.id}
+        )
+
+    def test_upload_replays_chronologically(self):
+        """
+        Test that offline reviews are applied in the order they were made
+        """
+        now = timezone.now()
+        first = now - timedelta(days=2, hours=1)
+        second = now - timedelta(hours=3)
+        response = self.upload([
+            {
+                'card_id': self.due.id, 'is_correct': True, 'time_taken': 5000,
+                'reviewed_at': second.isoformat(),
+                'card_changed_at': self.changed_at(self.due),
+            },
+            {
+                'card_id': self.due.id, 'is_correct': True, 'time_taken': 5000,
+                'reviewed_at': first.isoformat(),
+                'card_changed_at': self.changed_at(self.due),
+            },
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['applied'], 2)
+        self.assertEqual(response.data['conflicts'], [])
+
+        schedule = CardSchedule.objects.get(user=self.user, card=self.due)
+        self.assertEqual(schedule.repetition_count, 2)
+        self.assertEqual(schedule.last_reviewed, second)
+        self.assertEqual(schedule.next_review, second + timedelta(days=6))
+
+        session = LearningSession.objects.get(pk=response.data['session_ids'][0])
+        self.assertEqual(session.status, 'completed')
+        self.assertEqual((session.started_at, session.ended_at), (first, second))
+        self.assertEqual(
+            list(
+                session.reviews.order_by('created_at')
+                .values_list('created_at', flat=True)
+            ),
+            [first, second]
+        )
+        self.assertEqual(
+            sorted(DailyReviewRollup.objects.values_list('day', flat=True)),
+            sorted({timezone.localdate(first), timezone.localdate(second)})
+        )
+
+    def test_upload_reports_conflicts(self):
+        """
+        Test that cards changed since the download are not overwritten
+        """
+        edited = self.changed_at(self.due)
+        reviewed = self.changed_at(self.soon)
+        self.due.back = 'Korrigiert'
+        self.due.save()
+        # Reviewed on another device after the download
+        evaluate_review(
+            CardSchedule.objects.get(user=self.user, card=self.soon),
+            is_correct=True, taken_time=3000,
+        )
+        # Other learners' reviews are no conflict
+        unchanged = self.changed_at(self.later)
+        evaluate_review(
+            get_schedule(self.other, self.later), is_correct=True, taken_time=3000
+        )
+
+        response = self.upload([
+            {
+                'card_id': self.due.id, 'is_correct': False, 'time_taken': 9000,
+                'reviewed_at': timezone.now().isoformat(),
+                'card_changed_at': edited,
+            },
+            {
+                'card_id': self.soon.id, 'is_correct': False, 'time_taken': 3000,
+                'reviewed_at': timezone.now().isoformat(),
+                'card_changed_at': reviewed,
+            },
+            {
+                'card_id': self.later.id, 'is_correct': True, 'time_taken': 3000,
+                'reviewed_at': timezone.now().isoformat(),
+                'card_changed_at': unchanged,
+            },
+            {
+                'card_id': self.private.id, 'is_correct': True, 'time_taken': 3000,
+                'reviewed_at': timezone.now().isoformat(),
+                'card_changed_at': self.private.updated_at.isoformat(),
+            },
+        ])
+        self.assertEqual(response.data['applied'], 1)
+        self.assertEqual(response.data['rejected'], [self.private.id])
+        self.assertCountEqual(
+            [conflict['card_id'] for conflict in response.data['conflicts']],
+            [self.due.id, self.soon.id]
+        )
+        self.assertFalse(
+            CardSchedule.objects.filter(user=self.user, card=self.due).exists()
+        )
+        self.assertEqual(
+            CardSchedule.objects.get(user=self.user, card=self.soon).incorrect_count, 0
+        )
+        self.assertEqual(CardReview.objects.count(), 1)
+
+    def test_upload_validation(self):
+        """
+        Test that malformed batches are rejected as a whole
+        """
+        response = self.upload([{
+            'card_id': self.due.id, 'is_correct': True, 'time_taken': 3000,
+            'reviewed_at': (timezone.now() + timedelta(days=1)).isoformat(),
+            'card_changed_at': self.due.updated_at.isoformat(),
+        }])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.upload([]).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(CardReview.objects.exists())
+
+
+class IdempotencyTests(APITestCase):
+    """
+    Test the Idempotency-Key support of the review and generation POSTs
+    """
+    def setUp(self):
+        """
+        Set up the test environment
+        """
+        self.user = User.objects.create_user(
+            username='retryuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.deck = Deck.objects.create(owner=self.user, title='Retry Deck')
+        self.card = Card.objects.create(deck=self.deck, front='F', back='B')
+        self.session = LearningSession.objects.create(user=self.user, deck=self.deck)
+
+    def review(self, key, is_correct=True):
+        return self.client.post(
+            reverse('cardreview-list'),
+            {
+                'session_id': self.session.pk,
+                'card_id': self.card.pk,
+                'is_correct': is_correct,
+                'time_taken': 4000,
+            },
+            format='json',
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_review_retry_is_replayed(self):
+        """
+        Test that a retried review is answered from the key store
+        """
+        first = self.review('review-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+
+        with self.assertNumQueries(1):
+            retry = self.review('review-1')
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+
+        self.assertEqual(CardReview.objects.count(), 1)
+        self.assertEqual(
+            CardSchedule.objects.get(user=self.user, card=self.card).repetition_count, 1
+        )
+
+        self.review('review-2')
+        self.assertEqual(CardReview.objects.count(), 2)
+
+    def test_key_reused_with_other_body(self):
+        """
+        Test that a key cannot be replayed for a different request
+        """
+        self.review('review-1')
+        response = self.review('review-1', is_correct=False)
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(CardReview.objects.count(), 1)
+
+    def test_key_in_progress(self):
+        """
+        Test that a retry while the first request runs is rejected
+        """
+        response = self.review('review-1')
+        IdempotencyKey.objects.update(status_code=None, response=None)
+        self.assertEqual(
+            self.review('review-1').status_code, status.HTTP_409_CONFLICT
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_failed_request_releases_key(self):
+        """
+        Test that errors and expired keys let the request run again
+        """
+        self.session.user = User.objects.create_user(username='fremd', password='x')
+        self.session.save()
+        self.assertEqual(
+            self.review('review-1').status_code, status.HTTP_403_FORBIDDEN
+        )
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self.session.user = self.user
+        self.session.save()
+        self.assertEqual(self.review('review-1').status_code, status.HTTP_201_CREATED)
+
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        self.assertEqual(self.review('review-1').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(CardReview.objects.count(), 2)
+
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_invalid_key(self):
+        """
+        Test that an overlong key is rejected
+        """
+        response = self.review('x' * 256)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(CardReview.objects.exists())
+
+    @mock.patch('cards.async_views.AsyncAIService.generate_flashcards')
+    @mock.patch('cards.async_views.AsyncAIService.is_service_available')
+    def test_generate_retry_is_replayed(self, is_available, generate):
+        """
+        Test that a retried generation neither calls the AI nor creates a deck
+        """
+        is_available.return_value = False
+        generate.return_value = {
+            'deck': {'title': 'Python'},
+            'cards': [{'question': 'F', 'answer': 'A'}],
+        }
+
+        def post():
+            return self.client.post(
+                reverse('ai-generate'), {'prompt': 'Python'}, format='json',
+                HTTP_IDEMPOTENCY_KEY='generate-1',
+            )
+
+        # Server errors are not stored
+        self.assertEqual(
+            post().status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        is_available.return_value = True
+        first = post()
+        retry = post()
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(Deck.objects.filter(title='Python').count(), 1)
+
+
+class DeckCatalogTests(APITestCase):
+    """
+    Test the ranked public deck catalog
+    """
+    def setUp(self):
+        """
+        Set up the test environment
+        """
+        self.user = User.objects.create_user(
+            username='catalogowner',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.learners = [
+            User.objects.create_user(username=f'leser{i}', password='x')
+            for i in range(4)
+        ]
+        self.own = Deck.objects.create(owner=self.user, title='Eigenes Deck')
+
+    def study(self, deck, learners, correct, reviews=4):
+        card = Card.objects.create(deck=deck, front='F', back='B')
+        for learner in learners:
+            session = LearningSession.objects.create(user=learner, deck=deck)
+            for i in range(reviews):
+                CardReview.objects.create(
+                    session=session, card=card, is_correct=i < correct
+                )
+
+    def test_ranking(self):
+        """
+        Test that recent learners and accuracy decide the rank
+        """
+        def public_deck(title):
+            return Deck.objects.create(owner=self.user, title=title, is_public=True)
+
+        popular = public_deck('Beliebt')
+        accurate = public_deck('Treffsicher')
+        sloppy = public_deck('Schwierig')
+        quiet = public_deck('Ruhig')
+        stale = public_deck('Veraltet')
+        self.study(popular, self.learners, correct=3)
+        self.study(accurate, self.learners[:2], correct=4)
+        self.study(sloppy, self.learners[:2], correct=0)
+        self.study(stale, self.learners, correct=4)
+        LearningSession.objects.filter(deck=stale).update(
+            started_at=timezone.now() - timedelta(days=RANKING_WINDOW_DAYS + 1)
+        )
+
+        self.assertEqual(refresh_rankings(), 5)
+        rankings = list(DeckRanking.objects.select_related('deck'))
+        self.assertEqual(
+            [ranking.deck.title for ranking in rankings],
+            ['Beliebt', 'Treffsicher', 'Schwierig', 'Veraltet', 'Ruhig']
+        )
+        first = rankings[0]
+        self.assertEqual(
+            (
+                first.learner_count, first.session_count,
+                first.review_count, first.card_count,
+            ),
+            (4, 4, 16, 1)
+        )
+        self.assertEqual(first.accuracy, 0.75)
+        last = rankings[-1]
+        self.assertEqual(last.deck, quiet)
+        self.assertEqual((last.rank, last.learner_count), (5, 0))
+        self.assertIsNone(last.accuracy)
+        self.assertFalse(DeckRanking.objects.filter(deck=self.own).exists())
+
+    def test_catalog_pages(self):
+        """
+        Test keyset pagination, search and decks made private
+        """
+        for i in range(15):
+            Deck.objects.create(
+                owner=self.user, title=f'Katalog {i}', is_public=True
+            )
+        hidden = Deck.objects.create(
+            owner=self.user, title='Bald privat', is_public=True
+        )
+        call_command('refresh_deck_rankings', stdout=StringIO())
+        hidden.is_public = False
+        hidden.save()
+
+        url = reverse('deck-catalog')
+        with self.assertNumQueries(1):
+            first = self.client.get(url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(first.data['results']), 10)
+        second = self.client.get(first.data['next'])
+        self.assertIsNone(second.data['next'])
+
+        entries = first.data['results'] + second.data['results']
+        self.assertEqual([entry['rank'] for entry in entries], sorted(
+            entry['rank'] for entry in entries
+        ))
+        self.assertEqual(len(entries), 15)
+        self.assertNotIn('Bald privat', [entry['title'] for entry in entries])
+        self.assertEqual(entries[0]['owner'], 'catalogowner')
+
+        response = self.client.get(url, {'search': 'Katalog 1'})
+        self.assertCountEqual(
+            [entry['title'] for entry in response.data['results']],
+            ['Katalog 1', 'Katalog 10', 'Katalog 11', 'Katalog 12',
+             'Katalog 13', 'Katalog 14']
+        )
+
+    def test_deck_list_shows_own_decks(self):
+        """
+        Test that public decks of others are only listed in the catalog
+        """
+        public = Deck.objects.create(
+            owner=self.learners[0], title='Fremd', is_public=True
+        )
+        response = self.client.get(reverse('deck-list'))
+        self.assertEqual(
+            [deck['title'] for deck in response.data['results']], ['Eigenes Deck']
+        )
+        response = self.client.get(reverse('deck-detail', args=[public.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ReviewAnalyticsTests(APITestCase):
+    """
+    Test the nightly lapse, leech and weakness analytics
+    """
+    def setUp(self):
+        """
+        Set up the test environment
+        """
+        self.user = User.objects.create_user(
+            username='analyticsuser',
+            password='testpass123'
+        )
+        self.other = User.objects.create_user(
+            username='otherlearner',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.deck = Deck.objects.create(
+            owner=self.user, title='Analyse', is_public=True
+        )
+        self.hard = Card.objects.create(deck=self.deck, front='Schwer', back='A')
+        self.easy = Card.objects.create(deck=self.deck, front='Leicht', back='B')
+
+    def answer(self, user, card, results):
+        session = LearningSession.objects.create(user=user, deck=card.deck)
+        start = timezone.now() - timedelta(days=1)
+        CardReview.objects.bulk_create(
+            CardReview(
+                session=session,
+                card=card,
+                is_correct=is_correct,
+                time_taken=3000,
+                created_at=start + timedelta(minutes=i),
+            )
+            for i, is_correct in enumerate(results)
+        )
+
+    @override_settings(CARD_LEECH_LAPSES=2)
+    def test_lapses_and_leeches(self):
+        """
+        Test that lapses are counted per learner in time order
+        """
+        # Two lapses (after the 1st and 3rd answer): a leech for self.user
+        self.answer(self.user, self.hard, [True, False, True, False, False])
+        # One lapse; the first wrong answer is no lapse
+        self.answer(self.other, self.hard, [False, True, False])
+        self.answer(self.user, self.easy, [True, True, True])
+
+        self.assertEqual(analyze_reviews(batch_size=1), (2, 1))
+        hard = CardAnalytics.objects.get(card=self.hard)
+        self.assertEqual(
+            (hard.review_count, hard.correct_count, hard.learner_count),
+            (8, 3, 2)
+        )
+        self.assertEqual(hard.lapse_count, 3)
+        self.assertEqual(hard.lapse_rate, 1.0)
+        self.assertEqual(hard.leech_count, 1)
+        easy = CardAnalytics.objects.get(card=self.easy)
+        self.assertEqual(
+            (easy.lapse_count, easy.lapse_rate, easy.leech_count), (0, 0, 0)
+        )
+        self.assertGreater(hard.weakness, easy.weakness)
+
+        deck = DeckAnalytics.objects.get(deck=self.deck)
+        self.assertEqual(
+            (deck.review_count, deck.correct_count, deck.lapse_count, deck.leech_count),
+            (11, 6, 3, 1)
+        )
+
+    def test_decks_deleted_during_run(self):
+        """
+        Test that cards and decks deleted while the history is read are skipped
+        """
+        gone = Deck.objects.create(owner=self.other, title='Gelöscht')
+        card = Card.objects.create(deck=gone, front='Weg', back='C')
+        self.answer(self.user, card, [True, False])
+        self.answer(self.user, self.hard, [True])
+        read = review_history
+
+        def history(**kwargs):
+            rows = list(read(**kwargs))
+            gone.delete()
+            return rows
+
+        with mock.patch('cards.analytics.review_history', history):
+            analyze_reviews()
+        self.assertEqual(
+            list(CardAnalytics.objects.values_list('card_id', flat=True)),
+            [self.hard.pk],
+        )
+        self.assertEqual(
+            list(DeckAnalytics.objects.values_list('deck_id', flat=True)),
+            [self.deck.pk],
+        )
+
+    def test_rerun_replaces_results(self):
+        """
+        Test that cards without reviews lose their analytics on the next run
+        """
+        self.answer(self.user, self.hard, [True, False])
+        self.answer(self.user, self.easy, [True])
+        analyze_reviews()
+        CardReview.objects.filter(card=self.easy).delete()
+        self.hard.reviews.filter(is_correct=True).delete()
+
+        out = StringIO()
+        call_command('analyze_reviews', stdout=out)
+        self.assertIn('1 Karten in 1 Decks', out.getvalue())
+        self.assertEqual(
+            list(CardAnalytics.objects.values_list('card_id', 'lapse_count')),
+            [(self.hard.pk, 0)]
+        )
+
+    def test_weaknesses_endpoint(self):
+        """
+        Test that the endpoint lists the weakest cards of a visible deck
+        """
+        url = reverse('deck-weaknesses', args=[self.deck.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['refreshed_at'])
+        self.assertEqual(response.data['cards'], [])
+
+        self.answer(self.other, self.easy, [True, True])
+        self.answer(self.other, self.hard, [True, True, False])
+        analyze_reviews()
+        self.client.force_authenticate(user=self.other)
+        response = self.client.get(url)
+        self.assertEqual(response.data['review_count'], 5)
+        self.assertIsNotNone(response.data['refreshed_at'])
+        self.assertEqual(
+            [card['front'] for card in response.data['cards']], ['Schwer', 'Leicht']
+        )
+        self.assertEqual(response.data['cards'][0]['lapse_rate'], 0.5)
+        self.assertFalse(response.data['cards'][0]['is_leech'])
+
+        Deck.objects.filter(pk=self.deck.pk).update(is_public=False)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SchedulerTests(TestCase):
+    """
+    Test the leader election, scheduling and jobs of the maintenance scheduler
+    """
+    def setUp(self):
+        """
+        Set up the test environment
+        """
+        self.user = User.objects.create_user(
+            username='scheduleruser',
+            password='testpass123'
+        )
+        self.deck = Deck.objects.create(owner=self.user, title='Wartung')
+        self.card = Card.objects.create(deck=self.deck, front='F', back='B')
+        self.calls = []
+
+    def job(self, name='count', hours=1, fail=False):
+        def func():
+            self.calls.append(name)
+            if fail:
+                raise ValueError('kaputt')
+            return len(self.calls)
+        return Job(name, timedelta(hours=hours), func)
+
+    def test_leader_election(self):
+        """
+        Test that only one owner holds the lease until it expires or is released
+        """
+        now = timezone.now()
+        self.assertTrue(acquire_lock('a', 60, now=now))
+        self.assertFalse(acquire_lock('b', 60, now=now))
+        # Renewing extends the lease of the holder
+        self.assertTrue(acquire_lock('a', 60, now=now + timedelta(seconds=50)))
+        self.assertFalse(acquire_lock('b', 60, now=now + timedelta(seconds=100)))
+        self.assertTrue(acquire_lock('b', 60, now=now + timedelta(seconds=111)))
+
+        release_lock('a')
+        self.assertEqual(SchedulerLock.objects.get().owner, 'b')
+        release_lock('b')
+        self.assertTrue(acquire_lock('a', 60))
+
+    def test_runs_due_jobs(self):
+        """
+        Test that jobs run once per interval, only on the leader
+        """
+        registry.reset()
+        jobs = {'count': self.job(), 'broken': self.job('broken', fail=True)}
+        scheduler = Scheduler(jobs, owner='a')
+        with self.assertLogs('cards.scheduler', 'ERROR'):
+            runs = scheduler.run_pending()
+        self.assertTrue(scheduler.leader)
+        self.assertEqual(
+            [(run.name, run.result) for run in runs],
+            [('count', '1'), ('broken', '')]
+        )
+        self.assertEqual(runs[1].error, 'ValueError: kaputt')
+
+        self.assertEqual(scheduler.run_pending(), [])
+        self.assertEqual(Scheduler(jobs, owner='b').run_pending(), [])
+        with self.assertLogs('cards.scheduler', 'ERROR'):
+            runs = scheduler.run_pending(now=timezone.now() + timedelta(hours=2))
+        self.assertEqual(len(runs), 2)
+        self.assertEqual(self.calls, ['count', 'broken', 'count', 'broken'])
+
+        state = ScheduledJob.objects.get(name='broken')
+        self.assertEqual((state.run_count, state.failure_count), (2, 2))
+        self.assertEqual(state.last_error, 'ValueError: kaputt')
+        series = {
+            (entry['labels']['job'], entry['labels']['outcome']): entry['count']
+            for entry in registry.snapshot()['flashcards_job_duration_seconds']
+        }
+        self.assertEqual(series, {('count', 'ok'): 2, ('broken', 'error'): 2})
+
+    @override_settings(LEARNING_SESSION_STALE_HOURS=6)
+    def test_abandon_stale_sessions(self):
+        """
+        Test that only active sessions without recent reviews are abandoned
+        """
+        now = timezone.now()
+        sessions = [
+            LearningSession.objects.create(user=self.user, deck=self.deck)
+            for _ in range(4)
+        ]
+        LearningSession.objects.update(started_at=now - timedelta(hours=10))
+        LearningSession.objects.filter(pk=sessions[3].pk).update(status='completed')
+        old_review = now - timedelta(hours=8)
+        CardReview.objects.bulk_create([
+            CardReview(session=sessions[1], card=self.card, is_correct=True,
+                       time_taken=1000, created_at=old_review),
+            CardReview(session=sessions[2], card=self.card, is_correct=True,
+                       time_taken=1000, created_at=now - timedelta(hours=1)),
+        ])
+
+        self.assertEqual(abandon_stale_sessions(now=now), 2)
+        statuses = dict(LearningSession.objects.values_list('pk', 'status'))
+        self.assertEqual(
+            [statuses[session.pk] for session in sessions],
+            ['abandoned', 'abandoned', 'active', 'completed']
+        )
+        sessions[0].refresh_from_db()
+        sessions[1].refresh_from_db()
+        self.assertEqual(sessions[0].ended_at, sessions[0].started_at)
+        self.assertEqual(sessions[1].ended_at, old_review)
+        self.assertEqual(abandon_stale_sessions(now=now), 0)
+
+    def test_purge_expired_tokens(self):
+        """
+        Test that expired refresh tokens are purged with their blacklist entries
+        """
+        now = timezone.now()
+        expired = RefreshToken.for_user(self.user)
+        expired.blacklist()
+        valid = RefreshToken.for_user(self.user)
+        OutstandingToken.objects.filter(jti=expired['jti']).update(
+            expires_at=now - timedelta(hours=1)
+        )
+
+        self.assertEqual(purge_expired_tokens(now=now), 1)
+        self.assertEqual(
+            list(OutstandingToken.objects.values_list('jti', flat=True)),
+            [valid['jti']]
+        )
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+    def test_command(self):
+        """
+        Test that the command runs the given jobs and releases the lease
+        """
+        out = StringIO()
+        call_command('run_scheduler', '--job', 'purge_expired_tokens', stdout=out)
+        self.assertIn('purge_expired_tokens in', out.getvalue())
+        self.assertEqual(ScheduledJob.objects.get().run_count, 1)
+        self.assertEqual(SchedulerLock.objects.get().owner, '')
+
+        call_command('run_scheduler', '--list', stdout=out)
+        self.assertIn('abandon_stale_sessions', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('run_scheduler', '--job', 'gibt_es_nicht')
+
+
+class DuplicateCardTests(APITestCase):
+    """
+    Test the near-duplicate detection of cards
+    """
+    def setUp(self):
+        """
+        Set up the test environment
+        """
+        self.user = User.objects.create_user(
+            username='dedupuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.deck = Deck.objects.create(owner=self.user, title='Python')
+
+    def create_card(self, front, back, deck=None):
+        return self.client.post(reverse('card-list'), {
+            'deck': (deck or self.deck).pk, 'front': front, 'back': back,
+        }, format='json')
+
+    def test_signature_similarity(self):
+        """
+        Test that formatting differences vanish and other cards stay apart
+        """
+        original = signature('Was ist eine Liste?', 'Eine geordnete Sequenz.')
+        self.assertEqual(
+            similarity(
+                original, signature('was ist eine  LISTE', 'Eine geordnete Sequenz')
+            ),
+            1.0
+        )
+        self.assertLess(
+            similarity(original, signature('Was ist ein Dict?', 'Eine Abbildung')),
+            0.5
+        )
+
+    def test_create_flags_duplicate(self):
+        """
+        Test that a near-identical card of the same deck is flagged
+        """
+        answer = 'Eine geordnete Sequenz von Werten'
+        first = self.create_card('Was ist eine Liste?', answer)
+        self.assertIsNone(first.data['duplicate_of'])
+        duplicate = self.create_card('Was ist eine Liste', f'{answer}.')
+        self.assertEqual(duplicate.data['duplicate_of'], first.data['id'])
+        again = self.create_card('was ist eine liste?', answer.lower())
+        self.assertEqual(again.data['duplicate_of'], first.data['id'])
+        other = self.create_card('Was ist ein Dict?', 'Eine Abbildung von Schlüsseln')
+        self.assertIsNone(other.data['duplicate_of'])
+
+        other_deck = Deck.objects.create(owner=self.user, title='Andere')
+        response = self.create_card(
+            'Was ist eine Liste?', 'Eine geordnete Sequenz von Werten', deck=other_deck
+        )
+        self.assertIsNone(response.data['duplicate_of'])
+
+        minhash = signature('Was ist eine Liste?', 'Eine geordnete Sequenz von Werten')
+        with self.assertNumQueries(1):
+            self.assertEqual(find_duplicate(self.deck.pk, minhash), first.data['id'])
+
+    def test_update_reindexes(self):
+        """
+        Test that an edited card is checked again with its new content
+        """
+        first = self.create_card('Was ist eine Liste?', 'Eine geordnete Sequenz')
+        duplicate = self.create_card('Was ist eine Liste?', 'Eine geordnete Sequenz!')
+        response = self.client.patch(
+            reverse('card-detail', args=[duplicate.data['id']]),
+            {'back': 'Ein veränderlicher Container für beliebige Objekte'},
+            format='json',
+        )
+        self.assertIsNone(response.data['duplicate_of'])
+        response = self.client.patch(
+            reverse('card-detail', args=[duplicate.data['id']]),
+            {'back': 'Eine geordnete Sequenz'},
+            format='json',
+        )
+        self.assertEqual(response.data['duplicate_of'], first.data['id'])
+        self.assertEqual(
+            CardBucket.objects.filter(card_id=duplicate.data['id']).count(), BANDS
+        )
+
+    @mock.patch('cards.async_views.AsyncAIService.generate_flashcards')
+    @mock.patch('cards.async_views.AsyncAIService.is_service_available')
+    def test_generate_skips_duplicates(self, is_available, generate):
+        """
+        Test that repeated generated cards are stored once
+        """
+        is_available.return_value = True
+        generate.return_value = {
+            'deck': {'title': 'Python'},
+            'cards': [
+                {'question': 'Was ist eine Liste?', 'answer': 'Eine Sequenz'},
+                {'question': 'Was ist ein Dict?', 'answer': 'Eine Abbildung'},
+                {'question': 'Was ist eine Liste', 'answer': 'Eine Sequenz.'},
+            ],
+        }
+        response = self.client.post(
+            reverse('ai-generate'), {'prompt': 'Python'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['cards_created'], 2)
+        self.assertEqual(response.json()['duplicates_skipped'], 1)
+        deck = Deck.objects.get(pk=response.json()['deck']['id'])
+        self.assertEqual(
+            CardSignature.objects.filter(card__deck=deck).count(), 2
+        )
+
+    def test_command_flags_and_merges(self):
+        """
+        Test that the bulk run flags duplicates and merges their history
+        """
+        original, duplicate, other = Card.objects.bulk_create([
+            Card(deck=self.deck, front='Was ist eine Liste?', back='Eine Sequenz'),
+            Card(deck=self.deck, front='Was ist eine Liste', back='eine Sequenz'),
+            Card(deck=self.deck, front='Was ist ein Dict?', back='Eine Abbildung'),
+        ])
+        session = LearningSession.objects.create(user=self.user, deck=self.deck)
+        review = CardReview.objects.create(
+            session=session, card=duplicate, is_correct=True, time_taken=3000
+        )
+        evaluate_review(get_schedule(self.user, duplicate), True, 3000)
+
+        out = StringIO()
+        call_command('dedupe_cards', stdout=out)
+        self.assertIn('1 Duplikate markiert', out.getvalue())
+        duplicate.refresh_from_db()
+        self.assertEqual(duplicate.duplicate_of, original)
+        self.assertEqual(CardSignature.objects.filter(card__deck=self.deck).count(), 3)
+
+        call_command('dedupe_cards', '--merge', '--deck', str(self.deck.pk), stdout=out)
+        self.assertIn('1 Duplikate zusammengeführt', out.getvalue())
+        self.assertCountEqual(
+            self.deck.cards.values_list('pk', flat=True), [original.pk, other.pk]
+        )
+        review.refresh_from_db()
+        self.assertEqual(review.card, original)
+        schedule = CardSchedule.objects.get(user=self.user)
+        self.assertEqual((schedule.card, schedule.correct_count), (original, 1))
+
+    def test_flag_changes_move_updated_at(self):
+        """
+        Test that flagging and un-flagging a duplicate invalidates its ETag
+        """
+        original, duplicate = Card.objects.bulk_create([
+            Card(deck=self.deck, front='Was ist eine Liste?', back='Eine Sequenz'),
+            Card(deck=self.deck, front='Was ist eine Liste', back='eine Sequenz'),
+        ])
+        created = duplicate.updated_at
+
+        rebuild_index()
+        duplicate.refresh_from_db()
+        self.assertEqual(duplicate.duplicate_of, original)
+        self.assertGreater(duplicate.updated_at, created)
+
+        flagged = duplicate.updated_at
+        original.delete()
+        duplicate.refresh_from_db()
+        self.assertIsNone(duplicate.duplicate_of)
+        self.assertGreater(duplicate.updated_at, flagged)
+
+
+class ConcurrentReviewTests(TransactionTestCase):
+    """
+    Test that concurrent reviews of one card never lose updates
+    """
+    def setUp(self):
+        """
+        Set up the test environment
+        """
+        self.user = User.objects.create_user(username='owner', password='testpass123')
+        deck = Deck.objects.create(owner=self.user, title='Öffentlich', is_public=True)
+        self.card = Card.objects.create(deck=deck, front='F' * 5000, back='B')
+
+    def run_parallel(self, threads, review):
+        """
+        Runs review(index) in parallel threads, started together
+
+        Returns:
+            Exceptions raised in the threads
+        """
+        barrier = threading.Barrier(threads)
+        errors = []
+
+        def run(index):
+            try:
+                barrier.wait()
+                review(index)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [
+            threading.Thread(target=run, args=(index,))
+            for index in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return errors
+
+    def test_stale_instance_is_reevaluated(self):
+        """
+        Test that a review based on an outdated schedule is evaluated again
+        """
+        schedule = get_schedule(self.user, self.card)
+        stale = CardSchedule.objects.get(pk=schedule.pk)
+        evaluate_review(schedule, is_correct=True, taken_time=4000)
+        evaluate_review(stale, is_correct=True, taken_time=4000)
+
+        schedule.refresh_from_db()
+        self.assertEqual(schedule.correct_count, 2)
+        self.assertEqual(schedule.repetition_count, 2)
+        self.assertEqual(schedule.interval, 6)
+        self.assertEqual(schedule.total_review_time, 8000)
+
+    def test_parallel_reviews(self):
+        """
+        Test that parallel reviews of one learner keep the counters exact
+        """
+        threads, reviews = 8, 5
+        pk = get_schedule(self.user, self.card).pk
+
+        def review(index):
+            schedule = CardSchedule.objects.get(pk=pk)
+            for i in range(reviews):
+                evaluate_review(
+                    schedule, is_correct=(index + i) % 3 != 0, taken_time=1000
+                )
+
+        self.assertEqual(self.run_parallel(threads, review), [])
+        schedule = CardSchedule.objects.get(user=self.user, card=self.card)
+        correct = sum(
+            (index + i) % 3 != 0
+            for index in range(threads)
+            for i in range(reviews)
+        )
+        self.assertEqual(schedule.correct_count, correct)
+        self.assertEqual(schedule.incorrect_count, threads * reviews - correct)
+        self.assertEqual(schedule.total_review_time, threads * reviews * 1000)
+
+    def test_learners_have_separate_schedules(self):
+        """
+        Test that learners of a public deck do not share or copy cards
+        """
+        # Created up front: concurrent INSERTs make SQLite's shared-cache
+        # test database fail with "table is locked"
+        schedules = [
+            get_schedule(
+                User.objects.create_user(username=f'learner{i}', password='x'),
+                self.card,
+            ).pk
+            for i in range(6)
+        ]
+
+        def review(index):
+            schedule = CardSchedule.objects.get(pk=schedules[index])
+            for _ in range(index + 1):
+                evaluate_review(schedule, is_correct=True, taken_time=1000)
+
+        self.assertEqual(self.run_parallel(len(schedules), review), [])
+        self.assertEqual(Card.objects.count(), 1)
+        self.assertEqual(
+            dict(CardSchedule.objects.values_list('user__username', 'correct_count')),
+            {f'learner{i}': i + 1 for i in range(6)}
+        )
+        self.assertEqual(Card.objects.get().front, 'F' * 5000)
+
+
+class QueryBudgetTests(APITestCase):
+    """
+    Query-count and payload-size budgets for every route in cards/urls.py
+
+    Each route is measured on a small data set and again after many decks,
+    cards, sessions and reviews were added. The query count must stay the
+    same and below the budget, so an N+1 lookup or an unbounded payload
+    fails here instead of in production.
+    """
+    def setUp(self):
+        """
+        Set up the small data set
+        """
+        self.user = User.objects.create_user(
+            username='budgetuser',
+            password='testpass123'
+        )
+        self.other = User.objects.create_user(
+            username='budgetother',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.deck = self.seed_deck(self.user, 'Budget Deck', cards=5)
+        self.card = self.deck.cards.first()
+        self.session = self.seed_session(self.deck, reviews=3)
+        self.seed_deck(self.other, 'Public Deck', cards=5, is_public=True)
+        rebuild_rollups()
+
+    def seed_deck(self, owner, title, cards, is_public=False):
+        deck = Deck.objects.create(owner=owner, title=title, is_public=is_public)
+        Card.objects.bulk_create(
+            Card(deck=deck, front=f'Frage {i}', back=f'Antwort {i}')
+            for i in range(cards)
+        )
+        return deck
+
+    def seed_session(self, deck, reviews, days_ago=0, completed=False):
+        session = LearningSession.objects.create(
+            user=self.user,
+            deck=deck,
+            status='completed' if completed else 'active',
+        )
+        if days_ago:
+            LearningSession.objects.filter(pk=session.pk).update(
+                started_at=timezone.now() - timedelta(days=days_ago)
+            )
+        cards = list(deck.cards.all()[:reviews])
+        CardReview.objects.bulk_create(
+            CardReview(
+                session=session,
+                card=cards[i % len(cards)],
+                is_correct=i % 3 != 0,
+                time_taken=4000,
+            )
+            for i in range(reviews)
+        )
+        return session
+
+    def grow(self):
+        """
+        Add decks, cards, completed sessions and reviews around the
+        objects the requests target
+        """
+        for i in range(15):
+            deck = self.seed_deck(self.user, f'Own {i}', cards=20)
+            self.seed_session(deck, reviews=20, days_ago=i, completed=True)
+            self.seed_deck(self.other, f'Public {i}', cards=20, is_public=True)
+        # bulk_create bypasses the signals that maintain the rollups
+        rebuild_rollups()
+
+    def measure(self, send, prepare):
+        args = prepare() if prepare else ()
+        # A fresh instance, as in production, so no cached_property leaks
+        # from one request into the next.
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = send(*args)
+        self.assertLess(response.status_code, 300, response.content)
+        return len(queries), len(response.content), queries
+
+    def assertQueryBudget(self, send, queries, payload, prepare=None):
+        """
+        Assert that a request stays within budget at both data volumes
+
+        Args:
+            send: Callable sending the request; called once per volume
+            queries: Maximum number of SQL queries
+            payload: Maximum response size in bytes
+            prepare: Optional callable creating the objects the request
+                consumes; its queries are not counted and its return
+                value is passed to send
+        """
+        small_count, small_size, _ = self.measure(send, prepare)
+        self.grow()
+        count, size, captured = self.measure(send, prepare)
+        sql = '\n'.join(query['sql'] for query in captured.captured_queries)
+        self.assertEqual(
+            count, small_count,
+            f'Query count grows with the data volume:\n{sql}'
+        )
+        self.assertLessEqual(count, queries, sql)
+        self.assertLessEqual(max(size, small_size), payload)
+
+    def test_user_list(self):
+        """
+        Test the budget of GET /users/
+        """
+        self.assertQueryBudget(
+            lambda: self.client.get('/api/v1/users/'), queries=4, payload=600
+        )
+
+    def test_user_detail(self):
+        """
+        Test the budget of GET /users/{id}/
+        """
+        self.assertQueryBudget(
+            lambda: self.client.get(f'/api/v1/users/{self.user.pk}/'),
+            queries=4, payload=600,
+        )
+
+    def test_deck_list(self):
+        """
+        Test the budget of GET /decks/
+        """
+        self.assertQueryBudget(
+            lambda: self.client.get(reverse('deck-list')), queries=7, payload=8000
+        )
+
+    def test_deck_catalog(self):
+        """
+        Test the budget of GET /catalog/
+        """
+        def prepare():
+            refresh_rankings()
+            return ()
+        self.assertQueryBudget(
+            lambda: self.client.get(reverse('deck-catalog')),
+            queries=1, payload=4000, prepare=prepare,
+        )
+
+    def test_deck_detail(self):
+        """
+        Test the budget of GET /decks/{id}/
+        """
+        self.assertQueryBudget(
+            lambda: self.client.get(reverse('deck-detail', args=[self.deck.pk])),
+            queries=7, payload=2000,
+        )
+
+    def test_deck_create(self):
+        """
+        Test the budget of POST /decks/
+        """
+        self.assertQueryBudget(
+            lambda: self.client.post(
+                reverse('deck-list'), {'title': 'Neu'}, format='json'
+            ),
+            queries=6, payload=1000,
+        )
+
+    def test_deck_update(self):
+        """
+        Test the budget of PATCH /decks/{id}/
+        """
+        self.assertQueryBudget(
+            lambda: self.client.patch(
+                reverse('deck-detail', args=[self.deck.pk]),
+                {'title': 'Umbenannt'},
+                format='json',
+            ),
+            queries=6, payload=1000,
+        )
+
+    def test_deck_delete(self):
+        """
+        Test the budget of DELETE /decks/{id}/
+        """
+        def prepare():
+            deck = self.seed_deck(self.user, 'Wegwerf', cards=5)
+            self.seed_session(deck, reviews=3)
+            return (deck,)
+        self.assertQueryBudget(
+            lambda deck: self.client.delete(reverse('deck-detail', args=[deck.pk])),
+            queries=20, payload=0, prepare=prepare,
+        )
+
+    def test_deck_stats(self):
+        """
+        Test the budget of GET /decks/{id}/deck_stats/
+        """
+        self.assertQueryBudget(
+            lambda: self.client.get(
+                reverse('deck-deck-stats', args=[self.deck.pk])
+            ),
+            queries=8, payload=250,
+        )
+
+    def test_deck_weaknesses(self):
+        """
+        Test the budget of GET /decks/{id}/weaknesses/
+        """
+        def prepare():
+            analyze_reviews()
+            return ()
+        self.assertQueryBudget(
+            lambda: self.client.get(
+                reverse('deck-weaknesses', args=[self.deck.pk])
+            ),
+            queries=3, payload=1500, prepare=prepare,
+        )
+
+    def test_deck_stats_overview(self):
+        """
+        Test the budget of GET /decks/stats/
+        """
+        self.assertQueryBudget(
+            lambda: self.client.get(reverse('deck-stats')), queries=10, payload=4000
+        )
+
+    def test_card_list(self):
+        """
+        Test the budget of GET /cards/
+        """
+        self.assertQueryBudget(
+            lambda: self.client.get(reverse('card-list')), queries=3, payload=2500
+        )
+
+    def test_card_detail(self):
+        """
+        Test the budget of GET /cards/{id}/
+        """
+        self.assertQueryBudget(
+            lambda: self.client.get(reverse('card-detail', args=[self.card.pk])),
+            queries=2, payload=250,
+        )
+
+    def test_card_create(self):
+        """
+        Test the budget of POST /cards/
+        """
+        self.assertQueryBudget(
+            lambda: self.client.post(
+                reverse('card-list'),
+                {'deck': self.deck.pk, 'front': 'F', 'back': 'B'},
+                format='json',
+            ),
+            queries=8, payload=250,
+        )
+
+    def test_card_update(self):
+        """
+        Test the budget of PATCH /cards/{id}/
+        """
+        def prepare():
+            # A changed text is checked for duplicates and reindexed
+            Card.objects.filter(pk=self.card.pk).update(back='Alt')
+            return ()
+        self.assertQueryBudget(
+            lambda: self.client.patch(
+                reverse('card-detail', args=[self.card.pk]),
+                {'back': 'Neu'},
+                format='json',
+            ),
+            queries=11, payload=250, prepare=prepare,
+        )
+
+    def test_card_delete(self):
+        """
+        Test the budget of DELETE /cards/{id}/
+        """
+        self.assertQueryBudget(
+            lambda card: self.client.delete(reverse('card-detail', args=[card.pk])),
+            queries=13, payload=0,
+            prepare=lambda: (Card.objects.create(deck=self.deck, front='F', back='B'),),
+        )
+
+    def test_session_list(self):
+        """
+        Test the budget of GET /learning-sessions/
+        """
+        self.assertQueryBudget(
+            lambda: self.client.get(reverse('learningsession-list')),
+            queries=7, payload=16000,
+        )
+
+    def test_session_detail(self):
+        """
+        Test the budget of GET /learning-sessions/{id}/
+        """
+        self.assertQueryBudget(
+            lambda: self.client.get(
+                reverse('learningsession-detail', args=[self.session.pk])
+            ),
+            queries=6, payload=1800,
+        )
+
+    def test_session_create(self):
+        """
+        Test the budget of POST /learning-sessions/
+        """
+        self.assertQueryBudget(
+            lambda: self.client.post(
+                reverse('learningsession-list'),
+                {'deck_id': self.deck.pk},
+                format='json',
+            ),
+            queries=9, payload=1800,
+        )
+
+    def test_session_cards(self):
+        """
+        Test the budget of GET /learning-sessions/{id}/cards/
+        """
+        self.assertQueryBudget(
+            lambda session: self.client.get(
+                reverse('learningsession-cards', args=[session.pk])
+            ),
+            queries=3, payload=1000,
+            prepare=lambda: (self.seed_session(self.deck, reviews=0),),
+        )
+
+    def test_session_complete(self):
+        """
+        Test the budget of POST /learning-sessions/{id}/complete/
+        """
+        self.assertQueryBudget(
+            lambda session: self.client.post(
+                reverse('learningsession-complete', args=[session.pk])
+            ),
+            queries=7, payload=1800,
+            prepare=lambda: (self.seed_session(self.deck, reviews=3),),
+        )
+
+    def test_review_list(self):
+        """
+        Test the budget of GET /card-reviews/
+        """
+        self.assertQueryBudget(
+            lambda: self.client.get(reverse('cardreview-list')),
+            queries=8, payload=20000,
+        )
+
+    def test_review_detail(self):
+        """
+        Test the budget of GET /card-reviews/{id}/
+        """
+        review = self.session.reviews.first()
+        self.assertQueryBudget(
+            lambda: self.client.get(reverse('cardreview-detail', args=[review.pk])),
+            queries=7, payload=2000,
+        )
+
+    def test_review_create(self):
+        """
+        Test the budget of POST /card-reviews/ for a first review
+        """
+        def prepare():
+            CardSchedule.objects.filter(user=self.user).delete()
+            return ()
+        self.assertQueryBudget(
+            lambda: self.client.post(
+                reverse('cardreview-list'),
+                {
+                    'session_id': self.session.pk,
+                    'card_id': self.card.pk,
+                    'is_correct': True,
+                    'time_taken': 4000,
+                },
+                format='json',
+            ),
+            queries=20, payload=2000, prepare=prepare,
+        )
+
+    def test_review_create_replayed(self):
+        """
+        Test the budget of a POST /card-reviews/ retry
+        """
+        def send():
+            return self.client.post(
+                reverse('cardreview-list'),
+                {
+                    'session_id': self.session.pk,
+                    'card_id': self.card.pk,
+                    'is_correct': True,
+                    'time_taken': 4000,
+                },
+                format='json',
+                HTTP_IDEMPOTENCY_KEY='retry',
+            )
+
+        def prepare():
+            send()
+            return ()
+        self.assertQueryBudget(send, queries=1, payload=2000, prepare=prepare)
+
+    def test_learning_stats(self):
+        """
+        Test the budget of GET /learning-stats/
+        """
+        self.assertQueryBudget(
+            lambda: self.client.get(reverse('learning-stats')),
+            queries=4, payload=200,
+        )
+
+    def test_review_heatmap(self):
+        """
+        Test the budget of GET /learning-stats/heatmap/
+        """
+        self.assertQueryBudget(
+            lambda: self.client.get(reverse('learning-stats-heatmap')),
+            queries=1, payload=3000,
+        )
+
+    def test_review_forecast(self):
+        """
+        Test the budget of GET /learning-stats/forecast/
+        """
+        self.assertQueryBudget(
+            lambda: self.client.get(reverse('learning-stats-forecast')),
+            queries=1, payload=1500,
+        )
+
+    def test_sync_download(self):
+        """
+        Test the budget of GET /sync/download/
+        """
+        # Not paginated: the bundle holds every due card (~80 bytes each)
+        # up to MAX_BUNDLE_CARDS
+        self.assertQueryBudget(
+            lambda: self.client.get(reverse('sync-download')),
+            queries=2, payload=30000,
+        )
+
+    def test_sync_upload(self):
+        """
+        Test the budget of POST /sync/upload/ with a fixed batch
+        """
+        def prepare():
+            # First reviews, which also create the schedules
+            CardSchedule.objects.filter(user=self.user).delete()
+            return ([
+                {
+                    'card_id': card.pk,
+                    'is_correct': True,
+                    'time_taken': 4000,
+                    'reviewed_at': timezone.now().isoformat(),
+                    'card_changed_at': card.changed_at.isoformat(),
+                }
+                for card in with_schedule(self.deck.cards.all(), self.user)[:3]
+            ],)
+        self.assertQueryBudget(
+            lambda reviews: self.client.post(
+                reverse('sync-upload'), {'reviews': reviews}, format='json'
+            ),
+            queries=40, payload=1500, prepare=prepare,
+        )
+
+    @mock.patch('cards.async_views.AsyncAIService.generate_flashcards')
+    @mock.patch('cards.async_views.AsyncAIService.is_service_available')
+    def test_ai_generate(self, is_available, generate):
+        """
+        Test the budget of POST /ai/generate/
+        """
+        is_available.return_value = True
+        generate.return_value = {
+            'deck': {'title': 'Python'},
+            'cards': [
+                {'question': f'Frage {i}', 'answer': f'Antwort {i}'}
+                for i in range(10)
+            ],
+        }
+        self.assertQueryBudget(
+            lambda: self.client.post(
+                reverse('ai-generate'), {'prompt': 'Python'}, format='json'
+            ),
+            queries=19, payload=3500,
+        )
+
+    @mock.patch('cards.async_views.AsyncAIService.check_answer_correctness')
+    @mock.patch('cards.async_views.AsyncAIService.is_service_available')
+    def test_ai_check_answer(self, is_available, check):
+        """
+        Test the budget of POST /ai/check-answer/
+        """
+        is_available.return_value = True
+        check.return_value = 0.9
+        self.assertQueryBudget(
+            lambda: self.client.post(
+                reverse('ai-check-answer'),
+                {'answer': 'A', 'user_answer': 'A'},
+                format='json',
+            ),
+            queries=0, payload=300,
+        )
+
+    @mock.patch('cards.async_views.AsyncAIService.is_service_available')
+    def test_ai_health(self, is_available):
+        """
+        Test the budget of GET /ai/health/
+        """
+        is_available.return_value = False
+        self.assertQueryBudget(
+            # One endpoint entry per configured AI instance
+            lambda: self.client.get(reverse('ai-health')), queries=0, payload=450
+        )
+
+    def test_cache_stats(self):
+        """
+        Test the budget of GET /cache-stats/
+        """
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_authenticate(user=self.user)
+        self.assertQueryBudget(
+            lambda: self.client.get(reverse('cache-stats')), queries=0, payload=350
+        )
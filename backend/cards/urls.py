@@ -1,16 +1,20 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from .async_views import AIAnswerCheckView, AIGenerateView, AIHealthCheckView
 from .views import (
+    CacheStatsView,
     CardReviewViewSet,
     CardViewSet,
+    DeckCatalogView,
     DeckViewSet,
     LearningSessionViewSet,
     LearningStatsView,
+    ReviewForecastView,
+    ReviewHeatmapView,
+    SyncDownloadView,
+    SyncUploadView,
     UserViewSet,
-    AIGenerateView,
-    AIAnswerCheckView,
-    AIHealthCheckView,
 )
 
 router = DefaultRouter()
@@ -26,8 +30,22 @@ router.register(r'card-reviews', CardReviewViewSet, basename='cardreview')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('catalog/', DeckCatalogView.as_view(), name='deck-catalog'),
     path('learning-stats/', LearningStatsView.as_view(), name='learning-stats'),
+    path(
+        'learning-stats/heatmap/',
+        ReviewHeatmapView.as_view(),
+        name='learning-stats-heatmap'
+    ),
+    path(
+        'learning-stats/forecast/',
+        ReviewForecastView.as_view(),
+        name='learning-stats-forecast'
+    ),
+    path('sync/download/', SyncDownloadView.as_view(), name='sync-download'),
+    path('sync/upload/', SyncUploadView.as_view(), name='sync-upload'),
     path('ai/generate/', AIGenerateView.as_view(), name='ai-generate'),
     path('ai/check-answer/', AIAnswerCheckView.as_view(), name='ai-check-answer'),
     path('ai/health/', AIHealthCheckView.as_view(), name='ai-health'),
+    path('cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
 ]
\ No newline at end of file
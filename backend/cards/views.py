@@ -1,25 +1,72 @@
+from django.http import HttpResponse, HttpResponseForbidden
 from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, permissions, viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.generics import ListAPIView
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
 import os
 from django.conf import settings
-from django.db.models import Avg, Count, Q
-from datetime import timedelta
-
-from .models import Card, CardReview, Deck, LearningSession, User
-from .srs import evaluate_review, get_cards_for_review
+from django.db import transaction
+from django.db.models import (
+    Avg,
+    Count,
+    F,
+    FilteredRelation,
+    Max,
+    Min,
+    OuterRef,
+    Prefetch,
+    Q,
+    Subquery,
+    Sum,
+    Window,
+)
+from django.db.models.functions import Coalesce, RowNumber, TruncDate
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from .avatars import is_valid_image
+from .cache import (
+    deck_key,
+    get_cache_stats,
+    get_or_compute,
+    user_key,
+    user_version,
+)
+from .conditional import ConditionalGetMixin
+from .dedup import find_duplicate, signature, store_signatures
+from .idempotency import idempotent
+from .metrics import registry, render_prometheus
+from .models import (
+    Card,
+    CardAnalytics,
+    CardReview,
+    DailyReviewRollup,
+    Deck,
+    DeckAnalytics,
+    DeckRanking,
+    LearningSession,
+    User,
+)
+from .rollups import recent_review_totals
+from .srs import evaluate_review, get_cards_for_review, get_schedule, with_schedule
 from .serializers import (
+    CardAnalyticsSerializer,
     CardReviewSerializer,
     CardSerializer,
+    DeckAnalyticsSerializer,
+    DeckCatalogSerializer,
     DeckDetailSerializer,
     DeckSerializer,
     LearningSessionSerializer,
+    SyncUploadSerializer,
     UserSerializer,
 )
-from .ai_service import AIService
+from .sync import build_bundle, replay_reviews
 
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
@@ -66,6 +113,11 @@ class AvatarViewSet(APIView):
                 'error': 'Datei ist zu groß. Maximum 5MB erlaubt.'
             }, status=400)
         
+        if not is_valid_image(avatar_file):
+            return Response({
+                'error': 'Die Datei ist kein gültiges Bild'
+            }, status=400)
+        
         try:
             user = request.user
             
@@ -150,82 +202,12 @@ class LearningStatsView(APIView):
         Get SRS-specific learning statistics for the current user
         """
         try:
-            user = request.user
-            now = timezone.now()
-            
-            try:
-                due_cards_count = Card.objects.filter(
-                    deck__owner=user
-                ).filter(
-                    Q(next_review__lte=now) | Q(next_review__isnull=True)
-                ).count()                    
-            except Exception as e:
-                due_cards_count = 0
-            
-            try:
-                learning_streak = 0
-                current_date = now.date()
-                
-                for i in range(30):
-                    check_date = current_date - timedelta(days=i)
-                    has_session = LearningSession.objects.filter(
-                        user=user,
-                        status='completed',
-                        started_at__date=check_date
-                    ).exists()
-                    
-                    if has_session:
-                        learning_streak += 1
-                    else:
-                        break
-            except Exception as e:
-                print(f"Error calculating learning streak: {e}")
-                learning_streak = 0
-            
-            try:
-                recent_reviews = CardReview.objects.filter(
-                    session__user=user
-                ).order_by('-created_at')[:50]
-                
-                if recent_reviews.exists():
-                    total_time = 0
-                    count = 0
-                    for review in recent_reviews:
-                        time_in_seconds = review.time_taken / 1000 if review.time_taken > 1000 else review.time_taken
-                        total_time += time_in_seconds
-                        count += 1
-                    
-                    average_response_time = total_time / count if count > 0 else 0
-                else:
-                    average_response_time = 0
-            except Exception as e:
-                print(f"Error calculating average response time: {e}")
-                average_response_time = 0
-            
-            try:
-                recent_10_reviews = CardReview.objects.filter(
-                    session__user=user
-                ).order_by('-created_at')[:10]
-                
-                
-                if recent_10_reviews.exists():
-                    reviews_list = list(recent_10_reviews)
-                    correct_count = sum(1 for review in reviews_list if review.is_correct)
-                    total_count = len(reviews_list)
-                    recent_accuracy = (correct_count / total_count) * 100
-                    
-                else:
-                    recent_accuracy = 0
-            except Exception as e:
-                print(f"Error calculating recent accuracy: {e}")
-                recent_accuracy = 0
-            
-            return Response({
-                'due_cards_count': due_cards_count,
-                'learning_streak': learning_streak,
-                'average_response_time': average_response_time,
-                'recent_accuracy': recent_accuracy
-            })
+            stats = get_or_compute(
+                user_key(request.user.pk, 'learning_stats'),
+                'learning_stats',
+                lambda: self.compute_stats(request.user),
+            )
+            return Response(stats)
         except Exception as e:
             print(f"Error in LearningStatsView: {e}")
             return Response({
@@ -235,7 +217,368 @@ class LearningStatsView(APIView):
                 'recent_accuracy': 0
             }, status=500)
 
-class DeckViewSet(viewsets.ModelViewSet):
+    def compute_stats(self, user):
+        """
+        Compute the statistics that get() serves from the cache
+        """
+        now = timezone.now()
+        
+        try:
+            due_cards_count = with_schedule(
+                Card.objects.filter(deck__owner=user), user
+            ).filter(
+                Q(next_review__lte=now) | Q(next_review__isnull=True)
+            ).count()                    
+        except Exception as e:
+            due_cards_count = 0
+        
+        try:
+            current_date = now.date()
+            session_days = set(LearningSession.objects.filter(
+                user=user,
+                status='completed',
+                started_at__date__gt=current_date - timedelta(days=30),
+            ).dates('started_at', 'day'))
+
+            learning_streak = 0
+            for i in range(30):
+                if current_date - timedelta(days=i) in session_days:
+                    learning_streak += 1
+                else:
+                    break
+        except Exception as e:
+            print(f"Error calculating learning streak: {e}")
+            learning_streak = 0
+        
+        try:
+            recent = recent_review_totals(user, 50)
+            if recent['reviews']:
+                average_response_time = (
+                    recent['total_time'] / 1000 / recent['reviews']
+                )
+            else:
+                average_response_time = 0
+        except Exception as e:
+            print(f"Error calculating average response time: {e}")
+            average_response_time = 0
+        
+        try:
+            recent = recent_review_totals(user, 10)
+            if recent['reviews']:
+                recent_accuracy = recent['correct'] / recent['reviews'] * 100
+            else:
+                recent_accuracy = 0
+        except Exception as e:
+            print(f"Error calculating recent accuracy: {e}")
+            recent_accuracy = 0
+        
+        return {
+            'due_cards_count': due_cards_count,
+            'learning_streak': learning_streak,
+            'average_response_time': average_response_time,
+            'recent_accuracy': recent_accuracy
+        }
+
+def days_param(request, default: int, maximum: int) -> int:
+    """The ?days= query parameter, clamped to 1..maximum"""
+    try:
+        days = int(request.query_params.get('days', default))
+    except ValueError:
+        raise ValidationError({'days': 'Muss eine ganze Zahl sein.'}) from None
+    return max(1, min(days, maximum))
+
+class ReviewHeatmapView(APIView):
+    """
+    Reviews per day for the activity heatmap
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        """
+        Get the number of reviews per day over the last ?days= days (365)
+
+        Days without reviews are omitted. Served from the stats cache until
+        the user's next review.
+        """
+        days = days_param(request, default=365, maximum=366)
+        today = timezone.localdate()
+        return Response(get_or_compute(
+            user_key(request.user.pk, f'review_heatmap:{today}:{days}'),
+            'review_heatmap',
+            lambda: self.compute_heatmap(request.user, today, days),
+        ))
+
+    def compute_heatmap(self, user, today, days):
+        start = today - timedelta(days=days - 1)
+        rows = (
+            DailyReviewRollup.objects.filter(user=user, day__gte=start)
+            .values('day')
+            .annotate(
+                reviews=Sum('review_count'),
+                correct=Sum('correct_count'),
+            )
+            .filter(reviews__gt=0)
+            .order_by('day')
+        )
+        heatmap = [
+            {
+                'date': row['day'].isoformat(),
+                'reviews': row['reviews'],
+                'correct': row['correct'],
+            }
+            for row in rows
+        ]
+        return {
+            'start': start.isoformat(),
+            'end': today.isoformat(),
+            'total_reviews': sum(day['reviews'] for day in heatmap),
+            'days': heatmap,
+        }
+
+class ReviewForecastView(APIView):
+    """
+    Cards coming due per day for the workload forecast
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        """
+        Get the number of cards due per day for the next ?days= days (30)
+
+        Overdue and never reviewed cards count as due today. Served from
+        the stats cache until one of the user's cards is reviewed.
+        """
+        days = days_param(request, default=30, maximum=90)
+        today = timezone.localdate()
+        return Response(get_or_compute(
+            user_key(request.user.pk, f'review_forecast:{today}:{days}'),
+            'review_forecast',
+            lambda: self.compute_forecast(request.user, today, days),
+        ))
+
+    def compute_forecast(self, user, today, days):
+        end = today + timedelta(days=days)
+        end_of_forecast = timezone.make_aware(
+            datetime.combine(end, datetime.min.time())
+        )
+        rows = (
+            with_schedule(Card.objects.filter(deck__owner=user), user)
+            .filter(
+                Q(next_review__lt=end_of_forecast) | Q(next_review__isnull=True)
+            )
+            .annotate(day=TruncDate('next_review'))
+            .values('day')
+            .annotate(due=Count('id'))
+            .order_by()
+        )
+        due = [0] * days
+        for row in rows:
+            if row['day'] is None or row['day'] <= today:
+                due[0] += row['due']
+            else:
+                due[(row['day'] - today).days] += row['due']
+        return {
+            'start': today.isoformat(),
+            'days': [
+                {'date': (today + timedelta(days=i)).isoformat(), 'due': count}
+                for i, count in enumerate(due)
+            ],
+        }
+
+def srs_stats_validators(user, decks):
+    """
+    Cheap validators for the SRS statistics of the given decks
+
+    Covers every input of the statistics: the decks themselves, their
+    cards, the user's schedules of them (including how many are due right
+    now) and the user's completed sessions.
+    """
+    now = timezone.now()
+    due = (
+        Q(schedule__next_review__lte=now)
+        | Q(schedule__next_review__isnull=True)
+    )
+    validators = decks.order_by().annotate(
+        schedule=FilteredRelation(
+            'cards__schedules', condition=Q(cards__schedules__user=user)
+        ),
+    ).aggregate(
+        deck_count=Count('id', distinct=True),
+        card_count=Count('cards', distinct=True),
+        due_card_count=Count('cards', filter=due, distinct=True),
+        cards_last_updated=Max('cards__updated_at'),
+        schedules_last_updated=Max('schedule__updated_at'),
+    )
+    validators.update(LearningSession.objects.filter(
+        user=user,
+        deck__in=decks,
+        status='completed',
+    ).aggregate(
+        session_count=Count('id'),
+        last_session_ended=Max('ended_at'),
+    ))
+    return validators
+
+# Cards listed by the weaknesses endpoint of a deck
+WEAK_CARD_LIMIT = 10
+
+def count_of(queryset, field):
+    """
+    Correlated subquery counting the rows of queryset that point at the outer row
+
+    Unlike Count() it adds no join to the outer query, so several counts
+    can be annotated side by side and the aggregate validators of
+    ConditionalGetMixin still run over plain rows.
+    """
+    counts = (
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    return Coalesce(Subquery(counts), 0)
+
+def with_card_count(decks):
+    """Decks with their owner joined and card_count annotated"""
+    return decks.select_related('owner').annotate(
+        card_count=count_of(Card.objects.all(), 'deck'),
+    )
+
+def with_reviews_count(sessions):
+    """
+    Sessions with their user joined, reviews_count annotated and their
+    decks (see with_card_count) loaded in one extra query
+    """
+    return (
+        sessions.select_related('user')
+        .prefetch_related(
+            Prefetch('deck', queryset=with_card_count(Deck.objects.all()))
+        )
+        .annotate(reviews_count=count_of(CardReview.objects.all(), 'session'))
+    )
+
+# A deck without any card with an ease factor gets one from the average
+# response time (in seconds) of its last RECENT_REVIEW_LIMIT reviews
+RECENT_REVIEW_LIMIT = 20
+EASE_BY_RESPONSE_TIME = [
+    (10, 3.5),  # Very easy (fast responses)
+    (20, 3.0),  # Easy
+    (35, 2.5),  # Medium
+    (60, 2.0),  # Hard
+]
+SLOW_RESPONSE_EASE = 1.5  # Very hard (slow responses)
+DEFAULT_EASE = 2.5
+
+def ease_from_response_times(times):
+    """Fallback ease factor for response times in seconds or milliseconds"""
+    if not times:
+        return DEFAULT_EASE
+    seconds = [time / 1000 if time > 1000 else time for time in times]
+    average = sum(seconds) / len(seconds)
+    for limit, ease in EASE_BY_RESPONSE_TIME:
+        if average <= limit:
+            return ease
+    return SLOW_RESPONSE_EASE
+
+def deck_srs_stats(decks, user):
+    """
+    SRS statistics of decks for a user, in the order of decks
+
+    Uses grouped aggregates instead of queries per deck: one query for the
+    decks with their last completed session (its counts via count_of), one
+    for the card counts of all decks and, only if a deck has no card with
+    an ease factor, one for the recent response times of such decks.
+    """
+    now = timezone.now()
+    last_session = LearningSession.objects.filter(
+        user=user, deck=OuterRef('pk'), status='completed'
+    ).order_by('-started_at')
+    all_reviews = CardReview.objects.all()
+    correct_reviews = CardReview.objects.filter(is_correct=True)
+    decks = list(decks.annotate(
+        last_session_date=Subquery(last_session.values('started_at')[:1]),
+        last_session_reviews=Subquery(
+            last_session.annotate(count=count_of(all_reviews, 'session'))
+            .values('count')[:1]
+        ),
+        last_session_correct=Subquery(
+            last_session.annotate(count=count_of(correct_reviews, 'session'))
+            .values('count')[:1]
+        ),
+    ).values(
+        'pk', 'last_session_date', 'last_session_reviews', 'last_session_correct'
+    ))
+    if not decks:
+        return []
+
+    deck_ids = [deck['pk'] for deck in decks]
+    cards = {
+        row['deck']: row
+        for row in with_schedule(Card.objects.filter(deck__in=deck_ids), user)
+        .order_by()
+        .values('deck')
+        .annotate(
+            due_cards_count=Count(
+                'pk', filter=Q(next_review__lte=now) | Q(next_review__isnull=True)
+            ),
+            average_ease_factor=Avg('ease_factor', filter=Q(ease_factor__gt=0)),
+            next_review_date=Min('next_review'),
+        )
+    }
+
+    response_times = defaultdict(list)
+    without_ease = [
+        deck_id for deck_id in deck_ids
+        if cards.get(deck_id, {}).get('average_ease_factor') is None
+    ]
+    if without_ease:
+        recent_reviews = (
+            CardReview.objects.filter(
+                session__user=user, session__deck__in=without_ease
+            )
+            .annotate(
+                review_deck=F('session__deck'),
+                position=Window(
+                    RowNumber(),
+                    partition_by=F('session__deck'),
+                    order_by=F('created_at').desc(),
+                ),
+            )
+            .filter(position__lte=RECENT_REVIEW_LIMIT)
+            .values_list('review_deck', 'time_taken')
+        )
+        for deck_id, time_taken in recent_reviews:
+            response_times[deck_id].append(time_taken)
+
+    stats = []
+    for deck in decks:
+        card_stats = cards.get(deck['pk'], {})
+        average_ease_factor = card_stats.get('average_ease_factor')
+        if average_ease_factor is None:
+            average_ease_factor = ease_from_response_times(
+                response_times[deck['pk']]
+            )
+        last_session_date = deck['last_session_date']
+        reviews = deck['last_session_reviews']
+        next_review_date = card_stats.get('next_review_date')
+        stats.append({
+            'id': deck['pk'],
+            'due_cards_count': card_stats.get('due_cards_count', 0),
+            'average_ease_factor': average_ease_factor,
+            'last_session_date': (
+                last_session_date.isoformat() if last_session_date else None
+            ),
+            'last_session_accuracy': (
+                deck['last_session_correct'] / reviews * 100 if reviews else None
+            ),
+            'next_review_date': (
+                next_review_date.isoformat() if next_review_date else None
+            ),
+        })
+    return stats
+
+class DeckViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     Deck-ViewSet
     """
@@ -250,11 +593,44 @@ class DeckViewSet(viewsets.ModelViewSet):
     search_fields = ['title', 'description']
     ordering_fields = ['created_at', 'updated_at', 'title']
     ordering = ['-updated_at']
+    conditional_list_aggregates = {
+        'last_updated': Max('updated_at'),
+        'count': Count('id', distinct=True),
+        'cards_last_updated': Max('cards__updated_at'),
+        'card_count': Count('cards', distinct=True),
+        'owner_id': Max('owner'),
+        'owner_last_active': Max('owner__last_active'),
+    }
+    conditional_detail_aggregates = conditional_list_aggregates
+    conditional_detail_last_modified = False
+
+    def get_list_validators(self, queryset):
+        return self.with_owner_version(super().get_list_validators(queryset))
+
+    def get_detail_validators(self, queryset):
+        return self.with_owner_version(super().get_detail_validators(queryset))
+
+    @staticmethod
+    def with_owner_version(validators):
+        """
+        Adds the owner's cache version to the validators
+
+        The nested owner carries the cached dashboard counters, which change
+        with every review without touching the deck or its cards; profile
+        edits move owner_last_active. The list only holds the user's own
+        decks and the detail a single deck, so there is exactly one owner.
+        """
+        if validators['owner_id'] is not None:
+            validators['owner_version'] = user_version(validators['owner_id'])
+        return validators
 
     def get_queryset(self):
         own_decks = Deck.objects.filter(owner=self.request.user)
+        if self.action == 'list':
+            # Public decks are browsed through the catalog
+            return with_card_count(own_decks)
         public_decks = Deck.objects.filter(is_public=True)
-        return own_decks | public_decks
+        return with_card_count(own_decks | public_decks)
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -270,79 +646,47 @@ class DeckViewSet(viewsets.ModelViewSet):
         Get SRS-specific statistics for a deck
         """
         deck = self.get_object()
-        now = timezone.now()
-        
-        due_cards_count = Card.objects.filter(
-            deck=deck
-        ).filter(
-            Q(next_review__lte=now) | Q(next_review__isnull=True)
-        ).count()
-        
-        cards_with_ease = Card.objects.filter(deck=deck, ease_factor__gt=0)
-        if cards_with_ease.exists():
-            average_ease_factor = cards_with_ease.aggregate(
-                avg_ease=Avg('ease_factor')
-            )['avg_ease']
-        else:
-            recent_reviews = CardReview.objects.filter(
-                session__user=request.user,
-                session__deck=deck
-            ).order_by('-created_at')[:20]
-            
-            if recent_reviews.exists():
-                total_time = 0
-                count = 0
-                for review in recent_reviews:
-                    time_in_seconds = review.time_taken / 1000 if review.time_taken > 1000 else review.time_taken
-                    total_time += time_in_seconds
-                    count += 1
-                
-                avg_response_time = total_time / count if count > 0 else 0
-                
-                if avg_response_time <= 10:
-                    average_ease_factor = 3.5  # Very easy (fast responses)
-                elif avg_response_time <= 20:
-                    average_ease_factor = 3.0  # Easy
-                elif avg_response_time <= 35:
-                    average_ease_factor = 2.5  # Medium
-                elif avg_response_time <= 60:
-                    average_ease_factor = 2.0  # Hard
-                else:
-                    average_ease_factor = 1.5  # Very hard (slow responses)
-            else:
-                average_ease_factor = 2.5  # Default
-        
-        last_session = LearningSession.objects.filter(
-            user=request.user,
-            deck=deck,
-            status='completed'
-        ).order_by('-started_at').first()
-        
-        last_session_date = None
-        last_session_accuracy = None
-        
-        if last_session:
-            last_session_date = last_session.started_at.isoformat()
-            
-            session_reviews = CardReview.objects.filter(session=last_session)
-            if session_reviews.exists():
-                correct_count = session_reviews.filter(is_correct=True).count()
-                last_session_accuracy = (correct_count / session_reviews.count()) * 100
-        
-        next_review_card = Card.objects.filter(
-            deck=deck,
-            next_review__isnull=False
-        ).order_by('next_review').first()
-        
-        next_review_date = next_review_card.next_review.isoformat() if next_review_card else None
-        
+        validators = srs_stats_validators(
+            request.user, Deck.objects.filter(pk=deck.pk)
+        )
+
+        def render():
+            return Response(get_or_compute(
+                deck_key(request.user.pk, deck.pk, 'deck_stats'),
+                'deck_stats',
+                lambda: self._deck_stats(request, deck),
+            ))
+
+        return self.conditional_response(request, validators, render)
+
+    def _deck_stats(self, request, deck):
+        """
+        Compute the statistics that deck_stats() serves from the cache
+        """
+        return deck_srs_stats(Deck.objects.filter(pk=deck.pk), request.user)[0]
+
+    @action(detail=True, methods=['get'])
+    def weaknesses(self, request, pk=None):
+        """
+        Get the weakness score and the weakest cards of a deck
+
+        Reads the results of the nightly analyze_reviews run; refreshed_at
+        is null until the deck was analyzed.
+        """
+        deck = self.get_object()
+        analytics = (
+            DeckAnalytics.objects.filter(deck=deck).first()
+            or DeckAnalytics(deck=deck, refreshed_at=None)
+        )
+        cards = (
+            CardAnalytics.objects.filter(deck=deck)
+            .select_related('card')
+            .order_by('-weakness', 'card_id')[:WEAK_CARD_LIMIT]
+        )
         return Response({
             'id': deck.id,
-            'due_cards_count': due_cards_count,
-            'average_ease_factor': average_ease_factor,
-            'last_session_date': last_session_date,
-            'last_session_accuracy': last_session_accuracy,
-            'next_review_date': next_review_date
+            **DeckAnalyticsSerializer(analytics).data,
+            'cards': CardAnalyticsSerializer(cards, many=True).data,
         })
 
     @action(detail=False, methods=['get'])
@@ -350,89 +694,25 @@ class DeckViewSet(viewsets.ModelViewSet):
         """
         Get SRS statistics for all user's decks
         """
-        user = request.user
-        now = timezone.now()
-        
-        user_decks = Deck.objects.filter(owner=user)
-        deck_stats = []
-        
-        for deck in user_decks:
-            due_cards_count = Card.objects.filter(
-                deck=deck
-            ).filter(
-                Q(next_review__lte=now) | Q(next_review__isnull=True)
-            ).count()
-            
-            cards_with_ease = Card.objects.filter(deck=deck, ease_factor__gt=0)
-            if cards_with_ease.exists():
-                average_ease_factor = cards_with_ease.aggregate(
-                    avg_ease=Avg('ease_factor')
-                )['avg_ease']
-            else:
-                recent_reviews = CardReview.objects.filter(
-                    session__user=request.user,
-                    session__deck=deck
-                ).order_by('-created_at')[:20]
-                
-                if recent_reviews.exists():
-                    total_time = 0
-                    count = 0
-                    for review in recent_reviews:
-                        time_in_seconds = review.time_taken / 1000 if review.time_taken > 1000 else review.time_taken
-                        total_time += time_in_seconds
-                        count += 1
-                    
-                    avg_response_time = total_time / count if count > 0 else 0
-                    
-                    if avg_response_time <= 10:
-                        average_ease_factor = 3.5  # Very easy (fast responses)
-                    elif avg_response_time <= 20:
-                        average_ease_factor = 3.0  # Easy
-                    elif avg_response_time <= 35:
-                        average_ease_factor = 2.5  # Medium
-                    elif avg_response_time <= 60:
-                        average_ease_factor = 2.0  # Hard
-                    else:
-                        average_ease_factor = 1.5  # Very hard (slow responses)
-                else:
-                    average_ease_factor = 2.5  # Default
-            
-            last_session = LearningSession.objects.filter(
-                user=user,
-                deck=deck,
-                status='completed'
-            ).order_by('-started_at').first()
-            
-            last_session_date = None
-            last_session_accuracy = None
-            
-            if last_session:
-                last_session_date = last_session.started_at.isoformat()
-                
-                session_reviews = CardReview.objects.filter(session=last_session)
-                if session_reviews.exists():
-                    correct_count = session_reviews.filter(is_correct=True).count()
-                    last_session_accuracy = (correct_count / session_reviews.count()) * 100
-            
-            next_review_card = Card.objects.filter(
-                deck=deck,
-                next_review__isnull=False
-            ).order_by('next_review').first()
-            
-            next_review_date = next_review_card.next_review.isoformat() if next_review_card else None
-            
-            deck_stats.append({
-                'id': deck.id,
-                'due_cards_count': due_cards_count,
-                'average_ease_factor': average_ease_factor,
-                'last_session_date': last_session_date,
-                'last_session_accuracy': last_session_accuracy,
-                'next_review_date': next_review_date
-            })
-        
-        return Response(deck_stats)
+        user_decks = Deck.objects.filter(owner=request.user)
+        validators = srs_stats_validators(request.user, user_decks)
+
+        def render():
+            return Response(get_or_compute(
+                user_key(request.user.pk, 'deck_stats_overview'),
+                'deck_stats_overview',
+                lambda: self._stats(request, user_decks),
+            ))
 
-class CardViewSet(viewsets.ModelViewSet):
+        return self.conditional_response(request, validators, render)
+
+    def _stats(self, request, user_decks):
+        """
+        Compute the statistics that stats() serves from the cache
+        """
+        return deck_srs_stats(user_decks, request.user)
+
+class CardViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     Card-ViewSet
     """
@@ -447,17 +727,38 @@ class CardViewSet(viewsets.ModelViewSet):
         public_cards = Card.objects.filter(deck__is_public=True)
         return own_cards | public_cards
 
+    @transaction.atomic
     def perform_create(self, serializer):
         deck = serializer.validated_data['deck']
         if deck.owner != self.request.user:
-            raise permissions.PermissionDenied(
+            raise PermissionDenied(
                 "Du bist nicht der Besitzer dieses Decks."
             )
-        serializer.save()
+        # Near-duplicates are flagged, not rejected: the user decides
+        minhash = signature(
+            serializer.validated_data['front'], serializer.validated_data['back']
+        )
+        card = serializer.save(duplicate_of_id=find_duplicate(deck.pk, minhash))
+        store_signatures([(card, minhash)])
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        card = serializer.instance
+        data = serializer.validated_data
+        front, back = data.get('front', card.front), data.get('back', card.back)
+        deck_id = data['deck'].pk if 'deck' in data else card.deck_id
+        if (front, back, deck_id) == (card.front, card.back, card.deck_id):
+            serializer.save()
+            return
+        minhash = signature(front, back)
+        card = serializer.save(
+            duplicate_of_id=find_duplicate(deck_id, minhash, exclude=card.pk)
+        )
+        store_signatures([(card, minhash)], replace=True)
 
     def perform_destroy(self, instance):
         if instance.deck.owner != self.request.user:
-            raise permissions.PermissionDenied(
+            raise PermissionDenied(
                 "Du bist nicht der Besitzer dieser Karte."
             )
         instance.delete()
@@ -474,12 +775,14 @@ class LearningSessionViewSet(viewsets.ModelViewSet):
     ordering = ['-started_at']
 
     def get_queryset(self):
-        return LearningSession.objects.filter(user=self.request.user)
+        return with_reviews_count(
+            LearningSession.objects.filter(user=self.request.user)
+        )
 
     def perform_create(self, serializer):
         deck = serializer.validated_data['deck']
         if deck.owner != self.request.user and not deck.is_public:
-            raise permissions.PermissionDenied(
+            raise PermissionDenied(
                 "Du hast keine Berechtigung für dieses Deck."
             )
         serializer.save(user=self.request.user)
@@ -494,7 +797,7 @@ class LearningSessionViewSet(viewsets.ModelViewSet):
         if session.status != 'active':
             return Response({'error': 'Diese Lernsession ist nicht aktiv.'}, status=status.HTTP_400_BAD_REQUEST)
         
-        cards_for_review = get_cards_for_review(session.deck, limit=20)
+        cards_for_review = get_cards_for_review(session.deck, request.user, limit=20)
         
         serializer = CardSerializer(cards_for_review, many=True)
         return Response(serializer.data)
@@ -521,160 +824,134 @@ class CardReviewViewSet(viewsets.ModelViewSet):
     ordering = ['-created_at']
 
     def get_queryset(self):
-        return CardReview.objects.filter(session__user=self.request.user)
+        sessions = with_reviews_count(LearningSession.objects.all())
+        return (
+            CardReview.objects.filter(session__user=self.request.user)
+            .select_related('card')
+            .prefetch_related(Prefetch('session', queryset=sessions))
+        )
+
+    def create(self, request, *args, **kwargs):
+        """
+        Create a review; retries with the same Idempotency-Key header
+        get the first response instead of a second review
+        """
+        return idempotent(
+            request,
+            'card-review-create',
+            lambda: super(CardReviewViewSet, self).create(request, *args, **kwargs),
+        )
 
     def perform_create(self, serializer):
         session = serializer.validated_data['session']
         if session.user != self.request.user:
-            raise permissions.PermissionDenied(
+            raise PermissionDenied(
                 "Du bist nicht der Besitzer dieser Session."
             )
         
-        review = serializer.save()
-        evaluate_review(
-            card=review.card,
-            is_correct=review.is_correct,
-            taken_time=float(review.time_taken)
-        )
+        # Validation and permission checks ran above outside of any
+        # transaction; only the two writes hold the database write lock.
+        with transaction.atomic():
+            review = serializer.save()
+            evaluate_review(
+                get_schedule(session.user, review.card),
+                is_correct=review.is_correct,
+                taken_time=float(review.time_taken)
+            )
 
-class AIGenerateView(APIView):
+class SyncDownloadView(APIView):
     """
-    AI-powered flashcard generation
+    Due-card bundle for studying offline
     """
     permission_classes = [permissions.IsAuthenticated]
-    
-    def post(self, request):
+
+    def get(self, request):
         """
-        Generate flashcards using AI based on a prompt
+        Get all cards due within the next ?days= days (7) with their SRS
+        state, across the user's own and studied public decks
         """
-        prompt = request.data.get('prompt')
-        language = request.data.get('language', 'de')
-        
-        if not prompt:
-            return Response({
-                'error': 'Prompt ist erforderlich'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        ai_service = AIService()
-        
-        if not ai_service.is_service_available():
-            return Response({
-                'error': 'AI Service ist nicht verfügbar'
-            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-        
-        result = ai_service.generate_flashcards(prompt, language)
-        
-        if result is None:
-            return Response({
-                'error': 'Fehler bei der Flashcard-Generierung'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
-        try:
-            deck_data = result.get('deck', {})
-            deck = Deck.objects.create(
-                owner=request.user,
-                title=deck_data.get('title', 'AI-generiertes Deck'),
-                description=deck_data.get('description', ''),
-                is_public=False
-            )
-            
-            cards_data = result.get('cards', [])
-            created_cards = []
-            
-            for card_data in cards_data:
-                card = Card.objects.create(
-                    deck=deck,
-                    front=card_data.get('question', ''),
-                    back=card_data.get('answer', '')
-                )
-                created_cards.append(card)
-            
-            deck_serializer = DeckDetailSerializer(deck)
-            
-            return Response({
-                'message': f'Deck erfolgreich erstellt mit {len(created_cards)} Karten',
-                'deck': deck_serializer.data,
-                'cards_created': len(created_cards)
-            }, status=status.HTTP_201_CREATED)
-            
-        except Exception as e:
-            return Response({
-                'error': f'Fehler beim Erstellen des Decks: {str(e)}'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
+        days = days_param(request, default=7, maximum=30)
+        return Response(build_bundle(request.user, days))
 
-class AIAnswerCheckView(APIView):
+class SyncUploadView(APIView):
     """
-    AI-powered answer correctness checking
+    Batch upload of offline reviews
     """
     permission_classes = [permissions.IsAuthenticated]
-    
+
     def post(self, request):
         """
-        Check the correctness of a user's answer using AI
+        Replay offline reviews chronologically in one transaction
+
+        Reviews of cards changed on the server since the bundle was
+        downloaded are returned as conflicts instead of being applied.
         """
-        answer = request.data.get('answer')
-        user_answer = request.data.get('user_answer')
-        
-        if not answer or not user_answer:
-            return Response({
-                'error': 'Sowohl answer als auch user_answer sind erforderlich'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        ai_service = AIService()
-        
-        if not ai_service.is_service_available():
-            return Response({
-                'error': 'AI Service ist nicht verfügbar'
-            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-        
-        similarity = ai_service.check_answer_correctness(answer, user_answer)
-        
-        if similarity is None:
-            return Response({
-                'error': 'Fehler bei der Antwortbewertung'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
-        if similarity >= 0.8:
-            category = 'correct'
-            feedback = 'Sehr gut! Deine Antwort ist korrekt.'
-        elif similarity >= 0.6:
-            category = 'partially_correct'
-            feedback = 'Fast richtig! Deine Antwort ist teilweise korrekt.'
-        elif similarity >= 0.4:
-            category = 'close'
-            feedback = 'Du bist nah dran, aber die Antwort ist nicht ganz richtig.'
-        else:
-            category = 'incorrect'
-            feedback = 'Das ist leider nicht richtig. Versuche es nochmal!'
-        
-        return Response({
-            'similarity': similarity,
-            'category': category,
-            'feedback': feedback,
-            'is_correct': similarity >= 0.6
-        }, status=status.HTTP_200_OK)
+        serializer = SyncUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = replay_reviews(request.user, serializer.validated_data['reviews'])
+        return Response(result, status=status.HTTP_200_OK)
 
+class CatalogPagination(CursorPagination):
+    """
+    Keyset pagination over the unique catalog rank
+    """
+    ordering = 'rank'
 
-class AIHealthCheckView(APIView):
+class DeckCatalogView(ListAPIView):
     """
-    Health check for AI service
+    Catalog of public decks, most popular first
     """
-    permission_classes = []
-    
+    serializer_class = DeckCatalogSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CatalogPagination
+    filter_backends = [filters.SearchFilter]
+    search_fields = ['deck__title', 'deck__description']
+
+    def get_queryset(self):
+        # Decks made private since the last refresh drop out right away
+        return DeckRanking.objects.filter(deck__is_public=True).select_related(
+            'deck__owner'
+        )
+
+class CacheStatsView(APIView):
+    """
+    Hit/miss statistics of the stats cache (staff only)
+    """
+    permission_classes = [permissions.IsAdminUser]
+
     def get(self, request):
         """
-        Check if AI service is available
+        Get the cache statistics of the worker answering the request
+
+        The counters are per process; the cached values themselves are
+        shared if the cache backend is.
         """
-        ai_service = AIService()
-        is_available = ai_service.is_service_available()
-        
-        return Response({
-            'ai_service_available': is_available,
-            'ai_service_type': 'ssh',
-            'ssh_host': ai_service.ssh_host,
-            'ssh_port': ai_service.ssh_port,
-            'ssh_username': ai_service.ssh_username,
-            'available_tools': ai_service.get_available_tools() if is_available else None
-        }, status=status.HTTP_200_OK)
-    
\ No newline at end of file
+        return Response(get_cache_stats())
+
+
+def metrics(request):
+    """
+    Prometheus metrics in text exposition format
+
+    If METRICS_TOKEN is set, scrapers must send it as a Bearer token.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden()
+
+    cache_stats = get_cache_stats()['namespaces']
+    counters = [
+        (
+            f'flashcards_cache_{outcome}_total',
+            f'Stats cache {outcome} per namespace',
+            [
+                ({'namespace': namespace}, counts[outcome])
+                for namespace, counts in cache_stats.items()
+            ],
+        )
+        for outcome in ('hits', 'misses')
+    ]
+    return HttpResponse(
+        render_prometheus(registry.collect(), counters),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -10,6 +10,7 @@ export interface User {
     is_public: boolean;
     avatar?: string;
     avatar_url: string;
+    avatar_urls?: Record<string, { webp: string; jpeg: string }>;
     total_cards_created: number;
     total_decks_created: number;
     total_learning_sessions: number;